@@ -5,16 +5,20 @@ import numpy as np
 import pandas as pd
 import seaborn as sns
 import scipy as sp
-import urllib
+import assets
+import figure_cache
+import league_bands
+import league_baselines
+import player_index
+import rolling_engine
+import season_store
 
 from matplotlib import ticker
 from matplotlib import colors
-from PIL import Image
 from scipy import stats
 
-logo_loc = 'https://github.com/Blandalytics/PLV_viz/blob/main/data/PL-text-wht.png?raw=true'
-logo = Image.open(urllib.request.urlopen(logo_loc))
-st.image(logo, width=200)
+logo = assets.logo()
+st.image(assets.logo('header'), width=200)
 
 ## Set Styling
 # Plot Style
@@ -70,42 +74,20 @@ season_names = {
 }
 
 # Load Data
-@st.cache_data(ttl=2*3600,show_spinner=f"Loading {year} data")
-def load_season_data(year):
-    df = pd.DataFrame()
-    for month in range(3,11):
-        file_name = f'https://github.com/Blandalytics/PLV_viz/blob/main/data/{year}_PLV_App_Data-{month}.parquet?raw=true'
-        df = pd.concat([df,
-                        pd.read_parquet(file_name)[['hittername','p_hand','b_hand','pitch_id','balls','strikes','swing_agg',
-                                                    'strike_zone_judgement','decision_value','contact_over_expected',
-                                                    'adj_power','batter_wOBA','pitchtype','pitch_type_bucket',
-                                                    'in_play_input','p_x','p_z','sz_z','strike_zone_top','strike_zone_bottom'
-                                                   ]]
-                       ])
-    
-    df = df.reset_index(drop=True)
+def build_season_data(year):
+    df = season_store.load_season(year,'PLV',
+                                  columns=['hittername','p_hand','b_hand','pitch_id','balls','strikes','swing_agg',
+                                           'strike_zone_judgement','decision_value','contact_over_expected',
+                                           'adj_power','batter_wOBA','pitchtype','pitch_type_bucket',
+                                           'in_play_input','p_x','p_z','sz_z','strike_zone_top','strike_zone_bottom'
+                                          ])
 
     df.loc[df['p_x'].notna(),'kde_x'] = np.clip(df.loc[df['p_x'].notna(),'p_x'].astype('float').mul(12).round(0).astype('int').div(12),
                                                 -20/12,
                                                 20/12)
-    df.loc[df['sz_z'].notna(),'kde_z'] = np.clip(df.loc[df['sz_z'].notna(),'sz_z'].astype('float').mul(24).round(0).astype('int').div(24),
-                                                 -1.5,
-                                                 1.25)
     
-    df['base_decision_value'] = df['decision_value'].groupby([df['p_hand'],
-                                                              df['b_hand'],
-                                                              df['pitchtype'],
-                                                              df['kde_x'],
-                                                              df['kde_z'],
-                                                              df['balls'],
-                                                              df['strikes']]).transform('mean')
-    df['base_power'] = df['adj_power'].groupby([df['p_hand'],
-                                                df['b_hand'],
-                                                df['pitchtype'],
-                                                df['kde_x'],
-                                                df['kde_z'],
-                                                df['balls'],
-                                                df['strikes']]).transform('mean')
+    # League mean decision value/power for the same hands, pitchtype, location & count
+    df = league_baselines.join_baselines(df, year)
 
     df['sa_oa'] = df['swing_agg'].copy()
     df['dv_oa'] = df['decision_value'].sub(df['base_decision_value'])
@@ -131,14 +113,26 @@ def load_season_data(year):
     df['decision_value_z'] = np.where(df['zone']==1,df['decision_value'],None)
     df['decision_value_o'] = np.where(df['zone']==0,df['decision_value'],None)
     
-    df['count'] = df['balls'].astype('str')+'-'+df['strikes'].astype('str')
-    
-    return df
+    # Sorted by hitter, so a hitter's pitches are one slice of the frame
+    return player_index.PlayerIndex(season_store.apply_schema(df), player_col='hittername').df
+
+# Built once into a memory-mapped file that every server process shares
+@st.cache_resource(ttl=2*3600,show_spinner=f"Loading {year} data")
+def load_season_data(year):
+    df = season_store.shared_frame('batter_metrics', year, build_season_data,
+                                   sources=[season_store.season_path(year,'PLV'),
+                                            league_baselines.baseline_path(year)])
+    return player_index.PlayerIndex(df, player_col='hittername')
 
-plv_df = load_season_data(year)
+hitter_index = load_season_data(year)
+plv_df = hitter_index.df
 
-max_pitches = plv_df.groupby('hittername')['pitch_id'].count().max()
-start_val = int(plv_df.groupby('hittername')['pitch_id'].count().quantile(0.4)/50)*50
+# Rendered charts are cached until the season data or baselines are rebuilt
+data_version = figure_cache.data_version(season_store.season_path(year,'PLV'),
+                                         league_baselines.baseline_path(year))
+
+max_pitches = plv_df.groupby('hittername', observed=True)['pitch_id'].count().max()
+start_val = int(plv_df.groupby('hittername', observed=True)['pitch_id'].count().quantile(0.4)/50)*50
 
 # Num Pitches threshold
 pitch_thresh = st.number_input(f'Min # of Pitches faced:',
@@ -207,11 +201,19 @@ stat_values = {
     'batter_wOBA':'Runs Added, per 100 Pitches'
 }
 
-plv_df = plv_df.rename(columns=stat_names)
+# Shallow rename: the columns stay shared with the cached (read-only) frame
+plv_df = plv_df.rename(columns=stat_names, copy=False)
+
+# Each hitter's pitches, pre-sorted with filter codes, for the rolling charts
+@st.cache_resource(ttl=2*3600)
+def load_hitter_events(year, _plv_df):
+    return rolling_engine.HitterEvents(_plv_df, list(stat_names.values()))
+hitter_events = load_hitter_events(year, plv_df)
+
 st.title("Rolling Ability Charts")
 
 # Player
-players = list(plv_df.groupby('hittername', as_index=False)[['pitch_id','Hitter Performance']].agg({
+players = list(plv_df.groupby('hittername', as_index=False, observed=True)[['pitch_id','Hitter Performance']].agg({
     'pitch_id':'count',
     'Hitter Performance':'mean'}).query(f'pitch_id >={pitch_thresh}').sort_values('Hitter Performance', ascending=False)['hittername'])
 default_player = players.index('Juan Soto')
@@ -268,24 +270,32 @@ count_select = st.radio('Count Group',
                         horizontal=True
                        )
  
-if count_select=='All':
-    selected_options = ['0-0', '1-0', '2-0', '3-0', '0-1', '1-1', '2-1', '3-1', '0-2', '1-2', '2-2', '3-2']
-elif count_select=='Hitter-Friendly':
-    selected_options = ['1-0', '2-0', '3-0', '2-1', '3-1']
-elif count_select=='Pitcher-Friendly':
-    selected_options = ['0-1','0-2','1-2']
-elif count_select=='Even':
-    selected_options = ['0-0','1-1','2-2']
-elif count_select=='2-Strike':
-    selected_options = ['0-2','1-2','2-2','3-2']
-elif count_select=='3-Ball':
-    selected_options = ['3-0','3-1','3-2']
+if count_select!='Custom':
+    selected_options = season_store.count_groups[count_select]
 else:
     selected_options = st.multiselect('Select the count(s):',
                                        ['0-0', '1-0', '2-0', '3-0', '0-1', '1-1', '2-1', '3-1', '0-2', '1-2', '2-2', '3-2'],
                                        ['0-0', '1-0', '2-0', '3-0', '0-1', '1-1', '2-1', '3-1', '0-2', '1-2', '2-2', '3-2'])
     
-updated_threshold = int(round(rolling_threshold[metric]*len(selected_options)/12/5)*5 / (3 if year == 2023 else 1))
+# Pitches a hitter needs to qualify for the league reference lines
+def band_threshold(metric, counts):
+    return int(round(rolling_threshold[metric]*len(counts)/12/5)*5 / (3 if year == 2023 else 1))
+updated_threshold = band_threshold(metric, selected_options)
+
+# League reference bands, tabulated for every preset filter combination
+@st.cache_resource(ttl=2*3600)
+def load_bands(year, _plv_df):
+    band_cube = league_bands.BandCube(_plv_df, list(stat_names.values()))
+    bands = league_bands.build_bands(band_cube, list(stat_names.values()), season_store.count_groups, band_threshold)
+    return band_cube, bands
+band_cube, bands = load_bands(year, plv_df)
+
+def league_band(p_hands, b_hands, count_select=count_select, pitchtype_base=pitchtype_base):
+    # Custom count sets aren't tabulated, so they're summed from the cube
+    if count_select=='Custom':
+        return league_bands.band_stats(band_cube, metric, selected_options, pitchtype_select,
+                                       p_hands, b_hands, updated_threshold)
+    return league_bands.lookup(bands, metric, count_select, pitchtype_base, p_hands, b_hands)
 
 # Hitter Handedness
 handedness = st.select_slider(
@@ -296,7 +306,9 @@ handedness = st.select_slider(
 if handedness=='All':
     hitter_hand = ['L','R']
 else:
-    hitter_hand = list(plv_df.loc[(plv_df['hittername']==player),'b_hand'].unique())
+    # Stances in the order the hitter first used them (the slice is in pitchtype order)
+    hitter_df = plv_df.iloc[hitter_index.rows(player)]
+    hitter_hand = list(hitter_df['b_hand'].iloc[np.argsort(hitter_df['pitch_id'].to_numpy(), kind='stable')].unique())
 
 hand_map = {
     'Left':['L'],
@@ -304,38 +316,16 @@ hand_map = {
     'Right':['R']
 }
 
-chart_thresh_list = (plv_df
-                     .loc[plv_df['count'].astype('str').isin(selected_options) &
-                          plv_df['pitch_type_bucket'].isin(pitchtype_select) &
-                          plv_df['b_hand'].isin(hitter_hand) &
-                          plv_df['p_hand'].isin(hand_map[handedness])
-                         ]
-                     .groupby('hittername')
-                     [['pitch_id',metric]]
-                     .agg({
-                         'pitch_id':'count',
-                         metric:'mean'
-                     })
-                     .query(f'pitch_id >= {updated_threshold}')
-                     .copy()
-                    )
-
-chart_mean = plv_df.loc[plv_df['count'].isin(selected_options) & plv_df['pitch_type_bucket'].isin(pitchtype_select),metric].mean()
-chart_90 = chart_thresh_list[metric].quantile(0.9)
-chart_75 = chart_thresh_list[metric].quantile(0.75)
-chart_25 = chart_thresh_list[metric].quantile(0.25)
-chart_10 = chart_thresh_list[metric].quantile(0.1)
-
-plv_df[metric] = plv_df[metric].replace([np.inf, -np.inf], np.nan)
-rolling_df = (plv_df
-              .sort_values('pitch_id')
-              .loc[(plv_df['hittername']==player) &
-                   plv_df['p_hand'].isin(hand_map[handedness]) &
-                   plv_df['count'].isin(selected_options) &
-                   plv_df['pitch_type_bucket'].isin(pitchtype_select),
-                   ['hittername',metric]]
-              .dropna()
-              .reset_index(drop=True)
+band = league_band(hand_map[handedness], hitter_hand)
+
+chart_mean = league_band(['L','R'], ['L','R'])['league_mean']
+chart_90 = band['q90']
+chart_75 = band['q75']
+chart_25 = band['q25']
+chart_10 = band['q10']
+
+rolling_df = (hitter_events
+              .player_events(player, metric, selected_options, pitchtype_select, hand_map[handedness])
               .reset_index()
              )
 
@@ -348,9 +338,9 @@ window = st.number_input(f'Choose a {rolling_denom[metric]} threshold:',
                          step=5, 
                          value=rolling_threshold[metric])
 
-rolling_df['Rolling_Stat'] = rolling_df[metric].rolling(window).mean()
+rolling_df['Rolling_Stat'] = rolling_engine.rolling_mean(rolling_df[metric].to_numpy(), window)
 fixed_window = window if (rolling_df[metric].mean() < rolling_df['Rolling_Stat'].max()) and (rolling_df[metric].mean() > rolling_df['Rolling_Stat'].min()) else int(window*2/3)
-rolling_df['Rolling_Stat'] = rolling_df[metric].rolling(window, min_periods=fixed_window).mean()
+rolling_df['Rolling_Stat'] = rolling_engine.rolling_mean(rolling_df[metric].to_numpy(), window, min_periods=fixed_window)
 
 color_norm = colors.TwoSlopeNorm(vmin=chart_10, 
                                  vcenter=chart_mean,
@@ -468,11 +458,13 @@ def rolling_chart():
     pl_ax.axis('off')
     
     sns.despine()
-    st.pyplot(fig)
+    return fig
 if window > rolling_df.shape[0]:
     st.write(f'Not enough {rolling_denom[metric]} ({rolling_df.shape[0]})')
 else:
-    rolling_chart()
+    st.image(figure_cache.render(['rolling_chart',year,player,metric,pitchtype_select,
+                                  selected_options,count_select,handedness,window,data_version],
+                                 rolling_chart))
 
 st.write("If you have questions or ideas on what you'd like to see, DM me! [@Blandalytics](https://twitter.com/blandalytics)")
 st.write("Heatmaps can now be found at [plv-hitter-heatmaps.streamlit.app](https://plv-hitter-heatmaps.streamlit.app/)")
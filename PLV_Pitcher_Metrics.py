@@ -5,11 +5,15 @@ import numpy as np
 import pandas as pd
 import seaborn as sns
 import scipy as sp
-import urllib
+import arsenal_summary
+import assets
+import figure_cache
+import pitcher_cube
+import player_index
+import plv_card
+import season_store
 
-from PIL import Image
 from collections import Counter
-from scipy import stats
 
 ## Set Styling
 # Plot Style
@@ -79,9 +83,8 @@ pitch_names = {
     'UN':'Unknown', 
 }
 
-logo_loc = 'https://github.com/Blandalytics/PLV_viz/blob/main/data/PL-text-wht.png?raw=true'
-logo = Image.open(urllib.request.urlopen(logo_loc))
-st.image(logo, width=200)
+logo = assets.logo()
+st.image(assets.logo('header'), width=200)
 
 # Year
 years = [2023,2022,2021,2020]
@@ -90,40 +93,49 @@ year = st.radio('Choose a year:', years)
 seasonal_constants = pd.read_csv('https://github.com/Blandalytics/PLV_viz/blob/main/data/plv_seasonal_constants.csv?raw=true').set_index('year')
 
 # Load Data
-@st.cache_data
-def load_data(year):
-    df = pd.DataFrame()
-    for month in range(3,11):
-        file_name = f'https://github.com/Blandalytics/PLV_viz/blob/main/data/{year}_PLV_App_Data-{month}.parquet?raw=true'
-        df = pd.concat([df,
-                        pd.read_parquet(file_name)[['pitchername','pitcher_mlb_id','pitch_id',
-                                                    'p_hand','b_hand','pitchtype','PLV','velo',
-                                                    'IHB','IVB'
-                                                   ]]
-                       ])
-    df = (df
+def build_data(year):
+    df = (season_store.load_season(year,'PLV',
+                                   columns=['pitchername','pitcher_mlb_id','pitch_id',
+                                            'p_hand','b_hand','pitchtype','PLV','velo',
+                                            'IHB','IVB'
+                                           ],
+                                   drop_pitchtypes=['KN','SC','UN'])
           .sort_values('pitch_id')
           .astype({'pitch_id':'int',
                    'pitcher_mlb_id':'int'})
-          .query(f'pitchtype not in {["KN","SC","UN"]}')
           .reset_index(drop=True)
          )
     
     df['pitch_runs'] = df['PLV'].mul(seasonal_constants.loc[year]['run_plv_coef']).add(seasonal_constants.loc[year]['run_plv_constant'])
     
-    df['pitch_quality'] = 'Average'
-    df.loc[df['PLV']>=5.5,'pitch_quality'] = 'Quality'
-    df.loc[df['PLV']<4.5,'pitch_quality'] = 'Bad'
+    # QP/AP/BP counts live in the pitcher cube
+    # Sorted by pitcher, then pitchtype, so their pitches are one slice of the frame
+    return player_index.PlayerIndex(season_store.apply_schema(df)).df
 
-    for qual in df['pitch_quality'].unique():
-      df[qual+' Pitch'] = 0
-      df.loc[df['pitch_quality']==qual,qual+' Pitch'] = 1
+# Built once into a memory-mapped file that every server process shares
+@st.cache_resource
+def load_data(year):
+    df = season_store.shared_frame('pitcher_metrics', year, build_data,
+                                   sources=[season_store.season_path(year,'PLV')])
+    return player_index.PlayerIndex(df)
+pitch_index = load_data(year)
+plv_df = pitch_index.df
 
-    df['QP-BP'] = df['Quality Pitch'].sub(df['Bad Pitch'])
-    
-    return df
-plv_df = load_data(year)
-default_count = int(min(500,round(plv_df.groupby('pitchername')['pitch_id'].count().max()/2,-2)/2))
+# Per-pitcher/pitchtype/handedness sums, for the leaderboards and PLV card
+@st.cache_data
+def load_cube():
+    return pitcher_cube.load_cube()
+pitcher_df = load_cube()
+
+# Per-pitcher/pitchtype/handedness PLV histograms, for the Pitch Distribution chart
+@st.cache_resource
+def load_arsenal_summary(year):
+    return arsenal_summary.build_summary(load_data(year).df)
+
+# Rendered charts are cached until the season data or cube is rebuilt
+data_version = figure_cache.data_version(season_store.season_path(year,'PLV'),
+                                         pitcher_cube.cube_path())
+default_count = int(min(500,round(plv_df.groupby('pitchername', observed=True)['pitch_id'].count().max()/2,-2)/2))
 
 def get_ids():
     id_df = pd.DataFrame()
@@ -146,69 +158,10 @@ pitch_threshold = st.number_input(f'Min # of Pitches:',
                                   step=50, 
                                   value=default_count)
 
-def get_pla(year,pitch_threshold=pitch_threshold,p_hand=['L','R'],b_hand=['L','R']):
-    pla_data = pd.read_csv('https://github.com/Blandalytics/PLV_viz/blob/main/data/pla_data.csv?raw=true', encoding='latin1')
-    season_df = (pla_data
-             .loc[(pla_data['year_played']==year) &
-                  pla_data['p_hand'].isin(p_hand) &
-                  pla_data['b_hand'].isin(b_hand)]
-             .assign(total_plv = lambda x: x['num_pitches'] * x['plv'])
-      .groupby(['pitchername','pitchtype','pitcher_mlb_id'])
-      [['num_pitches','pitch_runs','total_plv','subset_ip']]
-      .agg({
-          'num_pitches':'sum',
-          'subset_ip':'sum',
-          'pitch_runs':'sum',
-          'total_plv':'sum'
-      })
-      .sort_values('pitch_runs', ascending=False)
-      .query(f'num_pitches >={int(pitch_threshold/20)}') # 5% of total pitches threshold
-      .reset_index()
-      )
-
-    # Clean IP to actual fractions
-    season_df['season_IP'] = season_df['subset_ip'].groupby(season_df['pitcher_mlb_id']).transform('sum')
-    season_df['season_pitches'] = season_df['num_pitches'].groupby(season_df['pitcher_mlb_id']).transform('sum')
-
-    # Calculate PLV, in general, and per-pitchtype
-    season_df['PLV'] = season_df['total_plv'].groupby(season_df['pitcher_mlb_id']).transform('sum').div(season_df['season_pitches']).astype('float')
-    season_df['pitchtype_plv'] = season_df['total_plv'].div(season_df['num_pitches'])
-
-    # Calculate PLA, in general, and per-pitchtype
-    season_df['PLA'] = season_df['pitch_runs'].groupby(season_df['pitcher_mlb_id']).transform('sum').mul(9).div(season_df['season_IP']).astype('float')
-    season_df['pitchtype_pla'] = season_df['pitch_runs'].mul(9).div(season_df['subset_ip']) # ERA Scale
-
-    season_df = season_df.sort_values('PLA')
-
-    # Pivot a dataframe of per-pitchtype PLAs
-    pitchtype_df = season_df.pivot_table(index=['pitcher_mlb_id'], 
-                                          columns='pitchtype', 
-                                          values='pitchtype_pla',
-                                          aggfunc='sum'
-                                        ).replace({0:None})
-
-    
-    # Merge season-long PLA with pitchtype PLAs
-    df = (season_df
-          .drop_duplicates('pitcher_mlb_id')
-          [['pitcher_mlb_id','pitchername','season_pitches','PLA','PLV']]
-          .merge(pitchtype_df, how='inner',left_on='pitcher_mlb_id',right_index=True)
-          .query(f'season_pitches >= {pitch_threshold}')
-          .rename(columns={'pitchername':'Pitcher',
-                           'season_pitches':'Num_Pitches'})
-          .drop(columns=['pitcher_mlb_id'])
-          .fillna(np.nan)
-          .set_index('Pitcher')
-          .copy()
-          )
-    
-    cols = [x for x in ['Num_Pitches','PLV','PLA','FF','SI','SL','ST','CH','CU','FC','FS'] if x in df.columns.values]
-    return df[cols]
-
 # Season data
-pla_df = get_pla(year,pitch_threshold)
+pla_df = pitcher_cube.pla_frame(pitcher_df,year,pitch_threshold)
 
-mean_plv = pla_df['PLV'].mul(pla_df['Num_Pitches']).sum() / pla_df['Num_Pitches'].sum()
+mean_plv = plv_card.league_plv(pla_df)
 
 format_cols = [x for x in ['PLA','FF','SI','SL','ST','CH','CU','FC','FS'] if x in pla_df.columns.values]
 
@@ -267,7 +220,7 @@ if chart=='Pitch Distribution':
     if handedness=='All':
         pitcher_hand = ['L','R']
     else:
-        pitcher_hand = list(plv_df.loc[(plv_df['pitchername']==player),'p_hand'].unique())
+        pitcher_hand = list(pitch_index.frame(player)['p_hand'].unique())
 
     hand_map = {
         'Left':['L'],
@@ -275,8 +228,10 @@ if chart=='Pitch Distribution':
         'Right':['R']
     }
 
-    pitches_thrown = plv_df.loc[(plv_df['pitchername']==player) &
-                                plv_df['b_hand'].isin(hand_map[handedness])].shape[0]
+    summary_df = load_arsenal_summary(year)
+    arsenal_df = arsenal_summary.player_arsenal(summary_df, player, hand_map[handedness])
+    league_plv = arsenal_summary.league_plv(summary_df, pitcher_hand, hand_map[handedness])
+    pitches_thrown = arsenal_df['num_pitches'].sum()
 
     st.write('Distribution of PLV for all pitches thrown by {}{} in {}'.format(player,
                                                                                '' if handedness=='All' else f' to {handedness} Handed Hitters',
@@ -285,17 +240,10 @@ if chart=='Pitch Distribution':
 
     if pitches_thrown >= pitch_threshold:
         pitch_type_thresh = 20
-        pitch_list = list(plv_df
-                    .loc[(plv_df['pitchername']==player) &
-                         plv_df['b_hand'].isin(hand_map[handedness])]
-                    .groupby('pitchtype',as_index=False)
-                    ['pitch_id']
-                    .count()
-                    .dropna()
-                    .sort_values('pitch_id', ascending=False)
-                    .query(f'pitch_id > {pitch_type_thresh}')
-                    ['pitchtype']
-                    )
+        pitch_list = list(arsenal_df
+                          .query(f'num_pitches > {pitch_type_thresh}')
+                          .index
+                         )
 
     ## Chart function
         def arsenal_dist():
@@ -304,31 +252,24 @@ if chart=='Pitch Distribution':
             ax_num = 0
             max_count = 0
             for pitch in pitch_list:
-                # Data just for that pitch type
-                chart_data = plv_df.loc[(plv_df['pitchtype']==pitch) &
-                                        plv_df['b_hand'].isin(hand_map[handedness])].copy()
-                # Restrict to 0-10
-                chart_data['PLV_clip'] = np.clip(chart_data['PLV'], a_min=0, a_max=10)
-                num_pitches = chart_data.loc[chart_data['pitchername']==player].shape[0]
-
-                # Plotting
-                sns.histplot(data=chart_data.loc[chart_data['pitchername']==player],
-                             x='PLV_clip',
+                # Plotting (precomputed 0.5 PLV bins, clipped to 0-10)
+                sns.histplot(x=arsenal_summary.bin_edges[:-1],
+                             weights=arsenal_df.loc[pitch,'hist'],
                              color=color_palette[pitch],
-                             binwidth=0.5,
-                             binrange=(0,10),
+                             binwidth=arsenal_summary.bin_width,
+                             binrange=arsenal_summary.bin_range,
                              alpha=1,
                              ax=axs[ax_num],
                              legend=False
                             )
                 # Season Avg Line
-                axs[ax_num].axvline(chart_data.loc[chart_data['pitchername']==player,'PLV'].mean(),
+                axs[ax_num].axvline(arsenal_df.loc[pitch,'plv'],
                                     color=color_palette[pitch],
                                     linestyle='--',
                                     linewidth=2.5)
 
                 # League Avg Line
-                axs[ax_num].axvline(chart_data.loc[chart_data['p_hand'].isin(pitcher_hand),'PLV'].mean(), 
+                axs[ax_num].axvline(league_plv[pitch], 
                                     color='w', 
                                     label='Lg. Avg.',
                                     alpha=0.5)
@@ -351,19 +292,12 @@ if chart=='Pitch Distribution':
                 # Fix Y-Axis size to most thrown pitch, for all pitches
                 axs[axis].set(ylim=(0,max_count*1.025))
 
-                num_pitches = plv_df.loc[(plv_df['pitchtype']==pitch_list[axis]) & 
-                                         (plv_df['pitchername']==player) &
-                                         plv_df['b_hand'].isin(hand_map[handedness])].shape[0]
-                pitch_usage = round(num_pitches / plv_df.loc[(plv_df['pitchername']==player) &
-                                                             plv_df['b_hand'].isin(hand_map[handedness])].shape[0] * 100,1)
+                num_pitches = arsenal_df.loc[pitch_list[axis],'num_pitches']
+                pitch_usage = round(arsenal_df.loc[pitch_list[axis],'usage'] * 100,1)
 
                 # Define the plot legend
-                axs[axis].legend([pitch_names[pitch_list[axis]]+': {:.3}'.format(plv_df.loc[(plv_df['pitchtype']==pitch_list[axis]) & 
-                                                                                            (plv_df['pitchername']==player) &
-                                                                                            plv_df['b_hand'].isin(hand_map[handedness]),'PLV'].mean()),
-                                  'Lg. Avg'+': {:.3}'.format(plv_df.loc[(plv_df['pitchtype']==pitch_list[axis]) &
-                                                                         plv_df['b_hand'].isin(hand_map[handedness]) &
-                                                                         plv_df['p_hand'].isin(pitcher_hand),'PLV'].mean())], 
+                axs[axis].legend([pitch_names[pitch_list[axis]]+': {:.3}'.format(arsenal_df.loc[pitch_list[axis],'plv']),
+                                  'Lg. Avg'+': {:.3}'.format(league_plv[pitch_list[axis]])], 
                                  framealpha=0, edgecolor=pl_background, loc=(0,0.4), fontsize=14)
 
                 # Pitch Totals
@@ -381,8 +315,9 @@ if chart=='Pitch Distribution':
             pl_ax.axis('off')
             
             sns.despine(left=True, bottom=True)
-            st.pyplot(fig)
-        arsenal_dist()
+            return fig
+        st.image(figure_cache.render(['arsenal_dist',year,player,handedness,palette,data_version],
+                                     arsenal_dist))
     else:
         st.write('Not enough pitches thrown in {} (<{})'.format(year,pitch_threshold))
 elif chart=='Pitch Quality':
@@ -395,7 +330,7 @@ elif chart=='Pitch Quality':
     if handedness=='All':
         pitcher_hand = ['L','R']
     else:
-        pitcher_hand = list(plv_df.loc[(plv_df['pitchername']==player),'p_hand'].unique())
+        pitcher_hand = list(pitch_index.frame(player)['p_hand'].unique())
 
     hand_map = {
         'Left':['L'],
@@ -403,263 +338,22 @@ elif chart=='Pitch Quality':
         'Right':['R']
     }
     
-    pla_data = pd.read_csv('https://github.com/Blandalytics/PLV_viz/blob/main/data/pla_data.csv?raw=true', encoding='latin1')
-    pq_df = (pla_data
-             .loc[(pla_data['year_played']==year) &
-                  pla_data['p_hand'].isin(pitcher_hand) &
-                  pla_data['b_hand'].isin(hand_map[handedness])]
-             .assign(total_plv = lambda x: x['num_pitches'] * x['plv'])
-      .groupby(['pitchername','pitchtype','pitcher_mlb_id'])
-      [['num_pitches','pitch_runs','total_plv','subset_ip']]
-      .agg({
-          'num_pitches':'sum',
-          'subset_ip':'sum',
-          'pitch_runs':'sum',
-          'total_plv':'sum'
-      })
-      .sort_values('pitch_runs', ascending=False)
-      .query(f'num_pitches >={pitch_threshold/20}')
-      .reset_index()
-      )
-
-    # Clean IP to actual fractions
-    pq_df['season_IP'] = pq_df['subset_ip'].groupby(pq_df['pitcher_mlb_id']).transform('sum')
-    pq_df['season_pitches'] = pq_df['num_pitches'].groupby(pq_df['pitcher_mlb_id']).transform('sum')
-
-    # Calculate PLV, in general, and per-pitchtype
-    pq_df['PLV'] = pq_df['total_plv'].groupby(pq_df['pitcher_mlb_id']).transform('sum').div(pq_df['season_pitches']).astype('float')
-    pq_df['pitchtype_plv'] = pq_df['total_plv'].div(pq_df['num_pitches'])
-
-    # Calculate PLA, in general, and per-pitchtype
-    pq_df['PLA'] = pq_df['pitch_runs'].groupby(pq_df['pitcher_mlb_id']).transform('sum').mul(9).div(pq_df['season_IP']).astype('float')
-    pq_df['pitchtype_pla'] = pq_df['pitch_runs'].mul(9).div(pq_df['subset_ip']) # ERA Scale)get_pla(year,pitch_threshold=25,p_hand=pitcher_hand,b_hand=hand_map[handedness]).reset_index().rename(columns={'Pitcher':'pitchername'})
-    
-    def plv_kde(df,name,num_pitches,ax,stat='PLV',pitchtype=''):
-        pitch_color = 'w' if pitchtype=='' else marker_colors[pitchtype]
-        df = df.query(f'season_pitches >= {pitch_threshold}').copy() if pitchtype=='' else df.loc[df['pitchtype']==pitchtype].query(f'num_pitches >= {int(pitch_threshold/20)}').copy()
-        stat = 'PLV' if pitchtype=='' else 'pitchtype_plv'
-        
-        val = df.loc[df['pitchername']==name,stat].mean()
-        val_percentile = np.clip(stats.percentileofscore(df[stat], val) / 100,0,1)
-
-        sns.kdeplot(df[stat], ax=ax, color='w', legend=False, cut=0)
-
-        x = ax.lines[-1].get_xdata()
-        y = ax.lines[-1].get_ydata()
-
-        quantiles = [1, 0.95, 0.9, 0.75, 0.5, 0.25, 0.1, 0.05, 0]
-        quant_colors = sns.color_palette(f'{diverging_palette}_r',n_colors=7001)[::1000]
-        
-        i = -1
-        for quant in quantiles:
-            if quant >= val_percentile:
-                i += 1
-
-        val_color = quant_colors[np.clip(i,0,7)]
-
-        for quant in range(8):
-            color = quant_colors[quant]
-            thresh = 10 if quant==0 else df[stat].quantile(quantiles[quant])
-            ax.fill_between(x, 0, y, 
-                            where=x < thresh, 
-                            color=quant_colors[quant], 
-                            alpha=1)
-        ax.vlines(df[stat].quantile(0.5), 
-                0, 
-                np.interp(df[stat].quantile(0.5), x, y), 
-                linestyle='-', color='w', alpha=1, linewidth=2)
-        ax.axvline(val, 
-                 ymax=0.9,
-                 linestyle='--', 
-                 color='w', 
-                 linewidth=2)
-        props = dict(boxstyle='Round',
-                   facecolor='k', 
-                   alpha=1, 
-                   edgecolor=val_color,
-                   linewidth=2)
-        y_max = ax.get_ylim()[1]
-        ax.text(val+0.01,
-              y_max*1.1,
-              '{:.2f}'.format(val),
-              ha='center',
-              va='top',
-              color=val_color,
-              fontsize=16,
-              fontweight='bold', 
-              bbox=props)
-        ax.set(xlim=(mean_plv-1.4,mean_plv+1.4),
-             ylim=(0,y_max*1.2),
-             xlabel=None,
-             ylabel=None,
-             )
-        ax.set_xticklabels([])
-        ax.set_yticklabels([])
-        ax.tick_params(left=False, bottom=False
-                     )
-        sns.despine(left=True,bottom=True)
-
-    def percent_bar(ax):
-        quantiles = [1, 0.95, 0.9, 0.75, 0.5, 0.25, 0.1, 0.05, 0]
-        quant_colors = [x for x in sns.color_palette(f'{diverging_palette}',n_colors=7001)[::1000]]
-
-        prev_limit = 0
-        for idx, lim in enumerate([x/8 for x in range(0,9)]):
-            ax.barh([1], lim-prev_limit, left=prev_limit, height=10, color=quant_colors[idx-1])
-            if idx in [0,8]:
-                continue
-            props = dict(boxstyle='Round',
-                       facecolor='w',
-                       alpha=0.75, 
-                       edgecolor='#cccccc',
-                       linewidth=2)
-            ax.text(lim,
-                  0,
-                  '{:.0f}%'.format(quantiles[::-1][idx]*100),
-                  color='k',
-                  fontsize=10,
-                  fontweight=500,
-                  ha='center',
-                  bbox=props
-                  )
-            prev_limit = lim
-
-        ax.axvline(0.5,
-                 ymin=0.08,
-                 ymax=0.92,
-                 color='w', 
-                 linewidth=2)
-        ax.set(xlim=(0,1.025))
-        ax.set_xticklabels([])
-        ax.set_yticks([])
-        ax.tick_params(bottom=False)
-        sns.despine()
-
-    def plv_card():
-        pitch_list = list(pq_df
-                          .loc[(pq_df['pitchername']==player)]
-                          .groupby('pitchtype',as_index=False)
-                          ['num_pitches']
-                          .sum()
-                          .query(f'num_pitches >= {int(pitch_threshold/20)}')
-                          .sort_values('num_pitches',
-                                       ascending=False)
-                          ['pitchtype']
-                          .unique())
-
-        fig = plt.figure(figsize=(8,8))
-
-        # Parameters to divide card
-        grid_height = len(pitch_list)+4
-        pitch_feats = len(pitch_list)+1
-
-        # Divide card into tiles
-        grid = plt.GridSpec(grid_height, 3, wspace=0, hspace=0.2, width_ratios=[1,3,1],
-                          height_ratios=[0.75,1]+[7.5/pitch_feats]*(pitch_feats)+[0.75])
-
-        title_ax = plt.subplot(grid[0, :-1])
-        title_ax.text(-0.15,0,"{}'s\n{} Pitch Quality{}".format(player,year,'' if handedness=='All' else f' (vs {hand_map[handedness][0]}HB)'), 
-                      ha='center', va='center', fontsize=20,
-               bbox=dict(facecolor='#162B50', alpha=0.6, edgecolor='#162B50'))
-        title_ax.set(xlabel=None, xlim=(-1,1), ylabel=None, ylim=(-1,1))
-        title_ax.set_xticklabels([])
-        title_ax.set_yticklabels([])
-        title_ax.tick_params(left=False, bottom=False)
-
-        plv_desc_ax = plt.subplot(grid[1, 1])
-        plv_desc_ax.text(0,-0.8,"PLV", ha='center', va='bottom', fontsize=18,
-               bbox=dict(facecolor='#162B50', alpha=0.6, edgecolor='#162B50'))
-        plv_desc_ax.set(xlabel=None, xlim=(-1,1), ylabel=None, ylim=(-1,1))
-        plv_desc_ax.set_xticklabels([])
-        plv_desc_ax.set_yticklabels([])
-        plv_desc_ax.tick_params(left=False, bottom=False)
-
-        pla_desc_ax = plt.subplot(grid[1, 2])
-        pla_desc_ax.text(-0.25,-0.4,"PLA", ha='center', va='bottom', fontsize=18)
-        pla_desc_ax.text(-0.25,-0.45,"(xRuns per 9IP*)", ha='center', va='top', fontsize=10)
-        pla_desc_ax.set(xlabel=None, xlim=(-1,1), ylabel=None, ylim=(-1,1))
-        pla_desc_ax.set_xticklabels([])
-        pla_desc_ax.set_yticklabels([])
-        pla_desc_ax.tick_params(left=False, bottom=False)
-
-        ax_num = 2
-        total_pitches = pq_df.loc[(pq_df['pitchername']==player),'num_pitches'].sum()
-        for pitch in ['All']+pitch_list:
-            type_ax = plt.subplot(grid[ax_num, 0])
-            type_ax.text(0.25,-0.1, f'{pitch}', ha='center', va='bottom', 
-                         fontsize=20, fontweight='bold',
-                         color='w' if pitch=='All' else color_palette[pitch])
-            if pitch!='All':
-                usage = pq_df.loc[(pq_df['pitchername']==player) &
-                                   (pq_df['pitchtype']==pitch),'num_pitches'].sum() / total_pitches * 100
-                type_ax.text(0.25,-0.1,'({:.0f}%)'.format(usage), ha='center', va='top', fontsize=10)
-            else:
-                type_ax.text(0.25,-0.1,'(Usage%)', ha='center', va='top', fontsize=12)
-            type_ax.set(xlabel=None, xlim=(-1,1), ylabel=None, ylim=(-1,1))
-            type_ax.set_xticklabels([])
-            type_ax.set_yticklabels([])
-            type_ax.tick_params(left=False, bottom=False)
-            ax_num+=1
-
-        plv_dist_ax = plt.subplot(grid[2, 1])
-        plv_kde(pq_df,
-                player,
-                len(pitch_list),
-                plv_dist_ax)
-        ax_num = 3
-        for pitch in pitch_list:
-            pitch_ax = plt.subplot(grid[ax_num, 1])
-            plv_kde(pq_df, 
-                    player, 
-                    len(pitch_list), 
-                    pitch_ax, 
-                    pitchtype=pitch)
-            ax_num+=1
-
-        ax_num = 2
-        for pitch in ['PLA']+pitch_list:
-            val = pq_df.loc[pq_df['pitchername']==player,'PLA'].mean() if pitch=='PLA' else pq_df.loc[(pq_df['pitchername']==player) &
-                                                                                                      (pq_df['pitchtype']==pitch),'pitchtype_pla'].mean()
-            pla_ax = plt.subplot(grid[ax_num, 2])
-            pla_ax.text(-0.25,0,'{:.2f}'.format(val), ha='center', va='center', 
-                        fontsize=20)
-            pla_ax.set(xlabel=None, xlim=(-1,1), ylabel=None, ylim=(-1,1))
-            pla_ax.set_xticklabels([])
-            pla_ax.set_yticklabels([])
-            pla_ax.tick_params(left=False, bottom=False)
-            ax_num+=1
-
-        league_ax = plt.subplot(grid[-1, 0])
-        league_ax.text(0.8,0,"League\nPercentile:", ha='right', va='center', fontsize=14)
-        league_ax.set(xlabel=None, xlim=(-1,1), ylabel=None, ylim=(-1,1))
-        league_ax.set_xticklabels([])
-        league_ax.set_yticklabels([])
-        league_ax.tick_params(left=False, bottom=False)
-
-        percent_bar_ax = plt.subplot(grid[-1, 1])
-        percent_bar(percent_bar_ax)
-
-        disclaimer_ax = plt.subplot(grid[-1, 2])
-        disclaimer_ax.text(-0.25,0,"*IP based on \nUsage %", ha='center', va='center', fontsize=10)
-        disclaimer_ax.set(xlabel=None, xlim=(-1,1), ylabel=None, ylim=(-1,1))
-        disclaimer_ax.set_xticklabels([])
-        disclaimer_ax.set_yticklabels([])
-        disclaimer_ax.tick_params(left=False, bottom=False)
-        
-        # Add PL logo
-        pl_ax = fig.add_axes([0.675,0.7,0.2,0.2], anchor='NE', zorder=1)
-        pl_ax.imshow(logo)
-        pl_ax.axis('off')
-
-        sns.despine()
-        st.pyplot(fig)
-
-    plv_card()
+    # Card data and league distributions for every handedness split, so the
+    # hand slider only picks one of them
+    @st.cache_data
+    def load_pq_splits(year, pitch_threshold):
+        return plv_card.pq_splits(pitcher_df, year, pitch_threshold)
+    pq_df, distributions = load_pq_splits(year, pitch_threshold)[season_store.split_key(pitcher_hand, hand_map[handedness])]
+
+    st.image(figure_cache.render(['plv_card',year,player,handedness,palette,pitch_threshold,data_version],
+                                 lambda: plv_card.plv_card(pq_df,distributions,player,year,pitch_threshold,
+                                                           mean_plv,handedness,color_palette)))
     
 else:
     def movement_chart():
-        hand = plv_df.loc[(plv_df['pitchername']==player),'p_hand'].values[0]
-        move_df = plv_df.loc[(plv_df['pitchername']==player)].copy()
+        # In pitch order, so overlapping markers draw as they always have
+        move_df = pitch_index.frame(player).sort_values('pitch_id')
+        hand = move_df['p_hand'].values[0]
         
         pitch_list = [x[0] for x in Counter(move_df['pitchtype']).most_common() if (x[0] != 'UN')]
         
@@ -674,7 +368,7 @@ else:
         ax.axhline(0, color='w', linestyle='--', linewidth=1, alpha=0.5)
         ax.axvline(0, color='w', linestyle='--', linewidth=1, alpha=0.5)
         
-        sns.scatterplot(data=move_df.groupby('pitchtype')[['IVB','IHB']].mean().reset_index(),
+        sns.scatterplot(data=move_df.groupby('pitchtype', observed=True)[['IVB','IHB']].mean().reset_index(),
                         x='IHB',
                         y='IVB',
                         hue='pitchtype',
@@ -728,9 +422,10 @@ else:
         pl_ax.axis('off')
         
         sns.despine()
-        st.pyplot(fig)
+        return fig
         
-    movement_chart()
+    st.image(figure_cache.render(['movement_chart',year,player,palette,data_version],
+                                 movement_chart))
     
 st.title("General Pitch Quality")
 st.write('- ***Quality Pitch (QP%)***: Pitch with a PLV >= 5.5')
@@ -738,26 +433,16 @@ st.write('- ***Average Pitch (AP%)***: Pitch with 4.5 < PLV < 5.5')
 st.write('- ***Bad Pitch (BP%)***: Pitch with a PLV <= 4.5')
 st.write('- ***QP-BP%***: Difference between QP and BP. Avg is 7%')
 
-class_df = (plv_df
-             .rename(columns={
-                 'pitchername':'Pitcher'
-             })
-             .groupby('Pitcher')
-             [['Quality Pitch','Average Pitch','Bad Pitch','pitch_id']]
-             .agg({
-                 'Quality Pitch':'mean',
-                 'Average Pitch':'mean',
-                 'Bad Pitch':'mean',
-                 'pitch_id':'count'
-             })
-             .query(f'pitch_id >={pitch_threshold}')
-             .assign(QP_BP=lambda x: x['Quality Pitch'] - x['Bad Pitch'])
+class_df = (pitcher_cube.quality_rates(pitcher_df, year)
+             .rename_axis('Pitcher')
+             .query(f'tracked_pitches >={pitch_threshold}')
+             .assign(QP_BP=lambda x: x['quality_pitches'] - x['bad_pitches'])
              .rename(columns={
-                 'Quality Pitch':'QP%',
-                 'Average Pitch':'AP%',
-                 'Bad Pitch':'BP%',
+                 'quality_pitches':'QP%',
+                 'average_pitches':'AP%',
+                 'bad_pitches':'BP%',
                  'QP_BP':'QP-BP%',
-                 'pitch_id':'# Pitches'
+                 'tracked_pitches':'# Pitches'
              })
              [['# Pitches','QP%','AP%','BP%','QP-BP%']]
              .mul([1,100,100,100,100])
@@ -0,0 +1,69 @@
+import numpy as np
+
+## Arsenal summary
+# The Pitch Distribution chart needs, per pitch type: a histogram of the
+# pitcher's PLVs, their mean PLV, the league mean, and pitch counts/usage, each
+# split by handedness. All of that comes from one groupby pass over the season
+# into per-(pitcher, pitchtype, p_hand, b_hand, PLV bin) counts and sums, so
+# drawing the chart only reads a few small arrays for the chosen pitcher,
+# however many pitches the league threw.
+summary_keys = ['pitchername','pitchtype','p_hand','b_hand']
+
+# 0.5 PLV bins over 0-10 (PLVs outside that are clipped into the end bins)
+bin_width = 0.5
+bin_range = (0,10)
+bin_edges = np.arange(bin_range[0], bin_range[1]+bin_width, bin_width)
+n_bins = len(bin_edges) - 1
+
+def plv_bin(plv):
+    # Histogram bin of each PLV, with the last bin closed like np.histogram; -1 if missing
+    plv = np.clip(np.asarray(plv, dtype='float64'), *bin_range)
+    idx = np.minimum(np.floor((plv - bin_range[0]) / bin_width), n_bins-1)
+    return np.where(np.isnan(idx), -1, idx).astype('int8')
+
+def build_summary(df):
+    # Per-bin pitch counts, PLV counts and PLV sums for every pitcher/pitchtype/handedness.
+    # Pitches without a PLV only count towards num_pitches (bin -1)
+    cells = (df[summary_keys]
+             .assign(PLV=df['PLV'].astype('float64'),
+                     plv_bin=plv_bin(df['PLV']))
+             .groupby(summary_keys+['plv_bin'], observed=True)
+             ['PLV']
+             .agg(['size','count','sum'])
+             .rename(columns={'size':'num_pitches','count':'plv_count','sum':'plv_sum'})
+             .reset_index()
+            )
+    return cells
+
+def player_arsenal(summary, player, b_hand=['L','R']):
+    # Per-pitchtype counts, usage, mean PLV and binned PLV histogram for one pitcher
+    cells = summary.loc[(summary['pitchername']==player) &
+                        summary['b_hand'].isin(b_hand)]
+    arsenal = (cells
+               .groupby('pitchtype', observed=True)
+               [['num_pitches','plv_count','plv_sum']]
+               .sum()
+              )
+    arsenal['usage'] = arsenal['num_pitches'] / arsenal['num_pitches'].sum()
+    arsenal['plv'] = arsenal['plv_sum'] / arsenal['plv_count'].replace(0, np.nan)
+
+    hists = (cells
+             .loc[cells['plv_bin']>=0]
+             .pivot_table(index='pitchtype', columns='plv_bin', values='plv_count',
+                          aggfunc='sum', observed=True)
+             .reindex(index=arsenal.index, columns=range(n_bins))
+             .fillna(0)
+            )
+    arsenal['hist'] = list(hists.to_numpy())
+    return arsenal.sort_values('num_pitches', ascending=False)
+
+def league_plv(summary, p_hand=['L','R'], b_hand=['L','R']):
+    # League mean PLV per pitchtype, for the given pitcher/hitter handedness
+    league = (summary
+              .loc[summary['p_hand'].isin(p_hand) &
+                   summary['b_hand'].isin(b_hand)]
+              .groupby('pitchtype', observed=True)
+              [['plv_count','plv_sum']]
+              .sum()
+             )
+    return league['plv_sum'] / league['plv_count'].replace(0, np.nan)
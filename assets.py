@@ -0,0 +1,37 @@
+import functools
+import numpy as np
+
+from pathlib import Path
+from PIL import Image
+
+## Static assets
+# Loaded from the repo once per process (instead of fetched from GitHub on
+# every rerun), and kept as RGBA arrays already downsampled to the size
+# they're drawn at, so imshow/st.image don't resample the full image each time
+asset_dir = Path(__file__).resolve().parent / 'data'
+
+# Pixel widths the Pitcher List logo is actually drawn at:
+# - header: st.image(logo, width=200), doubled for high-DPI screens
+# - chart: 0.15-0.2 of a 7-11" wide figure, at st.pyplot's 200 dpi
+logo_widths = {
+    'header':400,
+    'chart':440,
+}
+
+@functools.lru_cache(maxsize=None)
+def load_image(name):
+    with Image.open(asset_dir / name) as image:
+        return image.convert('RGBA')
+
+@functools.lru_cache(maxsize=None)
+def image_array(name, width):
+    image = load_image(name)
+    if image.width > width:
+        image = image.resize((width, round(image.height * width / image.width)),
+                             Image.LANCZOS)
+    array = np.asarray(image)
+    array.setflags(write=False)
+    return array
+
+def logo(size='chart'):
+    return image_array('PL-text-wht.png', logo_widths[size])
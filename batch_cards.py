@@ -0,0 +1,182 @@
+import argparse
+import multiprocessing as mp
+import os
+
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+import pandas as pd
+
+from pathlib import Path
+
+import figure_cache
+import pitcher_card
+import pitcher_cube
+import pitchtype_card
+import plv_card
+import season_store
+
+## Batch card rendering
+# Renders the apps' cards headlessly, for a player list (or every qualified
+# player) in a date range:
+# - game: pitcher_card's game vs season cards, for every game in the range
+# - pitchtype/milb: the MLB/AAA pitchtype card of every pitchtype thrown in it
+# - plv: the season PLV card (no date range; min_pitches is its pitch threshold)
+# A card kind's data is loaded once in the parent process; with the fork start
+# method the workers inherit it copy-on-write instead of each reloading it
+# (under spawn, each worker loads it once through the pool initializer).
+card_kinds = ['game','pitchtype','milb','plv']
+
+# Pitches a player needs in a game (game), of a pitchtype in the range
+# (pitchtype/milb) or in the season (plv) to qualify
+default_min_pitches = {
+    'game':20,
+    'pitchtype':100,
+    'milb':100,
+    'plv':500,
+}
+
+_data = None
+
+def slate_dates(year, start_date=None, end_date=None):
+    # Game dates ('YYYY-MM-DD') of the season in the range; the range defaults
+    # to the season's last game date
+    dates = sorted(season_store.load_season(year,'PLV',columns=['game_played'])['game_played']
+                   .dt.strftime('%Y-%m-%d')
+                   .unique())
+    end_date = end_date or dates[-1]
+    start_date = start_date or end_date
+    return [date for date in dates if start_date <= date <= end_date]
+
+def load_data(card, year, start_date=None, end_date=None, stat='velo', min_pitches=None):
+    global _data
+    if card=='game':
+        # Each game date's slate, from pitcher_card's one-load slate frames
+        _data = {game_date:pitcher_card.generate_slate(game_date, stat)
+                 for game_date in slate_dates(year, start_date, end_date)}
+    elif card=='pitchtype':
+        _data = pitchtype_card.load_data(year)
+    elif card=='milb':
+        _data = pitchtype_card.load_milb_data(year)
+    else:
+        pitch_threshold = default_min_pitches[card] if min_pitches is None else min_pitches
+        cube = pitcher_cube.load_cube()
+        _data = (plv_card.pq_split(cube, year, pitch_threshold),
+                 plv_card.league_plv(pitcher_cube.pla_frame(cube, year, pitch_threshold)))
+    return _data
+
+def date_range(pitch_df, start_date=None, end_date=None):
+    # Dates of a pitchtype card's range (None: the player's own season bounds)
+    start_date = None if start_date is None else pd.Timestamp(start_date).date()
+    end_date = None if end_date is None else pd.Timestamp(end_date).date()
+    in_range = pitch_df['game_played'].between(start_date or pitch_df['game_played'].min(),
+                                               end_date or pitch_df['game_played'].max())
+    return start_date, end_date, in_range
+
+def card_jobs(card, data, start_date=None, end_date=None, players=None, min_pitches=None):
+    # (player, label) of every card to render: the game date of a game card,
+    # the pitchtype of a pitchtype card (none for a PLV card)
+    min_pitches = default_min_pitches[card] if min_pitches is None else min_pitches
+    if card=='game':
+        jobs = []
+        for game_date, slate in data.items():
+            for player, chart_df in slate.items():
+                if (player in players if players is not None else
+                    chart_df['pitch_group'].sum() >= min_pitches):
+                    jobs += [(player, game_date)]
+    elif card in ['pitchtype','milb']:
+        _, _, in_range = date_range(data.df, start_date, end_date)
+        pitches = (data.df
+                   .loc[in_range]
+                   .groupby(['pitchername','pitchtype'], observed=True)
+                   .size())
+        if players is None:
+            pitches = pitches.loc[pitches >= min_pitches]
+        else:
+            pitches = pitches.loc[pitches.index.get_level_values('pitchername').isin(players) &
+                                  (pitches >= pitchtype_card.pitch_thresh)]
+        jobs = list(pitches.index)
+    else:
+        (pq_df, _), _ = data
+        qualified = pq_df.loc[pq_df['season_pitches'] >= min_pitches,'pitchername'].unique()
+        jobs = [(player, None) for player in sorted(qualified) if players is None or player in players]
+    return jobs
+
+def card_figures(card, player, label, year, stat='velo', chart_type='Bar',
+                 start_date=None, end_date=None, min_pitches=None):
+    if card=='game':
+        return pitcher_card.card_figures(_data[label][player], player, stat, year, label)
+    elif card in ['pitchtype','milb']:
+        start_date, end_date, _ = date_range(_data.df, start_date, end_date)
+        return [pitchtype_card.pitchtype_card(_data, player, label, chart_type, year, start_date, end_date,
+                                              level='MLB' if card=='pitchtype' else 'AAA')]
+    else:
+        (pq_df, distributions), mean_plv = _data
+        pitch_threshold = default_min_pitches[card] if min_pitches is None else min_pitches
+        return [plv_card.plv_card(pq_df, distributions, player, year, pitch_threshold, mean_plv)]
+
+def render_card(card, player, label, year, options, out_dir):
+    paths = []
+    for num, fig in enumerate(card_figures(card, player, label, year, **options)):
+        name = '_'.join([player.replace(' ','_'), card] + ([] if label is None else [label]) + [str(num)])
+        path = Path(out_dir) / f'{name}.png'
+        # Saved as the app renders the card (game cards, as pitcher_card saves them)
+        fig.savefig(path, **({} if card=='game' else figure_cache.savefig_options))
+        plt.close(fig)
+        paths += [path]
+    return paths
+
+def _render_job(job):
+    # A card that can't be drawn (e.g. a pitch with too few locations for its
+    # density) is reported instead of stopping the batch
+    try:
+        return render_card(*job), None
+    except Exception as error:
+        card, player, label = job[:3]
+        label_text = '' if label is None else f' {label}'
+        return [], f'{card} {player}{label_text}: {error!r}'
+
+def render_cards(card, year, start_date=None, end_date=None, players=None, stat='velo', chart_type='Bar',
+                 out_dir='cards', processes=None, min_pitches=None):
+    Path(out_dir).mkdir(parents=True, exist_ok=True)
+    data = load_data(card, year, start_date, end_date, stat, min_pitches)
+    options = {'stat':stat, 'chart_type':chart_type, 'start_date':start_date,
+               'end_date':end_date, 'min_pitches':min_pitches}
+    jobs = [(card, player, label, year, options, out_dir)
+            for player, label in card_jobs(card, data, start_date, end_date, players, min_pitches)]
+    if len(jobs) == 0:
+        return [], []
+
+    if 'fork' in mp.get_all_start_methods():
+        pool = mp.get_context('fork').Pool(processes)
+    else:
+        pool = mp.get_context('spawn').Pool(processes, initializer=load_data,
+                                            initargs=(card, year, start_date, end_date, stat, min_pitches))
+    with pool:
+        results = pool.map(_render_job, jobs)
+    return ([path for paths, _ in results for path in paths],
+            [error for _, error in results if error is not None])
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Render the apps' cards to PNG")
+    parser.add_argument('--card', choices=card_kinds, default='game')
+    parser.add_argument('--year', type=int, required=True)
+    parser.add_argument('--start-date', default=None,
+                        help="YYYY-MM-DD (default: the last game date for game cards, each player's first game otherwise)")
+    parser.add_argument('--end-date', default=None,
+                        help="YYYY-MM-DD (default: the last game date for game cards, each player's last game otherwise)")
+    parser.add_argument('--players', nargs='+', default=None,
+                        help='Pitcher names (default: every pitcher with --min-pitches)')
+    parser.add_argument('--min-pitches', type=int, default=None,
+                        help=f'Default: {", ".join(f"{card} {count}" for card, count in default_min_pitches.items())}')
+    parser.add_argument('--stat', default='velo', help='Game cards: the compared stat')
+    parser.add_argument('--chart-type', choices=['Bar','Violin'], default='Bar', help='Pitchtype cards: the chart style')
+    parser.add_argument('--out-dir', default='cards')
+    parser.add_argument('--processes', type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    paths, errors = render_cards(args.card, args.year, args.start_date, args.end_date, args.players, args.stat,
+                                 args.chart_type, args.out_dir, args.processes, args.min_pitches)
+    for error in errors:
+        print(f'Failed: {error}')
+    print(f'{len(paths):,} images -> {args.out_dir}')
@@ -0,0 +1,231 @@
+import argparse
+import json
+import os
+import uuid
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from pathlib import Path
+from scipy import signal
+
+import figure_cache
+import season_store
+
+## Batted ball density surfaces
+# The batted ball charts compare a hitter's spray angle/launch angle density
+# to the league's on a 1-degree grid. Evaluating sp.stats.gaussian_kde at
+# every grid point costs points x grid cells; instead the batted balls are
+# linearly binned onto the grid once, and the bins are convolved with the same
+# Gaussian kernel gaussian_kde would use (Scott's rule bandwidth on the data
+# covariance), so a surface costs one histogram and one FFT convolution.
+
+# Chart grid: spray angle 0-90 (x) and launch angle -30-60 (y), 1 degree apart
+x_range = (0, 90)
+y_range = (-30, 60)
+grid_shape = (x_range[1]-x_range[0]+1, y_range[1]-y_range[0]+1)
+
+def grid():
+    return np.mgrid[x_range[0]:x_range[1]:complex(grid_shape[0]),
+                    y_range[0]:y_range[1]:complex(grid_shape[1])]
+
+def bin_counts(x, y):
+    # Linear binning: each point is split between its 4 surrounding grid
+    # points, weighted by how close it is to each
+    gx = np.clip(np.asarray(x, dtype='float64') - x_range[0], 0, grid_shape[0]-1)
+    gy = np.clip(np.asarray(y, dtype='float64') - y_range[0], 0, grid_shape[1]-1)
+    x0 = np.minimum(np.floor(gx).astype('int64'), grid_shape[0]-2)
+    y0 = np.minimum(np.floor(gy).astype('int64'), grid_shape[1]-2)
+    dx = gx - x0
+    dy = gy - y0
+
+    counts = np.zeros(grid_shape)
+    np.add.at(counts, (x0, y0), (1-dx)*(1-dy))
+    np.add.at(counts, (x0+1, y0), dx*(1-dy))
+    np.add.at(counts, (x0, y0+1), (1-dx)*dy)
+    np.add.at(counts, (x0+1, y0+1), dx*dy)
+    return counts
+
+def kde_kernel(x, y):
+    # gaussian_kde's kernel: data covariance scaled by Scott's factor
+    # n**(-1/(d+4)), evaluated at every grid offset
+    values = np.vstack([np.asarray(x, dtype='float64'), np.asarray(y, dtype='float64')])
+    factor = values.shape[1] ** (-1/6)
+    inv_cov = np.linalg.inv(np.cov(values) * factor**2)
+
+    dx, dy = np.mgrid[-grid_shape[0]+1:grid_shape[0], -grid_shape[1]+1:grid_shape[1]]
+    offsets = np.stack([dx, dy], axis=-1)
+    return np.exp(-0.5 * np.einsum('...i,ij,...j->...', offsets, inv_cov, offsets))
+
+def density(x, y):
+    # Batted ball density on the chart grid, scaled to sum to 100 (like the
+    # charts' normalized gaussian_kde surfaces)
+    surface = signal.fftconvolve(bin_counts(x, y), kde_kernel(x, y), mode='same')
+    surface = np.clip(surface, 0, None)
+    return surface * (100/surface.sum())
+
+## Batted ball store
+# The batted ball frame holds every season, so reading it per year meant
+# downloading and filtering all of it. It's split once into one parquet per
+# game_year (the chart bounds already applied, both angles as float32), and
+# only the needed years get read.
+batted_ball_file = Path(__file__).resolve().parent / 'hitter_app' / 'pages' / 'batted_ball_df.parquet'
+batted_ball_remote = 'https://github.com/Blandalytics/PLV_viz/blob/main/hitter_app/pages/batted_ball_df.parquet?raw=true'
+batted_ball_cols = ['hittername','stand','spray_deg','launch_angle']
+
+def batted_ball_path(year):
+    return season_store.store_dir / 'BattedBall' / f'year={year}' / 'part-0.parquet'
+
+def ingest_batted_balls():
+    pitch_data = pd.read_parquet(batted_ball_file if batted_ball_file.exists() else batted_ball_remote,
+                                 columns=['game_year']+batted_ball_cols)
+    bbe_df = (pitch_data
+              .astype({'spray_deg':'float',
+                       'launch_angle':'float'})
+              .loc[lambda x: x['spray_deg'].between(*x_range) & x['launch_angle'].between(*y_range)]
+              .dropna(subset=['spray_deg','launch_angle'])
+              .astype({'hittername':'category',
+                       'stand':'category',
+                       'spray_deg':'float32',
+                       'launch_angle':'float32'})
+             )
+
+    years = sorted(bbe_df['game_year'].unique())
+    for year, year_df in bbe_df.groupby('game_year'):
+        year_df = year_df[batted_ball_cols].copy()
+        year_df['hittername'] = year_df['hittername'].cat.remove_unused_categories()
+        season_store.write_atomic(pa.Table.from_pandas(year_df, preserve_index=False), batted_ball_path(year))
+    return years
+
+def load_batted_balls(year):
+    # One season's batted balls (empty for a season without data)
+    if not batted_ball_path(year).parent.parent.exists():
+        ingest_batted_balls()
+    if not batted_ball_path(year).exists():
+        return pd.DataFrame({'hittername':pd.Categorical([]), 'stand':pd.Categorical([]),
+                             'spray_deg':np.array([], dtype='float32'),
+                             'launch_angle':np.array([], dtype='float32')})
+    return pq.read_table(batted_ball_path(year)).to_pandas()
+
+## Precomputed surfaces
+# Every hitter's (and the league's) surface for a year is built offline into
+# one float16 (n, 91, 91) array on disk, with an index of hitter -> offset.
+# The app memory-maps the arrays of the years it shows, so a league or
+# prior-year comparison is a subtraction of two slices, and comparing every
+# hitter's seasons (e.g. for a most-changed profile leaderboard) is a pass
+# over two arrays. The index records the version (mtime/size) of the
+# batted ball partition the surfaces were built from, so a re-ingested
+# partition gets its surfaces rebuilt.
+league_name = 'MLB'
+# gaussian_kde needs more points than dimensions (and a non-singular covariance)
+min_bbe = 3
+
+def surfaces_dir(year):
+    return season_store.store_dir / 'batted_ball_density' / f'year={year}'
+
+def source_version(year):
+    return json.dumps(figure_cache.data_version(batted_ball_path(year)))
+
+def built_version(year):
+    # Source version the year's surfaces were built from (None if unbuilt)
+    path = surfaces_dir(year)
+    if not ((path / 'surfaces.npy').exists() and (path / 'index.parquet').exists()):
+        return None
+    metadata = pq.read_schema(path / 'index.parquet').metadata or {}
+    return metadata.get(b'source_version', b'').decode() or None
+
+def build_surfaces(year, min_bbe=min_bbe):
+    bbe_df = load_batted_balls(year)
+    version = source_version(year)
+    index, surfaces = [], []
+    if len(bbe_df) > 0:
+        index += [{'hittername':league_name, 'stand':None, 'bbe':len(bbe_df)}]
+        surfaces += [density(bbe_df['spray_deg'], bbe_df['launch_angle'])]
+
+    for hitter, hitter_df in bbe_df.groupby('hittername', observed=True):
+        if len(hitter_df) < min_bbe:
+            continue
+        try:
+            surface = density(hitter_df['spray_deg'], hitter_df['launch_angle'])
+        except np.linalg.LinAlgError:
+            continue
+        index += [{'hittername':hitter, 'stand':hitter_df['stand'].value_counts().index[0], 'bbe':len(hitter_df)}]
+        surfaces += [surface]
+
+    path = surfaces_dir(year)
+    path.mkdir(parents=True, exist_ok=True)
+    tmp_path = path / f'.{uuid.uuid4().hex}.npy'
+    array = np.lib.format.open_memmap(tmp_path, mode='w+', dtype='float16', shape=(len(surfaces),)+grid_shape)
+    for offset, surface in enumerate(surfaces):
+        array[offset] = surface
+    array.flush()
+    del array
+    os.replace(tmp_path, path / 'surfaces.npy')
+
+    index = (pd.DataFrame(index, columns=['hittername','stand','bbe'])
+             .astype({'hittername':'str', 'bbe':'int32'})
+             .assign(offset=lambda x: np.arange(len(x), dtype='int32')))
+    table = pa.Table.from_pandas(index, preserve_index=False)
+    table = table.replace_schema_metadata({**table.schema.metadata, b'source_version':version.encode()})
+    season_store.write_atomic(table, path / 'index.parquet')
+    return index
+
+class DensitySurfaces:
+    # Memory-mapped surfaces, opened per year on first use, and (re)built
+    # whenever they're missing or their batted ball partition has changed
+    def __init__(self):
+        self.years = {}
+        self.versions = {}
+
+    def year(self, year):
+        version = source_version(year)
+        if self.versions.get(year) != version:
+            path = surfaces_dir(year)
+            if built_version(year) != version:
+                build_surfaces(year)
+            self.years[year] = (np.load(path / 'surfaces.npy', mmap_mode='r'),
+                                pd.read_parquet(path / 'index.parquet').set_index('hittername'))
+            self.versions[year] = built_version(year)
+        return self.years[year]
+
+    def hitters(self, year):
+        return sorted(self.year(year)[1].index.drop(league_name, errors='ignore'))
+
+    def has(self, year, hitter=league_name):
+        return hitter in self.year(year)[1].index
+
+    def stand(self, year, hitter):
+        return self.year(year)[1].loc[hitter, 'stand']
+
+    def surface(self, year, hitter=league_name):
+        surfaces, index = self.year(year)
+        return surfaces[index.loc[hitter, 'offset']].astype('float32')
+
+    def most_changed(self, year, min_bbe=min_bbe):
+        # Hitters whose batted ball profile moved the most from the prior year:
+        # half the summed absolute difference of the two surfaces, i.e. the
+        # share (%) of batted ball density that shifted
+        surfaces, index = self.year(year)
+        prior_surfaces, prior_index = self.year(year-1)
+        both = (index
+                .drop(league_name, errors='ignore')
+                .query(f'bbe >= {min_bbe}')
+                .join(prior_index.query(f'bbe >= {min_bbe}')[['bbe','offset']], how='inner', rsuffix='_prior'))
+        diff = (surfaces[both['offset'].to_numpy()].astype('float32') -
+                prior_surfaces[both['offset_prior'].to_numpy()].astype('float32'))
+        return (both
+                .assign(profile_change=np.abs(diff).sum(axis=(1,2)) / 2)
+                [['stand','bbe','bbe_prior','profile_change']]
+                .sort_values('profile_change', ascending=False)
+               )
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Split the batted ball data by year and build the per-hitter density surfaces')
+    parser.add_argument('--min-bbe', type=int, default=min_bbe)
+    args = parser.parse_args()
+
+    for year in ingest_batted_balls():
+        index = build_surfaces(year, args.min_bbe)
+        print(f'{year}: {index.shape[0]:,} surfaces -> {surfaces_dir(year)}')
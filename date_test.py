@@ -7,19 +7,19 @@ import pandas as pd
 import seaborn as sns
 import scipy as sp
 import urllib
+import season_store
 
 from datetime import time
 from PIL import Image
 from collections import Counter
 from scipy import stats
 
-test_df = pd.read_parquet('https://github.com/Blandalytics/PLV_viz/blob/main/data/date_pitch_map.parquet?raw=true')
-test_df['year_played'] = pd.to_datetime(test_df['game_played']).dt.year
-test_df['game_played'] = pd.to_datetime(test_df['game_played']).dt.date
-st.write(test_df.dtypes)
 years = [2023,2022,2021,2020]
 year = st.radio('Choose a year:', years)
-test_df = test_df.loc[test_df['year_played']==year].copy()
+pitch_ids, days = season_store.load_date_index(year)
+test_df = pd.DataFrame({'pitch_id':pitch_ids,
+                        'game_played':pd.Series(days.astype('datetime64[D]')).dt.date})
+st.write(test_df.dtypes)
 
 date_range = st.slider(
     "Date range:",
@@ -5,9 +5,8 @@ import numpy as np
 import pandas as pd
 import seaborn as sns
 import scipy as sp
-import urllib
+import assets
 
-from PIL import Image
 from collections import Counter
 from scipy import stats
 
@@ -83,9 +82,8 @@ y_bot = -0.5
 y_lim = 6
 plate_y = -.25
 
-logo_loc = 'https://github.com/Blandalytics/PLV_viz/blob/main/data/PL-text-wht.png?raw=true'
-logo = Image.open(urllib.request.urlopen(logo_loc))
-st.image(logo, width=200)
+logo = assets.logo()
+st.image(assets.logo('header'), width=200)
 
 st.title("Pitchtype Cards")
 
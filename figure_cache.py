@@ -0,0 +1,76 @@
+import hashlib
+import io
+import json
+import threading
+import matplotlib.pyplot as plt
+
+from collections import OrderedDict
+from pathlib import Path
+
+## Rendered figure cache
+# Every widget change reruns the whole script, and the charts used to be
+# rebuilt from scratch even when their inputs hadn't changed. Rendered image
+# bytes are kept per process (so shared by every session), keyed by a hash of
+# the chart name, its inputs and the data version, with least-recently-used
+# eviction once the cache holds more than cache_bytes.
+cache_bytes = 256 * 1024**2
+
+# Same output st.pyplot produces
+savefig_options = {'dpi':200, 'bbox_inches':'tight'}
+
+_cache = OrderedDict()
+_cache_size = 0
+_lock = threading.Lock()
+
+def cache_key(*parts):
+    # Canonical hash of the chart inputs (dates, numpy scalars etc. go through str)
+    payload = json.dumps(parts, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+def data_version(*paths):
+    # Changes whenever one of the chart's source files is rebuilt
+    version = []
+    for path in map(Path, paths):
+        if path.exists():
+            stat = path.stat()
+            version += [f'{path.name}:{stat.st_mtime_ns}:{stat.st_size}']
+    return version
+
+def get(key):
+    with _lock:
+        if key in _cache:
+            _cache.move_to_end(key)
+            return _cache[key]
+    return None
+
+def put(key, image):
+    global _cache_size
+    with _lock:
+        if key in _cache:
+            _cache_size -= len(_cache.pop(key))
+        _cache[key] = image
+        _cache_size += len(image)
+        while _cache_size > cache_bytes and len(_cache) > 1:
+            _cache_size -= len(_cache.popitem(last=False)[1])
+
+def clear():
+    global _cache_size
+    with _lock:
+        _cache.clear()
+        _cache_size = 0
+
+def figure_bytes(fig, fmt='png'):
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format=fmt, **savefig_options)
+    plt.close(fig)
+    return buffer.getvalue()
+
+def render(key_parts, build_fig, fmt='png'):
+    # Image bytes of the chart, only calling build_fig() (which returns a
+    # matplotlib figure) when these inputs haven't been rendered yet
+    key = cache_key(*key_parts, fmt)
+    image = get(key)
+    if image is None:
+        image = figure_bytes(build_fig(), fmt)
+        put(key, image)
+    return image
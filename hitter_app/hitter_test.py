@@ -5,17 +5,25 @@ import numpy as np
 import pandas as pd
 import seaborn as sns
 import scipy as sp
-import urllib
+import sys
+
+from pathlib import Path
+sys.path.append(str(Path(__file__).resolve().parents[1])) # repo root, for the shared data modules
+import assets
+import figure_cache
+import league_bands
+import league_baselines
+import player_index
+import rolling_engine
+import season_store
+import zone_smoothing
 
 from matplotlib import ticker
 from matplotlib import colors
-from PIL import Image
 from scipy import stats
-from statsmodels.nonparametric.kernel_regression import KernelReg
 
-logo_loc = 'https://github.com/Blandalytics/PLV_viz/blob/main/data/PL-text-wht.png?raw=true'
-logo = Image.open(urllib.request.urlopen(logo_loc))
-st.image(logo, width=200)
+logo = assets.logo()
+st.image(assets.logo('header'), width=200)
 
 ## Set Styling
 # Plot Style
@@ -78,42 +86,20 @@ season_names = {
 }
 
 # Load Data
-@st.cache_data(ttl=12*3600)
-def load_season_data(year):
-    df = pd.DataFrame()
-    for month in range(3,11):
-        file_name = f'https://github.com/Blandalytics/PLV_viz/blob/main/data/{year}_PLV_App_Data-{month}.parquet?raw=true'
-        df = pd.concat([df,
-                        pd.read_parquet(file_name)[['hittername','p_hand','b_hand','pitch_id','balls','strikes','swing_agg',
-                                                    'strike_zone_judgement','decision_value','contact_over_expected',
-                                                    'adj_power','batter_wOBA','pitchtype','pitch_type_bucket',
-                                                    'in_play_input','p_x','p_z','sz_z','strike_zone_top','strike_zone_bottom'
-                                                   ]]
-                       ])
-    
-    df = df.reset_index(drop=True)
+def build_season_data(year):
+    df = season_store.load_season(year,'PLV',
+                                  columns=['hittername','p_hand','b_hand','pitch_id','balls','strikes','swing_agg',
+                                           'strike_zone_judgement','decision_value','contact_over_expected',
+                                           'adj_power','batter_wOBA','pitchtype','pitch_type_bucket',
+                                           'in_play_input','p_x','p_z','sz_z','strike_zone_top','strike_zone_bottom'
+                                          ])
 
     df.loc[df['p_x'].notna(),'kde_x'] = np.clip(df.loc[df['p_x'].notna(),'p_x'].astype('float').mul(12).round(0).astype('int').div(12),
                                                 -20/12,
                                                 20/12)
-    df.loc[df['sz_z'].notna(),'kde_z'] = np.clip(df.loc[df['sz_z'].notna(),'sz_z'].astype('float').mul(24).round(0).astype('int').div(24),
-                                                 -1.5,
-                                                 1.25)
     
-    df['base_decision_value'] = df['decision_value'].groupby([df['p_hand'],
-                                                              df['b_hand'],
-                                                              df['pitchtype'],
-                                                              df['kde_x'],
-                                                              df['kde_z'],
-                                                              df['balls'],
-                                                              df['strikes']]).transform('mean')
-    df['base_power'] = df['adj_power'].groupby([df['p_hand'],
-                                                df['b_hand'],
-                                                df['pitchtype'],
-                                                df['kde_x'],
-                                                df['kde_z'],
-                                                df['balls'],
-                                                df['strikes']]).transform('mean')
+    # League mean decision value/power for the same hands, pitchtype, location & count
+    df = league_baselines.join_baselines(df, year)
 
     df['sa_oa'] = df['swing_agg'].copy()
     df['dv_oa'] = df['decision_value'].sub(df['base_decision_value'])
@@ -132,14 +118,26 @@ def load_season_data(year):
     df['decision_value'] = df['decision_value'].div(seasonal_constants.loc[year]['run_constant']).mul(100)
     df['batter_wOBA'] = df['batter_wOBA'].div(seasonal_constants.loc[year]['run_constant']).mul(100)
     
-    df['count'] = df['balls'].astype('str')+'-'+df['strikes'].astype('str')
-    
-    return df
+    # Sorted by hitter, so a hitter's pitches are one slice of the frame
+    return player_index.PlayerIndex(season_store.apply_schema(df), player_col='hittername').df
+
+# Built once into a memory-mapped file that every server process shares
+@st.cache_resource(ttl=12*3600)
+def load_season_data(year):
+    df = season_store.shared_frame('hitter_test', year, build_season_data,
+                                   sources=[season_store.season_path(year,'PLV'),
+                                            league_baselines.baseline_path(year)])
+    return player_index.PlayerIndex(df, player_col='hittername')
+
+hitter_index = load_season_data(year)
+plv_df = hitter_index.df
 
-plv_df = load_season_data(year)
+# Rendered charts are cached until the season data or baselines are rebuilt
+data_version = figure_cache.data_version(season_store.season_path(year,'PLV'),
+                                         league_baselines.baseline_path(year))
 
-max_pitches = plv_df.groupby('hittername')['pitch_id'].count().max()
-start_val = int(plv_df.groupby('hittername')['pitch_id'].count().quantile(0.4)/50)*50
+max_pitches = plv_df.groupby('hittername', observed=True)['pitch_id'].count().max()
+start_val = int(plv_df.groupby('hittername', observed=True)['pitch_id'].count().quantile(0.4)/50)*50
 
 # Num Pitches threshold
 pitch_thresh = st.number_input(f'Min # of Pitches faced:',
@@ -204,11 +202,19 @@ stat_values = {
     'batter_wOBA':'Runs Added, per 100 Pitches'
 }
 
-plv_df = plv_df.rename(columns=stat_names)
+# Shallow rename: the columns stay shared with the cached (read-only) frame
+plv_df = plv_df.rename(columns=stat_names, copy=False)
+
+# Each hitter's pitches, pre-sorted with filter codes, for the rolling charts
+@st.cache_resource(ttl=2*3600)
+def load_hitter_events(year, _plv_df):
+    return rolling_engine.HitterEvents(_plv_df, list(stat_names.values()))
+hitter_events = load_hitter_events(year, plv_df)
+
 st.title("Rolling Ability Charts")
 
 # Player
-players = list(plv_df.groupby('hittername', as_index=False)[['pitch_id','Hitter Performance']].agg({
+players = list(plv_df.groupby('hittername', as_index=False, observed=True)[['pitch_id','Hitter Performance']].agg({
     'pitch_id':'count',
     'Hitter Performance':'mean'}).query(f'pitch_id >={pitch_thresh}').sort_values('Hitter Performance', ascending=False)['hittername'])
 default_player = players.index('Juan Soto')
@@ -265,24 +271,32 @@ count_select = st.radio('Count Group',
                         horizontal=True
                        )
  
-if count_select=='All':
-    selected_options = ['0-0', '1-0', '2-0', '3-0', '0-1', '1-1', '2-1', '3-1', '0-2', '1-2', '2-2', '3-2']
-elif count_select=='Hitter-Friendly':
-    selected_options = ['1-0', '2-0', '3-0', '2-1', '3-1']
-elif count_select=='Pitcher-Friendly':
-    selected_options = ['0-1','0-2','1-2']
-elif count_select=='Even':
-    selected_options = ['0-0','1-1','2-2']
-elif count_select=='2-Strike':
-    selected_options = ['0-2','1-2','2-2','3-2']
-elif count_select=='3-Ball':
-    selected_options = ['3-0','3-1','3-2']
+if count_select!='Custom':
+    selected_options = season_store.count_groups[count_select]
 else:
     selected_options = st.multiselect('Select the count(s):',
                                        ['0-0', '1-0', '2-0', '3-0', '0-1', '1-1', '2-1', '3-1', '0-2', '1-2', '2-2', '3-2'],
                                        ['0-0', '1-0', '2-0', '3-0', '0-1', '1-1', '2-1', '3-1', '0-2', '1-2', '2-2', '3-2'])
     
-updated_threshold = int(round(rolling_threshold[metric]*len(selected_options)/12/5)*5 / (3 if year == 2023 else 1))
+# Pitches a hitter needs to qualify for the league reference lines
+def band_threshold(metric, counts):
+    return int(round(rolling_threshold[metric]*len(counts)/12/5)*5 / (3 if year == 2023 else 1))
+updated_threshold = band_threshold(metric, selected_options)
+
+# League reference bands, tabulated for every preset filter combination
+@st.cache_resource(ttl=2*3600)
+def load_bands(year, _plv_df):
+    band_cube = league_bands.BandCube(_plv_df, list(stat_names.values()))
+    bands = league_bands.build_bands(band_cube, list(stat_names.values()), season_store.count_groups, band_threshold)
+    return band_cube, bands
+band_cube, bands = load_bands(year, plv_df)
+
+def league_band(p_hands, b_hands, count_select=count_select, pitchtype_base=pitchtype_base):
+    # Custom count sets aren't tabulated, so they're summed from the cube
+    if count_select=='Custom':
+        return league_bands.band_stats(band_cube, metric, selected_options, pitchtype_select,
+                                       p_hands, b_hands, updated_threshold)
+    return league_bands.lookup(bands, metric, count_select, pitchtype_base, p_hands, b_hands)
 
 # Hitter Handedness
 handedness = st.select_slider(
@@ -293,7 +307,9 @@ handedness = st.select_slider(
 if handedness=='All':
     hitter_hand = ['L','R']
 else:
-    hitter_hand = list(plv_df.loc[(plv_df['hittername']==player),'b_hand'].unique())
+    # Stances in the order the hitter first used them (the slice is in pitchtype order)
+    hitter_df = plv_df.iloc[hitter_index.rows(player)]
+    hitter_hand = list(hitter_df['b_hand'].iloc[np.argsort(hitter_df['pitch_id'].to_numpy(), kind='stable')].unique())
 
 hand_map = {
     'Left':['L'],
@@ -301,38 +317,18 @@ hand_map = {
     'Right':['R']
 }
 
-chart_thresh_list = (plv_df
-                     .loc[plv_df['count'].astype('str').isin(selected_options) &
-                          plv_df['pitch_type_bucket'].isin(pitchtype_select) &
-                          plv_df['b_hand'].isin(hitter_hand) &
-                          plv_df['p_hand'].isin(hand_map[handedness])
-                         ]
-                     .groupby('hittername')
-                     [['pitch_id',metric]]
-                     .agg({
-                         'pitch_id':'count',
-                         metric:'mean'
-                     })
-                     .query(f'pitch_id >= {updated_threshold}')
-                     .copy()
-                    )
-
-chart_mean = plv_df.loc[plv_df['count'].isin(selected_options) & plv_df['pitch_type_bucket'].isin(pitchtype_select),metric].mean()
-chart_90 = chart_thresh_list[metric].quantile(0.9)
-chart_75 = chart_thresh_list[metric].quantile(0.75)
-chart_25 = chart_thresh_list[metric].quantile(0.25)
-chart_10 = chart_thresh_list[metric].quantile(0.1)
+band = league_band(hand_map[handedness], hitter_hand)
+
+chart_mean = league_band(['L','R'], ['L','R'])['league_mean']
+chart_90 = band['q90']
+chart_75 = band['q75']
+chart_25 = band['q25']
+chart_10 = band['q10']
 
+# Replaces the column in this rerun's renamed frame only (copy-on-write)
 plv_df[metric] = plv_df[metric].replace([np.inf, -np.inf], np.nan)
-rolling_df = (plv_df
-              .sort_values('pitch_id')
-              .loc[(plv_df['hittername']==player) &
-                   plv_df['p_hand'].isin(hand_map[handedness]) &
-                   plv_df['count'].isin(selected_options) &
-                   plv_df['pitch_type_bucket'].isin(pitchtype_select),
-                   ['hittername',metric]]
-              .dropna()
-              .reset_index(drop=True)
+rolling_df = (hitter_events
+              .player_events(player, metric, selected_options, pitchtype_select, hand_map[handedness])
               .reset_index()
              )
 
@@ -345,9 +341,9 @@ window = st.number_input(f'Choose a {rolling_denom[metric]} threshold:',
                          step=5, 
                          value=rolling_threshold[metric])
 
-rolling_df['Rolling_Stat'] = rolling_df[metric].rolling(window).mean()
+rolling_df['Rolling_Stat'] = rolling_engine.rolling_mean(rolling_df[metric].to_numpy(), window)
 fixed_window = window if (rolling_df[metric].mean() < rolling_df['Rolling_Stat'].max()) and (rolling_df[metric].mean() > rolling_df['Rolling_Stat'].min()) else int(window*2/3)
-rolling_df['Rolling_Stat'] = rolling_df[metric].rolling(window, min_periods=fixed_window).mean()
+rolling_df['Rolling_Stat'] = rolling_engine.rolling_mean(rolling_df[metric].to_numpy(), window, min_periods=fixed_window)
 
 color_norm = colors.TwoSlopeNorm(vmin=chart_10, 
                                  vcenter=chart_mean,
@@ -465,21 +461,44 @@ def rolling_chart():
     pl_ax.axis('off')
     
     sns.despine()
-    st.pyplot(fig)
+    return fig
 if window > rolling_df.shape[0]:
     st.write(f'Not enough {rolling_denom[metric]} ({rolling_df.shape[0]})')
 else:
-    rolling_chart()
+    st.image(figure_cache.render(['rolling_chart',year,player,metric,pitchtype_select,
+                                  selected_options,count_select,handedness,window,data_version],
+                                 rolling_chart))
 
 st.title("PLV Heatmaps")
 
-zone_df = pd.DataFrame(columns=['x','z'])
-for x in range(-20,21):
-    for y in range(0,55):
-        zone_df.loc[len(zone_df)] = [x/12,y/12]
+zone = zone_smoothing.zone_grid()
+
+def heatmap_surfaces(hitter_df,df,stat_cols,bandwidth):
+    # Smoothed zone surface of every stat (one set of kernel passes), centered on the league mean
+    v_centers = df[stat_cols].mean().to_numpy()
+    hitter_df = hitter_df.dropna(subset=['p_x','sz_z'])
+    kde_grids = zone_smoothing.smooth_grid(zone,
+                                           hitter_df['kde_x'],
+                                           hitter_df['kde_z'],
+                                           hitter_df[stat_cols],
+                                           v_centers,
+                                           bandwidth)
+    return v_centers, kde_grids
 
 def plv_hitter_heatmap(hitter=player,df=plv_df,year=year,pitchtype_select=pitchtype_select):
-    b_hand = df.loc[(df['hittername']==hitter),'b_hand'].unique()[0]
+    # The hitter's pitches are one slice of the season frame
+    player_df = df.iloc[hitter_index.rows(hitter)]
+    hitter_df = player_df.loc[player_df['pitch_type_bucket'].isin(pitchtype_select)]
+    bandwidth = np.clip(hitter_df
+                        .shape[0]/2000,
+                        0.175,
+                        0.25)
+    
+    # All four surfaces are computed before any plotting starts
+    v_centers, kde_grids = heatmap_surfaces(hitter_df,df,['sa_oa','dv_oa','ca_oa','pow_oa'],bandwidth)
+
+    # Stance of the hitter's first pitch of the season
+    b_hand = player_df['b_hand'].iloc[player_df['pitch_id'].argmin()]
     fig= plt.figure(figsize=(7,10))
     grid = plt.GridSpec(3, 4,height_ratios=[7,7,1],hspace=0.15,
                         width_ratios=[1,1,1.1,0.9],wspace=0.025)
@@ -490,40 +509,19 @@ def plv_hitter_heatmap(hitter=player,df=plv_df,year=year,pitchtype_select=pitcht
         3:['pow_oa',plt.subplot(grid[1, 2:]),'Power',0.1]
     }
     
-    bandwidth = np.clip(df
-                        .loc[(df['hittername']==hitter) &
-                             (df['pitch_type_bucket'].isin(pitchtype_select))]
-                        .shape[0]/2000,
-                        0.175,
-                        0.25)
-    
-    sz_top = round(df.loc[df['hittername']==hitter,'strike_zone_top'].median()*12)
-    sz_bot = round(df.loc[df['hittername']==hitter,'strike_zone_bottom'].median()*12)
+    sz_top = zone.row(player_df['strike_zone_top'].median())
+    sz_bot = zone.row(player_df['strike_zone_bottom'].median())
+    sz_left, sz_right = zone.plate_cols
     sz_range = sz_top-sz_bot
     sz_mid = sz_bot + sz_range/2
     
     for stat in range(len(stat_dict)):
-        v_center = df[stat_dict[stat][0]].mean()
-        kde_df = pd.merge(zone_df,
-                          (df
-                           .loc[(df['hittername']==hitter) &
-                                (df['pitch_type_bucket'].isin(pitchtype_select))
-                               ]
-                           .dropna(subset=[stat_dict[stat][0],'p_x','sz_z'])
-                           [['kde_x','kde_z',stat_dict[stat][0]]]
-                          ),
-                          how='left',
-                          left_on=['x','z'],
-                          right_on=['kde_x','kde_z']).fillna({stat_dict[stat][0]:v_center})
-        
-        kernel_regression = KernelReg(endog=kde_df[stat_dict[stat][0]], 
-                                      exog= [kde_df['x'], kde_df['z']], 
-                                      bw=[bandwidth,bandwidth],
-                                      var_type='cc')
-        kde_df['kernel_stat'] = kernel_regression.fit([kde_df['x'], kde_df['z']])[0]
-        kde_df = kde_df.pivot_table(columns='x',index='z',values=['kernel_stat'], aggfunc='mean')
-
-        sns.heatmap(data=kde_df['kernel_stat'].astype('float'),
+        v_center = v_centers[stat]
+        kde_df = pd.DataFrame(kde_grids[stat],
+                              index=zone.z,
+                              columns=zone.x)
+
+        sns.heatmap(data=kde_df,
                     cmap=kde_palette,
                     center=v_center,
                     vmin=v_center-stat_dict[stat][3],
@@ -544,14 +542,14 @@ def plv_hitter_heatmap(hitter=player,df=plv_df,year=year,pitchtype_select=pitcht
         # Strikezone
         stat_dict[stat][1].axhline(sz_bot, xmin=1/4, xmax=3/4, color='black', linewidth=2)
         stat_dict[stat][1].axhline(sz_top, xmin=1/4, xmax=3/4, color='black', linewidth=2)
-        stat_dict[stat][1].axvline(10, ymin=sz_bot/54, ymax=sz_top/54, color='black', linewidth=2)
-        stat_dict[stat][1].axvline(30, ymin=sz_bot/54, ymax=sz_top/54, color='black', linewidth=2)
+        stat_dict[stat][1].axvline(sz_left, ymin=sz_bot/54, ymax=sz_top/54, color='black', linewidth=2)
+        stat_dict[stat][1].axvline(sz_right, ymin=sz_bot/54, ymax=sz_top/54, color='black', linewidth=2)
 
         # Inner Strikezone
         stat_dict[stat][1].axhline(sz_bot+sz_range/3, xmin=1/4, xmax=3/4, color='black', linewidth=1)
         stat_dict[stat][1].axhline(sz_bot+2*sz_range/3, xmin=1/4, xmax=3/4, color='black', linewidth=1)
-        stat_dict[stat][1].axvline(10+20/3, ymin=sz_bot/54, ymax=sz_top/54, color='black', linewidth=1)
-        stat_dict[stat][1].axvline(30-20/3, ymin=sz_bot/54, ymax=sz_top/54, color='black', linewidth=1)
+        stat_dict[stat][1].axvline(sz_left+(sz_right-sz_left)/3, ymin=sz_bot/54, ymax=sz_top/54, color='black', linewidth=1)
+        stat_dict[stat][1].axvline(sz_right-(sz_right-sz_left)/3, ymin=sz_bot/54, ymax=sz_top/54, color='black', linewidth=1)
 
         # Plate
         stat_dict[stat][1].plot([11.27,27.73], [1,1], color='k', linewidth=1)
@@ -603,8 +601,9 @@ def plv_hitter_heatmap(hitter=player,df=plv_df,year=year,pitchtype_select=pitcht
     pitchtype_text = '' if len(pitchtype_select)>1 else f' (vs {pitchtype_select[0]}' + (')' if pitchtype_select[0]=='Offspeed' else 's)')
     fig.suptitle(f"{hitter}'s {year}\nPLV Hitter Heatmaps{pitchtype_text}",y=0.95,x=0.5)
     sns.despine(left=True,bottom=True)
-    st.pyplot(fig)
+    return fig
     
-plv_hitter_heatmap()
+st.image(figure_cache.render(['plv_hitter_heatmap',year,player,pitchtype_select,data_version],
+                             plv_hitter_heatmap))
 
 st.write("If you have questions or ideas on what you'd like to see, DM me! [@Blandalytics](https://twitter.com/blandalytics)")
@@ -7,10 +7,14 @@ import numpy as np
 import pandas as pd
 import seaborn as sns
 import scipy as sp
-import urllib
+import sys
+
+from pathlib import Path
+sys.path.append(str(Path(__file__).resolve().parents[2])) # repo root, for the shared data modules
+import assets
+import batted_ball_density
+import figure_cache
 
-from PIL import Image
-from scipy import stats
 from statsmodels.nonparametric.kernel_regression import KernelReg
 
 st.title('Batted Ball Charts')
@@ -29,8 +33,7 @@ kde_max = '#a9373b'
 kde_palette = (sns.color_palette(f'blend:{kde_min},{pl_white}', n_colors=1001)[:-1] +
                sns.color_palette(f'blend:{pl_white},{kde_max}', n_colors=1001)[:-1])
 
-logo_loc = 'https://github.com/Blandalytics/PLV_viz/blob/main/data/PL-text-wht.png?raw=true'
-logo = Image.open(urllib.request.urlopen(logo_loc))
+logo = assets.logo()
 
 sns.set_theme(
     style={
@@ -50,69 +53,21 @@ sns.set_theme(
 years = [2023,2022,2021,2020]
 year = st.radio('Choose a year:', years)
 
-@st.cache_data(ttl=2*3600,show_spinner=f"Loading {year} data")
-def load_data(year):
-    pitch_data = pd.read_parquet('https://github.com/Blandalytics/PLV_viz/blob/main/hitter_app/pages/batted_ball_df.parquet?raw=true')
-    bbe_df = (
-      pitch_data
-      .loc[(pitch_data['spray_deg']>=0) &
-             (pitch_data['spray_deg']<=90) &
-             (pitch_data['launch_angle']>=-30) &
-             (pitch_data['launch_angle']<=60) &
-             (pitch_data['game_year']==year)]
-        [['hittername','stand','spray_deg','launch_angle']]
-        .astype({'spray_deg':'float',
-                 'launch_angle':'float'})
-        .dropna(subset=['spray_deg','launch_angle'])
-        .copy()
-    )
-
-    year_before_df = (
-      pitch_data
-      .loc[(pitch_data['spray_deg']>=0) &
-             (pitch_data['spray_deg']<=90) &
-             (pitch_data['launch_angle']>=-30) &
-             (pitch_data['launch_angle']<=60) &
-             (pitch_data['game_year']==year-1)]
-      [['hittername','stand','spray_deg','launch_angle']]
-      .astype({'spray_deg':'float',
-               'launch_angle':'int'})
-      .dropna(subset=['spray_deg','launch_angle'])
-      .copy()
-      )
+# Surfaces are precomputed for every hitter-year (batted_ball_density.py) and
+# memory-mapped, so they're shared by every session rather than copied per cache hit
+@st.cache_resource(ttl=2*3600,show_spinner="Loading batted ball data")
+def load_surfaces():
+    return batted_ball_density.DensitySurfaces()
 
-    x_loc_league = bbe_df['spray_deg']
-    y_loc_league = bbe_df['launch_angle']
-    
-    xmin = x_loc_league.min()
-    xmax = x_loc_league.max()
-    ymin = y_loc_league.min()
-    ymax = y_loc_league.max()
-    
-    X, Y = np.mgrid[xmin:xmax:91j, ymin:ymax:91j]
-    positions = np.vstack([X.ravel(), Y.ravel()])
-    
-    # league matrix
-    values_league = np.vstack([x_loc_league, y_loc_league])
-    kernel_league = sp.stats.gaussian_kde(values_league)
-    f_league = np.reshape(kernel_league(positions).T, X.shape)
-    f_league = f_league * (100/f_league.sum())
-  
-    return bbe_df, f_league, year_before_df
+surfaces = load_surfaces()
 
-bbe_df, f_league, year_before_df = load_data(year)
-
-X, Y = np.mgrid[0:90:91j, -30:60:91j]
+X, Y = batted_ball_density.grid()
 
 col1, col2, col3 = st.columns([0.5,0.25,0.25])
 
 with col1:
     # Player
-    players = list(bbe_df
-                   .reset_index()
-                   .sort_values('hittername')
-                   ['hittername'].unique()
-                  )
+    players = surfaces.hitters(year)
     default_ix = players.index('Ronald Acuña Jr.')
     player = st.selectbox('Choose a player:', players, index=default_ix)
 with col2:
@@ -126,31 +81,16 @@ with col3:
     if comparison=='Self (prior year)':
         comparison = 'Self'
 
-def kde_calc(df,hitter,year=year,league_vals=f_league):
-    x_loc_player = df.loc[df['hittername']==hitter,'spray_deg']
-    y_loc_player = df.loc[df['hittername']==hitter,'launch_angle']
-
-    xmin = 0
-    xmax = 90
-    ymin = -30
-    ymax = 60
+def kde_calc(hitter,year=year,comparison='League'):
+    # Hitter's surface minus the league's, or minus their own prior year
+    f_player = surfaces.surface(year, hitter)
+    f_base = surfaces.surface(year) if comparison=='League' else surfaces.surface(year-1, hitter)
 
-    X, Y = np.mgrid[xmin:xmax:91j, ymin:ymax:91j]
-    positions = np.vstack([X.ravel(), Y.ravel()])
-
-    # pitcher matrix
-    values_player = np.vstack([x_loc_player, y_loc_player])
-    kernel_player = sp.stats.gaussian_kde(values_player)
-    f_player = np.reshape(kernel_player(positions).T, X.shape)
-    f_player = f_player * (100/f_player.sum())
-
-    return f_player - league_vals
+    return f_player - f_base
 
 def kde_chart(kde_data,hitter,chart_type='Discrete',comparison='League'):
-    if (year==2020) & (comparison=='Self'):
-        st.write("No data for comparison year (2019).\nPlease select a year above 2020.")
     levels=13
-    b_hand = bbe_df.loc[bbe_df['hittername']==hitter,'stand'].value_counts().index[0]
+    b_hand = surfaces.stand(year, hitter)
     fig, ax = plt.subplots(figsize=(7,7))
     if color_scale_type=='Discrete':
         cfset = ax.contourf(X, Y, kde_data*1000, list(range(-levels+1,levels-1))[::2], 
@@ -245,36 +185,25 @@ def kde_chart(kde_data,hitter,chart_type='Discrete',comparison='League'):
     fig.text(-0.065,0.1,'Data: Baseball Savant/pybaseball',ha='left',fontsize=6)
 
     sns.despine()
-    st.pyplot(fig)
+    return fig
 
+# Rendered charts are cached until the batted ball surfaces are rebuilt
+data_version = figure_cache.data_version(*[batted_ball_density.surfaces_dir(x) / 'surfaces.npy' for x in [year,year-1]])
+
+if (year==2020) & (comparison=='Self'):
+    st.write("No data for comparison year (2019).\nPlease select a year above 2020.")
 if comparison=='Self':
-    if year_before_df.loc[year_before_df['hittername']==player].shape[0]==0:
+    if not surfaces.has(year-1, player):
         st.write(f'No data on {player} for {year-1}')
     else:
-        xmin = 0
-        xmax = 90
-        ymin = -30
-        ymax = 60
-    
-        X, Y = np.mgrid[xmin:xmax:91j, ymin:ymax:91j]
-        positions = np.vstack([X.ravel(), Y.ravel()])
-        
-        x_loc_before = year_before_df.loc[year_before_df['hittername']==player,'spray_deg']
-        y_loc_before = year_before_df.loc[year_before_df['hittername']==player,'launch_angle']
-    
-        # league matrix
-        values_before = np.vstack([x_loc_before, y_loc_before])
-        kernel_before = sp.stats.gaussian_kde(values_before)
-        f_before = np.reshape(kernel_before(positions).T, X.shape)
-        f_before = f_before * (100/f_before.sum())
-    
-        kde_chart(kde_calc(bbe_df,player,
-                            league_vals=f_before),
-                  player,
-                  color_scale_type,
-                  comparison)
+        st.image(figure_cache.render(['batted_ball_kde',year,player,color_scale_type,comparison,data_version],
+                                     lambda: kde_chart(kde_calc(player,comparison=comparison),
+                                                       player,
+                                                       color_scale_type,
+                                                       comparison)))
 else:
-    kde_chart(kde_calc(bbe_df,player),
-              player,
-              color_scale_type)
+    st.image(figure_cache.render(['batted_ball_kde',year,player,color_scale_type,comparison,data_version],
+                                 lambda: kde_chart(kde_calc(player),
+                                                   player,
+                                                   color_scale_type)))
 st.write("If you have questions or ideas on what you'd like to see, DM me! [@Blandalytics](https://twitter.com/blandalytics)")
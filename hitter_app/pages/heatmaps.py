@@ -5,19 +5,23 @@ import numpy as np
 import pandas as pd
 import seaborn as sns
 import scipy as sp
-import time
-import urllib
+import sys
+
+from pathlib import Path
+sys.path.append(str(Path(__file__).resolve().parents[2])) # repo root, for the shared data modules
+import assets
+import figure_cache
+import league_baselines
+import player_index
+import season_store
+import zone_smoothing
 
 from matplotlib import ticker
 from matplotlib import colors
-from PIL import Image
 from scipy import stats
-from statsmodels.nonparametric.kernel_regression import KernelReg
 
-logo_loc = 'https://github.com/Blandalytics/PLV_viz/blob/main/data/PL-text-wht.png?raw=true'
-logo = Image.open(urllib.request.urlopen(logo_loc))
-# logo = Image.open('PL-text-wht.png')
-st.image(logo, width=200)
+logo = assets.logo()
+st.image(assets.logo('header'), width=200)
 
 ## Set Styling
 # Plot Style
@@ -66,42 +70,20 @@ season_names = {
 }
 
 # Load Data
-@st.cache_data(ttl=2*3600,show_spinner=f"Loading {year} data")
-def load_season_data(year):
-    df = pd.DataFrame()
-    for month in range(3,11):
-        file_name = f'https://github.com/Blandalytics/PLV_viz/blob/main/data/{year}_PLV_App_Data-{month}.parquet?raw=true'
-        df = pd.concat([df,
-                        pd.read_parquet(file_name)[['hittername','p_hand','b_hand','pitch_id','balls','strikes','swing_agg',
-                                                    'strike_zone_judgement','decision_value','contact_over_expected',
-                                                    'adj_power','batter_wOBA','pitchtype','pitch_type_bucket',
-                                                    'in_play_input','p_x','p_z','sz_z','strike_zone_top','strike_zone_bottom'
-                                                   ]]
-                       ])
-    
-    df = df.reset_index(drop=True)
+def build_season_data(year):
+    df = season_store.load_season(year,'PLV',
+                                  columns=['hittername','p_hand','b_hand','pitch_id','balls','strikes','swing_agg',
+                                           'strike_zone_judgement','decision_value','contact_over_expected',
+                                           'adj_power','batter_wOBA','pitchtype','pitch_type_bucket',
+                                           'in_play_input','p_x','p_z','sz_z','strike_zone_top','strike_zone_bottom'
+                                          ])
 
     df.loc[df['p_x'].notna(),'kde_x'] = np.clip(df.loc[df['p_x'].notna(),'p_x'].astype('float').mul(12).round(0).astype('int').div(12),
                                                 -20/12,
                                                 20/12)
-    df.loc[df['sz_z'].notna(),'kde_z'] = np.clip(df.loc[df['sz_z'].notna(),'sz_z'].astype('float').mul(24).round(0).astype('int').div(24),
-                                                 -1.5,
-                                                 1.25)
     
-    df['base_decision_value'] = df['decision_value'].groupby([df['p_hand'],
-                                                              df['b_hand'],
-                                                              df['pitchtype'],
-                                                              df['kde_x'],
-                                                              df['kde_z'],
-                                                              df['balls'],
-                                                              df['strikes']]).transform('mean')
-    df['base_power'] = df['adj_power'].groupby([df['p_hand'],
-                                                df['b_hand'],
-                                                df['pitchtype'],
-                                                df['kde_x'],
-                                                df['kde_z'],
-                                                df['balls'],
-                                                df['strikes']]).transform('mean')
+    # League mean decision value/power for the same hands, pitchtype, location & count
+    df = league_baselines.join_baselines(df, year)
 
     df['sa_oa'] = df['swing_agg'].copy()
     df['dv_oa'] = df['decision_value'].sub(df['base_decision_value'])
@@ -113,11 +95,29 @@ def load_season_data(year):
                                                  0,
                                                  4.5)
     
-    df['count'] = df['balls'].astype('str')+'-'+df['strikes'].astype('str')
-    
-    return df
+    # Sorted by hitter, so a hitter's pitches are one slice of the frame
+    return player_index.PlayerIndex(season_store.apply_schema(df), player_col='hittername').df
+
+# Built once into a memory-mapped file that every server process shares
+@st.cache_resource(ttl=2*3600,show_spinner=f"Loading {year} data")
+def load_season_data(year):
+    df = season_store.shared_frame('heatmaps', year, build_season_data,
+                                   sources=[season_store.season_path(year,'PLV'),
+                                            league_baselines.baseline_path(year)])
+    return player_index.PlayerIndex(df, player_col='hittername')
+
+hitter_index = load_season_data(year)
+plv_df = hitter_index.df
+
+# Row positions of every pitcher/hitter handedness split, so the slider is a lookup
+@st.cache_resource(ttl=2*3600)
+def load_hand_splits(year, _plv_df):
+    return season_store.split_rows(_plv_df)
+hand_splits = load_hand_splits(year, plv_df)
 
-plv_df = load_season_data(year)
+# Rendered charts are cached until the season data or baselines are rebuilt
+data_version = figure_cache.data_version(season_store.season_path(year,'PLV'),
+                                         league_baselines.baseline_path(year))
 
 stat_names = {
     'swing_agg':'Swing Aggression',
@@ -139,9 +139,10 @@ stat_values = {
     'batter_wOBA':'Runs Added, per 100 Pitches'
 }
 
-plv_df = plv_df.rename(columns=stat_names)
+# Shallow rename: the columns stay shared with the cached (read-only) frame
+plv_df = plv_df.rename(columns=stat_names, copy=False)
 # Player
-players = list(plv_df.groupby('hittername', as_index=False)[['pitch_id','Hitter Performance']].agg({
+players = list(plv_df.groupby('hittername', as_index=False, observed=True)[['pitch_id','Hitter Performance']].agg({
     'pitch_id':'count',
     'Hitter Performance':'mean'}).query(f'pitch_id >=100').sort_values('Hitter Performance', ascending=False)['hittername'])
 # default_player = players.index(np.random.choice(list(plv_df.groupby('hittername', as_index=False)[['pitch_id','Hitter Performance']].agg({
@@ -182,18 +183,8 @@ count_select = st.radio('Count Group',
                         horizontal=True
                        )
  
-if count_select=='All':
-    selected_options = ['0-0', '1-0', '2-0', '3-0', '0-1', '1-1', '2-1', '3-1', '0-2', '1-2', '2-2', '3-2']
-elif count_select=='Hitter-Friendly':
-    selected_options = ['1-0', '2-0', '3-0', '2-1', '3-1']
-elif count_select=='Pitcher-Friendly':
-    selected_options = ['0-1','0-2','1-2']
-elif count_select=='Even':
-    selected_options = ['0-0','1-1','2-2']
-elif count_select=='2-Strike':
-    selected_options = ['0-2','1-2','2-2','3-2']
-elif count_select=='3-Ball':
-    selected_options = ['3-0','3-1','3-2']
+if count_select!='Custom':
+    selected_options = season_store.count_groups[count_select]
 else:
     selected_options = st.multiselect('Select the count(s):',
                                        ['0-0', '1-0', '2-0', '3-0', '0-1', '1-1', '2-1', '3-1', '0-2', '1-2', '2-2', '3-2'],
@@ -208,7 +199,7 @@ handedness = st.select_slider(
 if handedness=='All':
     hitter_hand = ['L','R']
 else:
-    hitter_hand = list(plv_df.loc[(plv_df['hittername']==player),'b_hand'].unique())
+    hitter_hand = list(plv_df.iloc[hitter_index.rows(player)]['b_hand'].unique())
 
 hand_map = {
     'Left':['L'],
@@ -216,17 +207,41 @@ hand_map = {
     'Right':['R']
 }
 
-zone_df = pd.DataFrame(columns=['x','z'])
-for x in range(-20,21):
-    for y in range(0,55):
-        zone_df.loc[len(zone_df)] = [x/12,y/12]
-
-heatmap_df = plv_df.loc[plv_df['p_hand'].isin(hand_map[handedness]) &
-                        plv_df['count'].isin(selected_options) &
-                        plv_df['pitch_type_bucket'].isin(pitchtype_select)].copy()
+zone = zone_smoothing.zone_grid()
+
+split_df = plv_df.iloc[hand_splits[season_store.split_key(hand_map[handedness], ['L','R'])]]
+heatmap_df = split_df.loc[season_store.count_filter(split_df, selected_options, count_select) &
+                          split_df['pitch_type_bucket'].isin(pitchtype_select)].copy()
+
+# The hitter's pitches under the same filters, from their slice of the frame
+player_df = plv_df.iloc[hitter_index.rows(player)]
+player_df = player_df.loc[player_df['p_hand'].isin(hand_map[handedness]) &
+                          season_store.count_filter(player_df, selected_options, count_select) &
+                          player_df['pitch_type_bucket'].isin(pitchtype_select)]
+
+def heatmap_surfaces(hitter_df,df,stat_cols,bandwidth):
+    # Smoothed zone surface of every stat (one set of kernel passes), centered on the league mean
+    v_centers = df[stat_cols].mean().to_numpy()
+    hitter_df = hitter_df.dropna(subset=['p_x','sz_z'])
+    kde_grids = zone_smoothing.smooth_grid(zone,
+                                           hitter_df['kde_x'],
+                                           hitter_df['kde_z'],
+                                           hitter_df[stat_cols],
+                                           v_centers,
+                                           bandwidth)
+    return v_centers, kde_grids
+
+def plv_hitter_heatmap(hitter=player,df=heatmap_df,hitter_df=player_df):
+    bandwidth = np.clip(hitter_df
+                        .shape[0]/2000,
+                        0.2,
+                        0.25)
+    
+    # All four surfaces are computed before any plotting starts
+    v_centers, kde_grids = heatmap_surfaces(hitter_df,df,['sa_oa','dv_oa','ca_oa','pow_oa'],bandwidth)
 
-def plv_hitter_heatmap(hitter=player,df=heatmap_df):
-    b_hand = df.loc[(df['hittername']==hitter),'b_hand'].unique()[0]
+    # Stance of the hitter's first pitch of the season
+    b_hand = hitter_df['b_hand'].iloc[hitter_df['pitch_id'].argmin()]
     fig= plt.figure(figsize=(7,10))
     grid = plt.GridSpec(3, 4,height_ratios=[7,7,1],hspace=0.15,
                         width_ratios=[1,1,1.1,0.9],wspace=0.025)
@@ -237,40 +252,19 @@ def plv_hitter_heatmap(hitter=player,df=heatmap_df):
         3:['pow_oa',plt.subplot(grid[1, 2:]),'Power',0.1]
     }
     
-    bandwidth = np.clip(df
-                        .loc[(df['hittername']==hitter)]
-                        .shape[0]/2000,
-                        0.2,
-                        0.25)
-    
-    sz_top = round(df.loc[df['hittername']==hitter,'strike_zone_top'].median()*12)
-    sz_bot = round(df.loc[df['hittername']==hitter,'strike_zone_bottom'].median()*12)
+    sz_top = zone.row(hitter_df['strike_zone_top'].median())
+    sz_bot = zone.row(hitter_df['strike_zone_bottom'].median())
+    sz_left, sz_right = zone.plate_cols
     sz_range = sz_top-sz_bot
     sz_mid = sz_bot + sz_range/2
     
     for stat in range(len(stat_dict)):
-        time.sleep(1.5)
-        v_center = df[stat_dict[stat][0]].mean()
-        kde_df = pd.merge(zone_df,
-                          (df
-                           .loc[(df['hittername']==hitter) &
-                                (df['pitch_type_bucket'].isin(pitchtype_select))
-                               ]
-                           .dropna(subset=[stat_dict[stat][0],'p_x','sz_z'])
-                           [['kde_x','kde_z',stat_dict[stat][0]]]
-                          ),
-                          how='left',
-                          left_on=['x','z'],
-                          right_on=['kde_x','kde_z']).fillna({stat_dict[stat][0]:v_center})
-        
-        kernel_regression = KernelReg(endog=kde_df[stat_dict[stat][0]], 
-                                      exog= [kde_df['x'], kde_df['z']], 
-                                      bw=[bandwidth,bandwidth],
-                                      var_type='cc')
-        kde_df['kernel_stat'] = kernel_regression.fit([kde_df['x'], kde_df['z']])[0]
-        kde_df = kde_df.pivot_table(columns='x',index='z',values=['kernel_stat'], aggfunc='mean')
-
-        sns.heatmap(data=kde_df['kernel_stat'].astype('float'),
+        v_center = v_centers[stat]
+        kde_df = pd.DataFrame(kde_grids[stat],
+                              index=zone.z,
+                              columns=zone.x)
+
+        sns.heatmap(data=kde_df,
                     cmap=kde_palette,
                     center=v_center,
                     vmin=v_center-stat_dict[stat][3],
@@ -291,14 +285,14 @@ def plv_hitter_heatmap(hitter=player,df=heatmap_df):
         # Strikezone
         stat_dict[stat][1].axhline(sz_bot, xmin=1/4, xmax=3/4, color='black', linewidth=2)
         stat_dict[stat][1].axhline(sz_top, xmin=1/4, xmax=3/4, color='black', linewidth=2)
-        stat_dict[stat][1].axvline(10, ymin=sz_bot/54, ymax=sz_top/54, color='black', linewidth=2)
-        stat_dict[stat][1].axvline(30, ymin=sz_bot/54, ymax=sz_top/54, color='black', linewidth=2)
+        stat_dict[stat][1].axvline(sz_left, ymin=sz_bot/54, ymax=sz_top/54, color='black', linewidth=2)
+        stat_dict[stat][1].axvline(sz_right, ymin=sz_bot/54, ymax=sz_top/54, color='black', linewidth=2)
 
         # Inner Strikezone
         stat_dict[stat][1].axhline(sz_bot+sz_range/3, xmin=1/4, xmax=3/4, color='black', linewidth=1)
         stat_dict[stat][1].axhline(sz_bot+2*sz_range/3, xmin=1/4, xmax=3/4, color='black', linewidth=1)
-        stat_dict[stat][1].axvline(10+20/3, ymin=sz_bot/54, ymax=sz_top/54, color='black', linewidth=1)
-        stat_dict[stat][1].axvline(30-20/3, ymin=sz_bot/54, ymax=sz_top/54, color='black', linewidth=1)
+        stat_dict[stat][1].axvline(sz_left+(sz_right-sz_left)/3, ymin=sz_bot/54, ymax=sz_top/54, color='black', linewidth=1)
+        stat_dict[stat][1].axvline(sz_right-(sz_right-sz_left)/3, ymin=sz_bot/54, ymax=sz_top/54, color='black', linewidth=1)
 
         # Plate
         stat_dict[stat][1].plot([11.27,27.73], [1,1], color='k', linewidth=1)
@@ -360,9 +354,11 @@ def plv_hitter_heatmap(hitter=player,df=heatmap_df):
     
     fig.suptitle(f"{hitter}'s {year}\nPLV Hitter Heatmaps{context_text}",y=0.95 if context_text=='' else 0.975,x=0.5)
     sns.despine(left=True,bottom=True)
-    st.pyplot(fig)
+    return fig
     
-plv_hitter_heatmap()
+st.image(figure_cache.render(['plv_hitter_heatmap',year,player,handedness,count_select,
+                              selected_options,pitchtype_select,data_version],
+                             plv_hitter_heatmap))
 
 st.write("If you have questions or ideas on what you'd like to see, DM me! [@Blandalytics](https://twitter.com/blandalytics)")
 st.title('Metric Descriptions:')
@@ -0,0 +1,108 @@
+import numpy as np
+import pandas as pd
+
+import season_store
+
+## League reference bands for the rolling charts
+# The 10/25/75/90th percentile lines (and the hitters' mean/std) come from
+# every qualified hitter's mean of a metric, under the chart's count group,
+# pitch type and handedness filters. Per-pitch sums are binned once per season
+# into a dense (hitter, count, pitch type bucket, p_hand, b_hand) cube, so any
+# filter combination is a few array sums over that cube, and every preset
+# combination is tabulated up front.
+band_quantiles = {
+    'q10':0.1,
+    'q25':0.25,
+    'q75':0.75,
+    'q90':0.9,
+}
+
+pitchtype_groups = {
+    'All':['Fastball','Breaking Ball','Offspeed','Other'],
+    'Fastballs':['Fastball'],
+    'Breaking Balls':['Breaking Ball'],
+    'Offspeed':['Offspeed'],
+}
+
+class BandCube:
+    def __init__(self, df, metrics):
+        hands = season_store.hand_options[-1]
+        self.hitters = pd.Categorical(df['hittername']).categories
+        self.buckets = sorted(df['pitch_type_bucket'].dropna().unique())
+
+        hitter = pd.Categorical(df['hittername'], categories=self.hitters).codes.astype('int64')
+        count = season_store.count_codes(df['balls'], df['strikes']).to_numpy().astype('int64')
+        bucket = pd.Categorical(df['pitch_type_bucket'], categories=self.buckets).codes.astype('int64')
+        p_hand = pd.Categorical(df['p_hand'], categories=hands).codes.astype('int64')
+        b_hand = pd.Categorical(df['b_hand'], categories=hands).codes.astype('int64')
+
+        # Pitches missing a filter key can't match any filter, so they're left out
+        self.shape = (len(self.hitters), len(season_store.count_states), len(self.buckets), len(hands), len(hands))
+        valid = (hitter >= 0) & (count >= 0) & (bucket >= 0) & (p_hand >= 0) & (b_hand >= 0)
+        cell = np.ravel_multi_index((hitter[valid], count[valid], bucket[valid], p_hand[valid], b_hand[valid]),
+                                    self.shape)
+        size = int(np.prod(self.shape))
+
+        self.pitches = np.bincount(cell, minlength=size).astype('int32').reshape(self.shape)
+        self.counts = {}
+        self.sums = {}
+        for metric in metrics:
+            values = df[metric].to_numpy(dtype='float64', na_value=np.nan)[valid]
+            observed = ~np.isnan(values)
+            self.counts[metric] = np.bincount(cell[observed], minlength=size).astype('int32').reshape(self.shape)
+            self.sums[metric] = np.bincount(cell[observed], weights=values[observed], minlength=size).reshape(self.shape)
+
+    def select(self, array, counts, buckets, p_hands, b_hands):
+        # Per-hitter total of a cube array over the selected filter values
+        hands = season_store.hand_options[-1]
+        index = np.ix_([season_store.count_states.index(count) for count in counts],
+                       [self.buckets.index(bucket) for bucket in buckets if bucket in self.buckets],
+                       [hands.index(hand) for hand in p_hands],
+                       [hands.index(hand) for hand in b_hands])
+        return array[(slice(None),)+index].sum(axis=(1,2,3,4))
+
+def band_stats(cube, metric, counts, buckets, p_hands, b_hands, min_pitches):
+    # Reference values for one filter combination: quantiles, mean and std of
+    # the means of hitters with at least min_pitches, plus the pitch-level league mean
+    pitches = cube.select(cube.pitches, counts, buckets, p_hands, b_hands)
+    n = cube.select(cube.counts[metric], counts, buckets, p_hands, b_hands)
+    sums = cube.select(cube.sums[metric], counts, buckets, p_hands, b_hands)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        hitter_means = (sums / n)[pitches >= min_pitches]
+        league_mean = sums.sum() / n.sum()
+    # Hitters without a value are skipped, like pandas' quantile/mean/std
+    hitter_means = hitter_means[~np.isnan(hitter_means)]
+
+    stats = dict(zip(band_quantiles.keys(),
+                     np.quantile(hitter_means, list(band_quantiles.values())) if len(hitter_means) else [np.nan]*len(band_quantiles)))
+    stats['hitter_mean'] = hitter_means.mean() if len(hitter_means) else np.nan
+    stats['hitter_std'] = hitter_means.std(ddof=1) if len(hitter_means) > 1 else np.nan
+    stats['league_mean'] = league_mean
+    return stats
+
+def build_bands(cube, metrics, count_groups, min_pitches):
+    # Band table for every metric x count group x pitch type group x
+    # handedness split. min_pitches(metric, counts) gives the qualifying
+    # threshold (the tier) for a metric and count group
+    rows = []
+    for metric in metrics:
+        for count_group, counts in count_groups.items():
+            threshold = min_pitches(metric, counts)
+            for pitchtype_group, buckets in pitchtype_groups.items():
+                for p_hands, b_hands in season_store.hand_splits():
+                    stats = band_stats(cube, metric, counts, buckets, p_hands, b_hands, threshold)
+                    rows += [{'metric':metric,
+                              'count_group':count_group,
+                              'pitchtype_group':pitchtype_group,
+                              'p_hand':''.join(p_hands),
+                              'b_hand':''.join(b_hands),
+                              'min_pitches':threshold,
+                              **stats}]
+    return (pd.DataFrame(rows)
+            .astype({col:'category' for col in ['metric','count_group','pitchtype_group','p_hand','b_hand']})
+            .set_index(['metric','count_group','pitchtype_group','p_hand','b_hand'])
+            .sort_index())
+
+def lookup(bands, metric, count_group, pitchtype_group, p_hands, b_hands):
+    return bands.loc[(metric, count_group, pitchtype_group, *season_store.split_key(p_hands, b_hands))]
@@ -0,0 +1,95 @@
+import argparse
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+import season_store
+
+## League baselines
+# base_decision_value and base_power are the league mean decision value and
+# power for a pitch's (p_hand, b_hand, pitchtype, location bin, count). The
+# hitter apps used to redo that 7-key groupby-transform over the whole season
+# on every cache miss; it's now materialized once per year as a lookup table,
+# keyed by a single packed integer, and joined back with searchsorted.
+baseline_stats = {
+    'decision_value':'base_decision_value',
+    'adj_power':'base_power',
+}
+key_cols = ['p_hand','b_hand','pitchtype','p_x','sz_z','balls','strikes']
+
+# Location bins, matching the apps' kde_x (nearest inch, +/-20") and
+# kde_z (nearest half inch of sz_z, -1.5 to 1.25)
+x_bins = (-20, 20)
+z_bins = (-36, 30)
+hands = ['L','R']
+
+def baseline_path(year):
+    return season_store.store_dir / 'league_baselines' / f'year={year}' / 'part-0.parquet'
+
+def baseline_keys(df, pitchtypes):
+    # Pack the 7 keys into one int64 (-1 if any key is missing or unknown)
+    p_hand = pd.Categorical(df['p_hand'], categories=hands).codes.astype('int64')
+    b_hand = pd.Categorical(df['b_hand'], categories=hands).codes.astype('int64')
+    pitchtype = pd.Categorical(df['pitchtype'], categories=pitchtypes).codes.astype('int64')
+    x = df['p_x'].astype('float').mul(12).round(0).clip(*x_bins).sub(x_bins[0])
+    z = df['sz_z'].astype('float').mul(24).round(0).clip(*z_bins).sub(z_bins[0])
+    count = season_store.count_codes(df['balls'], df['strikes']).astype('int64')
+
+    valid = ((p_hand >= 0) & (b_hand >= 0) & (pitchtype >= 0) & (count >= 0) &
+             x.notna().to_numpy() & z.notna().to_numpy())
+    x = x.fillna(0).astype('int64').to_numpy()
+    z = z.fillna(0).astype('int64').to_numpy()
+
+    n_x = x_bins[1] - x_bins[0] + 1
+    n_z = z_bins[1] - z_bins[0] + 1
+    keys = ((((p_hand * len(hands) + b_hand) * len(pitchtypes) + pitchtype) * n_x + x) * n_z + z) * 12 + count
+    return np.where(valid, keys, -1)
+
+def build_baselines(year):
+    df = season_store.load_season(year,'PLV',columns=key_cols+list(baseline_stats.keys()))
+    pitchtypes = sorted(df['pitchtype'].dropna().unique())
+
+    df['key'] = baseline_keys(df, pitchtypes)
+    table = (df
+             .loc[df['key']>=0]
+             .groupby('key')
+             [list(baseline_stats.keys())]
+             .mean()
+             .rename(columns=baseline_stats)
+             .reset_index()
+            )
+    # Pitchtype codes depend on the year's pitch types, so they're stored with the table
+    table = pa.Table.from_pandas(table, preserve_index=False).replace_schema_metadata({
+        'pitchtypes':','.join(pitchtypes)})
+    season_store.write_atomic(table, baseline_path(year))
+
+def load_baselines(year):
+    path = baseline_path(year)
+    if not path.exists():
+        build_baselines(year)
+    table = pq.read_table(path)
+    pitchtypes = table.schema.metadata[b'pitchtypes'].decode().split(',')
+    return table.to_pandas(), pitchtypes
+
+def join_baselines(df, year):
+    # Adds base_decision_value and base_power to a frame with the raw key columns
+    table, pitchtypes = load_baselines(year)
+    keys = baseline_keys(df, pitchtypes)
+    table_keys = table['key'].to_numpy()
+
+    pos = np.clip(np.searchsorted(table_keys, keys), 0, len(table_keys)-1)
+    found = (keys >= 0) & (table_keys[pos] == keys)
+    for col in baseline_stats.values():
+        df[col] = np.where(found, table[col].to_numpy()[pos], np.nan)
+    return df
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Build the league baseline lookup tables from the season store')
+    parser.add_argument('--years', type=int, nargs='+', default=[2020,2021,2022,2023,2024])
+    args = parser.parse_args()
+
+    for year in args.years:
+        build_baselines(year)
+        print(f'{year}: {baseline_path(year)}')
@@ -1,22 +1,14 @@
+import argparse
 import numpy as np
-import seaborn as sns
-import os
 import pandas as pd
-import pickle
-import psycopg2
-import xgboost as xgb #v1.6.0
-import zipfile
-
-from dotenv import load_dotenv
-from sklearn.neighbors import KNeighborsClassifier
-from pathlib import Path
-from xgboost import XGBClassifier
-from collections import Counter
-
 import seaborn as sns
 import matplotlib.pyplot as plt
 import matplotlib as mpl
 
+import season_store
+
+from collections import Counter
+
 def strikezone_z(dataframe,top_column,bottom_column):
     dataframe[['p_z',top_column,bottom_column]] = dataframe[['p_z',top_column,bottom_column]].astype('float')
     
@@ -26,14 +18,37 @@ def strikezone_z(dataframe,top_column,bottom_column):
     
     return dataframe['p_z'].sub(dataframe['sz_mid']).div(dataframe['sz_height'])
 
-model_df = pd.DataFrame()
-for year in [2020,2021,2022,2023]:
-    for chunk in [1,2,3]:
-        model_df = pd.concat([model_df,
-                             pd.read_parquet(f'{year}_PLV_App_Data-{chunk}.parquet')])
-        
-model_df['sz_z'] = strikezone_z(model_df,'strike_zone_top','strike_zone_bottom')
-model_df = model_df.reset_index(drop=True)
+## Game vs season cards
+# A card compares a pitcher's pitches in one game to the rest of their season.
+# Only the requested pitchers' season is read (the name filter is pushed into
+# the parquet scan), and the z-values of every pitcher x game/season x
+# pitchtype group come from one groupby transform, so a whole slate of
+# pitchers is one load and one pass.
+card_cols = ['pitchername','pitchtype','pitch_id','game_played','year_played',
+             'b_hand','p_x','p_z','strike_zone_top','strike_zone_bottom','velo']
+
+def load_pitcher_season(year, pitchers, stats=['velo']):
+    df = season_store.load_season(year,'PLV',
+                                  columns=list(dict.fromkeys(card_cols+stats)),
+                                  pitchers=pitchers)
+    df['sz_z'] = strikezone_z(df,'strike_zone_top','strike_zone_bottom')
+    return df.reset_index(drop=True)
+
+def game_pitchers(game_date):
+    # Every pitcher who threw on a date ('YYYY-MM-DD')
+    games = season_store.load_season(pd.Timestamp(game_date).year,'PLV',
+                                     columns=['pitchername','game_played'])
+    return sorted(games.loc[games['game_played'].astype('str')==game_date,'pitchername'].unique())
+
+def z_values(df,stat,game_date):
+    # pitch_group is 1 for the game's pitches, 0 for the rest of the season;
+    # z_value is stat standardized within each pitcher's group and pitchtype
+    df['pitchtype'] = df['pitchtype'].astype('str')
+    df['pitch_group'] = (df['game_played'].astype('str')==game_date).astype('int')
+    values = df[stat].astype('float64')
+    grouped = values.groupby([df['pitchername'],df['pitch_group'],df['pitchtype']], observed=True)
+    df['z_value'] = values.sub(grouped.transform('mean')).div(grouped.transform('std'))
+    return df
 
 # Plot Style
 pl_white = '#FEFEFE'
@@ -94,114 +109,132 @@ y_lim = 6
 plate_y = 0
 
 def generate_df(df,player,stat,year,game_date):
-    df['pitchtype'] = df['pitchtype'].astype('str')
     test_df = df.loc[(df['year_played'] == year) &
                      (df['pitchername']== player)].reset_index(drop=True).copy()
-    
-    test_df['pitch_group'] = 0
-    test_df.loc[test_df['game_played'].astype('str')==game_date,'pitch_group'] = 1
-    
-    for group in [0,1]:
-        for pitch in test_df['pitchtype'].unique():
-            test_df.loc[(test_df['pitchtype']==pitch) &
-                   (test_df['pitch_group']==group),'z_value'] = test_df.loc[(test_df['pitchtype']==pitch) &
-                                                                  (test_df['pitch_group']==group),stat].sub(test_df.loc[(test_df['pitchtype']==pitch) &
-                                                                                                              (test_df['pitch_group']==group),stat].mean()).div(test_df.loc[(test_df['pitchtype']==pitch) &
-                                                                                                              (test_df['pitch_group']==group),stat].std())
-    return test_df.copy()
-  
-player = 'Ross Stripling'
-game_date = model_df.loc[model_df['pitchername']==player,'game_played'].max().strftime('%Y-%m-%d')
-game_text = (game_date[5:7] if game_date[5]!='0' else game_date[6])+'/'+(game_date[-2:] if game_date[-2]!='0' else game_date[-1])+'/'+game_date[2:4]
-stat = 'velo'
-year = 2023
-chart_df = generate_df(model_df,
-                       player,
-                       stat,
-                       year,
-                       game_date)
-chart_df = chart_df.loc[chart_df['pitchtype'].isin(pitch_names.keys())].copy()
-pitch_list = [x[0] for x in Counter(chart_df['pitchtype']).most_common() if x[1] > int(chart_df.shape[0]*0.05)]
-
-fig, ax = plt.subplots(figsize=(7,5))
-sns.violinplot(data=chart_df.loc[(chart_df['pitchtype'].isin(pitch_list)) &
-                                 (chart_df['z_value'].abs()<3)], 
-               x=stat, 
-               y='pitchtype', 
-               hue='pitch_group', 
-               inner=None,
-               split=True)
-ax.legend(labels=['Season',game_text],
-          loc='upper left')
-sns.despine()
-
-for pitch in pitch_list:
-    fig, axs = plt.subplots(1,2,figsize=(7,5))
-    for hand in ['R','L']:
-        ax_num = 0 if hand=='L' else 1
-        x_lim = ((x_ft,-adj_x)) if hand =='L' else ((adj_x,-x_ft))
-        cmap = mpl.colors.ListedColormap(list(sns.light_palette(marker_colors[pitch], n_colors=5)[1:]))
-        if chart_df.loc[(chart_df['pitchtype']==pitch) &
-                        (chart_df['b_hand']==hand)].shape[0]>5:
-            sns.kdeplot(data=chart_df.loc[(chart_df['pitchtype']==pitch) &
-                                          (chart_df['b_hand']==hand)],
-                        x='p_x',
-                        y='p_z',
-                        levels=5,
-                        thresh=0.5,
-                        ax=axs[ax_num],
-                        cmap=cmap,
-                        alpha=0.5,
-                        clip=[x_lim,[y_bot,y_lim]],
-                        fill=True)
-        sns.scatterplot(data=chart_df.loc[(chart_df['pitchtype']==pitch) &
-                                          (chart_df['pitch_group']==1) &
-                                          (chart_df['b_hand']==hand)],
-                        x='p_x',
-                        y='p_z',
-                        ax=axs[ax_num],
-                        color=marker_colors[pitch],
-                       alpha=1)
-        # Strike zone outline
-        axs[ax_num].plot([-10/12,10/12], [sz_bot,sz_bot], color='w', linewidth=1)
-        axs[ax_num].plot([-10/12,10/12], [sz_top,sz_top], color='w', linewidth=1)
-        axs[ax_num].plot([-10/12,-10/12], [sz_bot,sz_top], color='w', linewidth=1)
-        axs[ax_num].plot([10/12,10/12], [sz_bot,sz_top], color='w', linewidth=1)
-
-        # Inner Strike zone
-        axs[ax_num].plot([-10/12,10/12], [1.5+2/3,1.5+2/3], color='w', linewidth=1)
-        axs[ax_num].plot([-10/12,10/12], [1.5+4/3,1.5+4/3], color='w', linewidth=1)
-        axs[ax_num].axvline(10/36, ymin=(sz_bot-y_bot)/(y_lim-y_bot), ymax=(sz_top-y_bot)/(y_lim-y_bot), color='w', linewidth=1)
-        axs[ax_num].axvline(-10/36, ymin=(sz_bot-y_bot)/(y_lim-y_bot), ymax=(sz_top-y_bot)/(y_lim-y_bot), color='w', linewidth=1)
-
-        # Plate
-        axs[ax_num].plot([-8.5/12,8.5/12], [plate_y,plate_y], color='w', linewidth=1)
-        axs[ax_num].axvline(8.5/12, ymin=(plate_y-y_bot)/(y_lim-y_bot), ymax=(plate_y+0.1-y_bot)/(y_lim-y_bot), color='w', linewidth=1)
-        axs[ax_num].axvline(-8.5/12, ymin=(plate_y-y_bot)/(y_lim-y_bot), ymax=(plate_y+0.1-y_bot)/(y_lim-y_bot), color='w', linewidth=1)
-        axs[ax_num].plot([8.28/12,0], [plate_y+0.1,plate_y+0.2], color='w', linewidth=1)
-        axs[ax_num].plot([-8.28/12,0], [plate_y+0.1,plate_y+0.2], color='w', linewidth=1)
+    return z_values(test_df,stat,game_date)
+
+def generate_slate(game_date,stat='velo'):
+    # Card frames of every pitcher who threw on game_date, from one load
+    pitchers = game_pitchers(game_date)
+    if len(pitchers)==0:
+        return {}
+    slate_df = z_values(load_pitcher_season(pd.Timestamp(game_date).year, pitchers, [stat]),
+                        stat,
+                        game_date)
+    return {player:player_df.reset_index(drop=True) for player, player_df in slate_df.groupby('pitchername', observed=True)}
+
+def game_label(game_date):
+    # 'YYYY-MM-DD' -> 'M/D/YY'
+    return (game_date[5:7] if game_date[5]!='0' else game_date[6])+'/'+(game_date[-2:] if game_date[-2]!='0' else game_date[-1])+'/'+game_date[2:4]
+
+def card_figures(chart_df,player,stat,year,game_date):
+    # Game vs season distribution of stat, then one location chart per pitch
+    game_text = game_label(game_date)
+    figs = []
+    chart_df = chart_df.loc[chart_df['pitchtype'].isin(pitch_names.keys())].copy()
+    pitch_list = [x[0] for x in Counter(chart_df['pitchtype']).most_common() if x[1] > int(chart_df.shape[0]*0.05)]
+
+    fig, ax = plt.subplots(figsize=(7,5))
+    sns.violinplot(data=chart_df.loc[(chart_df['pitchtype'].isin(pitch_list)) &
+                                     (chart_df['z_value'].abs()<3)], 
+                   x=stat, 
+                   y='pitchtype', 
+                   hue='pitch_group', 
+                   inner=None,
+                   split=True)
+    ax.legend(labels=['Season',game_text],
+              loc='upper left')
+    sns.despine()
+    figs += [fig]
+
+    for pitch in pitch_list:
+        fig, axs = plt.subplots(1,2,figsize=(7,5))
+        for hand in ['R','L']:
+            ax_num = 0 if hand=='L' else 1
+            x_lim = ((x_ft,-adj_x)) if hand =='L' else ((adj_x,-x_ft))
+            cmap = mpl.colors.ListedColormap(list(sns.light_palette(marker_colors[pitch], n_colors=5)[1:]))
+            if chart_df.loc[(chart_df['pitchtype']==pitch) &
+                            (chart_df['b_hand']==hand)].shape[0]>5:
+                sns.kdeplot(data=chart_df.loc[(chart_df['pitchtype']==pitch) &
+                                              (chart_df['b_hand']==hand)],
+                            x='p_x',
+                            y='p_z',
+                            levels=5,
+                            thresh=0.5,
+                            ax=axs[ax_num],
+                            cmap=cmap,
+                            alpha=0.5,
+                            clip=[x_lim,[y_bot,y_lim]],
+                            fill=True)
+            sns.scatterplot(data=chart_df.loc[(chart_df['pitchtype']==pitch) &
+                                              (chart_df['pitch_group']==1) &
+                                              (chart_df['b_hand']==hand)],
+                            x='p_x',
+                            y='p_z',
+                            ax=axs[ax_num],
+                            color=marker_colors[pitch],
+                           alpha=1)
+            # Strike zone outline
+            axs[ax_num].plot([-10/12,10/12], [sz_bot,sz_bot], color='w', linewidth=1)
+            axs[ax_num].plot([-10/12,10/12], [sz_top,sz_top], color='w', linewidth=1)
+            axs[ax_num].plot([-10/12,-10/12], [sz_bot,sz_top], color='w', linewidth=1)
+            axs[ax_num].plot([10/12,10/12], [sz_bot,sz_top], color='w', linewidth=1)
+
+            # Inner Strike zone
+            axs[ax_num].plot([-10/12,10/12], [1.5+2/3,1.5+2/3], color='w', linewidth=1)
+            axs[ax_num].plot([-10/12,10/12], [1.5+4/3,1.5+4/3], color='w', linewidth=1)
+            axs[ax_num].axvline(10/36, ymin=(sz_bot-y_bot)/(y_lim-y_bot), ymax=(sz_top-y_bot)/(y_lim-y_bot), color='w', linewidth=1)
+            axs[ax_num].axvline(-10/36, ymin=(sz_bot-y_bot)/(y_lim-y_bot), ymax=(sz_top-y_bot)/(y_lim-y_bot), color='w', linewidth=1)
+
+            # Plate
+            axs[ax_num].plot([-8.5/12,8.5/12], [plate_y,plate_y], color='w', linewidth=1)
+            axs[ax_num].axvline(8.5/12, ymin=(plate_y-y_bot)/(y_lim-y_bot), ymax=(plate_y+0.1-y_bot)/(y_lim-y_bot), color='w', linewidth=1)
+            axs[ax_num].axvline(-8.5/12, ymin=(plate_y-y_bot)/(y_lim-y_bot), ymax=(plate_y+0.1-y_bot)/(y_lim-y_bot), color='w', linewidth=1)
+            axs[ax_num].plot([8.28/12,0], [plate_y+0.1,plate_y+0.2], color='w', linewidth=1)
+            axs[ax_num].plot([-8.28/12,0], [plate_y+0.1,plate_y+0.2], color='w', linewidth=1)
         
-        # Batter
-        hand_mul = 1 if hand=='L' else -1
-        axs[ax_num].plot([20/12*hand_mul,38/12*hand_mul], [2.5+0.9*2,2.5+1.5*2], color='w', linewidth=2) # Bat
-        axs[ax_num].plot([20/12*hand_mul,20/12*hand_mul], [2.5+0.9*2,2.5+0.6*2], color='w', linewidth=2) # Forearm
-        axs[ax_num].plot([20/12*hand_mul,26/12*hand_mul], [2.5+0.6*2,2.5+1*2], color='w', linewidth=2) # Upper Arm
-        axs[ax_num].plot([26/12*hand_mul,32/12*hand_mul], [2.5+1*2,2.5+0], color='w', linewidth=2) # Torso
-        axs[ax_num].plot([32/12*hand_mul,26/12*hand_mul], [2.5+0,2.5-0.49*2], color='w', linewidth=2) # Thigh
-        axs[ax_num].plot([26/12*hand_mul,30/12*hand_mul], [2.5-0.49*2,plate_y], color='w', linewidth=2) # Shin
-        head = mpl.patches.Ellipse((25/12*hand_mul, 2.5+1.2*2),
-                           width=0.6,
-                           height=0.8, 
-                           color='w') # Head
-        axs[ax_num].add_patch(head)
-        axs[ax_num].text(0,4.5,f'{hand}HH',ha='center')
+            # Batter
+            hand_mul = 1 if hand=='L' else -1
+            axs[ax_num].plot([20/12*hand_mul,38/12*hand_mul], [2.5+0.9*2,2.5+1.5*2], color='w', linewidth=2) # Bat
+            axs[ax_num].plot([20/12*hand_mul,20/12*hand_mul], [2.5+0.9*2,2.5+0.6*2], color='w', linewidth=2) # Forearm
+            axs[ax_num].plot([20/12*hand_mul,26/12*hand_mul], [2.5+0.6*2,2.5+1*2], color='w', linewidth=2) # Upper Arm
+            axs[ax_num].plot([26/12*hand_mul,32/12*hand_mul], [2.5+1*2,2.5+0], color='w', linewidth=2) # Torso
+            axs[ax_num].plot([32/12*hand_mul,26/12*hand_mul], [2.5+0,2.5-0.49*2], color='w', linewidth=2) # Thigh
+            axs[ax_num].plot([26/12*hand_mul,30/12*hand_mul], [2.5-0.49*2,plate_y], color='w', linewidth=2) # Shin
+            head = mpl.patches.Ellipse((25/12*hand_mul, 2.5+1.2*2),
+                               width=0.6,
+                               height=0.8, 
+                               color='w') # Head
+            axs[ax_num].add_patch(head)
+            axs[ax_num].text(0,4.5,f'{hand}HH',ha='center')
         
-#         plt.text(-2.25*hand_mul,plate_y,'Season is\nShaded',ha='center',size=8)
-
-        axs[ax_num].set(xlim=x_lim,
-                        ylim=(y_bot,y_lim))
-        fig.suptitle(f"{player}'s\n{pitch_names[pitch]} Location",x=0.525,y=0.875)
-        fig.text(0.51,0.72,f'Scatter = {game_text}',ha='center',size=8)
-        fig.text(0.51,0.685,f'Shaded = {year}',ha='center',size=8)
-        axs[ax_num].axis('off')
-    sns.despine()
+    #         plt.text(-2.25*hand_mul,plate_y,'Season is\nShaded',ha='center',size=8)
+
+            axs[ax_num].set(xlim=x_lim,
+                            ylim=(y_bot,y_lim))
+            fig.suptitle(f"{player}'s\n{pitch_names[pitch]} Location",x=0.525,y=0.875)
+            fig.text(0.51,0.72,f'Scatter = {game_text}',ha='center',size=8)
+            fig.text(0.51,0.685,f'Shaded = {year}',ha='center',size=8)
+            axs[ax_num].axis('off')
+        sns.despine()
+        figs += [fig]
+    return figs
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Game vs season cards for one pitcher's game")
+    parser.add_argument('--player', default='Ross Stripling')
+    parser.add_argument('--year', type=int, default=2023)
+    parser.add_argument('--game-date', default=None, help="YYYY-MM-DD (default: the player's last game)")
+    parser.add_argument('--stat', default='velo')
+    args = parser.parse_args()
+
+    model_df = load_pitcher_season(args.year, args.player, [args.stat])
+    game_date = args.game_date or model_df['game_played'].max().strftime('%Y-%m-%d')
+    chart_df = generate_df(model_df,
+                           args.player,
+                           args.stat,
+                           args.year,
+                           game_date)
+    for num, fig in enumerate(card_figures(chart_df, args.player, args.stat, args.year, game_date)):
+        fig.savefig(f"{args.player.replace(' ','_')}_{game_date}_{num}.png")
+        plt.close(fig)
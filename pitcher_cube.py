@@ -0,0 +1,185 @@
+import argparse
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+import season_store
+
+## Pitcher aggregate cube
+# The pitcher leaderboards, the PLV card and the QP/AP/BP table only need
+# per-pitcher, per-pitchtype, per-handedness sums. They're aggregated offline
+# into one small parquet (a few thousand rows per year), and each widget
+# interaction just slices it instead of reprocessing pla_data.csv or the
+# pitch-level frame.
+cube_keys = ['year','pitcher_mlb_id','pitchtype','p_hand','b_hand']
+
+def cube_path():
+    return season_store.store_dir / 'pitcher_cube.parquet'
+
+# Same buckets as the pitcher app (PLV >= 5.5 is Quality, < 4.5 is Bad)
+quality_cols = {
+    'Quality':'quality_pitches',
+    'Average':'average_pitches',
+    'Bad':'bad_pitches',
+}
+
+def read_pla_data():
+    local_file = season_store.data_dir / 'pla_data.csv'
+    if not local_file.exists():
+        local_file = season_store.remote_loc.format('pla_data.csv')
+    return (pd.read_csv(local_file, encoding='latin1')
+            .rename(columns={'year_played':'year'})
+            .assign(total_plv = lambda x: x['num_pitches'] * x['plv'])
+            .drop(columns=['plv'])
+           )
+
+def quality_counts(year):
+    df = season_store.load_season(year,'PLV',
+                                  columns=['pitchername','pitcher_mlb_id','pitchtype',
+                                           'p_hand','b_hand','PLV'])
+    df['pitch_quality'] = 'Average'
+    df.loc[df['PLV']>=5.5,'pitch_quality'] = 'Quality'
+    df.loc[df['PLV']<4.5,'pitch_quality'] = 'Bad'
+
+    counts = (pd.crosstab([df['pitcher_mlb_id'],df['pitchername'],df['pitchtype'],
+                           df['p_hand'],df['b_hand']],
+                          df['pitch_quality'])
+              .reindex(columns=list(quality_cols.keys()), fill_value=0)
+              .rename(columns=quality_cols)
+              .reset_index()
+              .assign(year=year)
+             )
+    counts['tracked_pitches'] = counts[list(quality_cols.values())].sum(axis=1)
+    return counts
+
+def build_cube(years=None):
+    pla_data = read_pla_data()
+    years = sorted(pla_data['year'].unique()) if years is None else years
+
+    quality_df = pd.concat([quality_counts(year) for year in years], ignore_index=True)
+    cube = (pla_data
+            .loc[pla_data['year'].isin(years)]
+            .merge(quality_df, how='outer', on=cube_keys, suffixes=('','_pitch'))
+           )
+    cube['pitchername'] = cube['pitchername'].fillna(cube.pop('pitchername_pitch'))
+
+    count_cols = ['num_pitches','tracked_pitches']+list(quality_cols.values())
+    sum_cols = ['subset_ip','pitch_runs','total_plv']
+    cube[count_cols] = cube[count_cols].fillna(0).astype('int32')
+    cube[sum_cols] = cube[sum_cols].fillna(0)
+    cube = cube[cube_keys+['pitchername']+count_cols+sum_cols].sort_values(cube_keys)
+
+    season_store.write_atomic(pa.Table.from_pandas(cube, preserve_index=False), cube_path())
+    return cube
+
+def load_cube():
+    if not cube_path().exists():
+        return build_cube().reset_index(drop=True)
+    return pd.read_parquet(cube_path())
+
+## Slices
+def pla_agg(cube, year, p_hand=['L','R'], b_hand=['L','R']):
+    # Per-pitcher, per-pitchtype sums for the PLA leaderboard and the PLV card
+    return (cube
+            .loc[(cube['year']==year) &
+                 cube['p_hand'].isin(p_hand) &
+                 cube['b_hand'].isin(b_hand) &
+                 (cube['num_pitches']>0)]
+            .groupby(['pitchername','pitchtype','pitcher_mlb_id'])
+            [['num_pitches','subset_ip','pitch_runs','total_plv']]
+            .sum()
+           )
+
+def pla_frame(cube, year, pitch_threshold, p_hand=['L','R'], b_hand=['L','R']):
+    # PLA leaderboard: season PLV/PLA and per-pitchtype PLA of every pitcher
+    # with pitch_threshold pitches (pitchtypes with 5% of it)
+    season_df = (pla_agg(cube, year, p_hand, b_hand)
+      .sort_values('pitch_runs', ascending=False)
+      .query(f'num_pitches >={int(pitch_threshold/20)}') # 5% of total pitches threshold
+      .reset_index()
+      )
+
+    # Clean IP to actual fractions
+    season_df['season_IP'] = season_df['subset_ip'].groupby(season_df['pitcher_mlb_id']).transform('sum')
+    season_df['season_pitches'] = season_df['num_pitches'].groupby(season_df['pitcher_mlb_id']).transform('sum')
+
+    # Calculate PLV, in general, and per-pitchtype
+    season_df['PLV'] = season_df['total_plv'].groupby(season_df['pitcher_mlb_id']).transform('sum').div(season_df['season_pitches']).astype('float')
+    season_df['pitchtype_plv'] = season_df['total_plv'].div(season_df['num_pitches'])
+
+    # Calculate PLA, in general, and per-pitchtype
+    season_df['PLA'] = season_df['pitch_runs'].groupby(season_df['pitcher_mlb_id']).transform('sum').mul(9).div(season_df['season_IP']).astype('float')
+    season_df['pitchtype_pla'] = season_df['pitch_runs'].mul(9).div(season_df['subset_ip']) # ERA Scale
+
+    season_df = season_df.sort_values('PLA')
+
+    # Pivot a dataframe of per-pitchtype PLAs
+    pitchtype_df = season_df.pivot_table(index=['pitcher_mlb_id'], 
+                                          columns='pitchtype', 
+                                          values='pitchtype_pla',
+                                          aggfunc='sum'
+                                        ).replace({0:None})
+
+    
+    # Merge season-long PLA with pitchtype PLAs
+    df = (season_df
+          .drop_duplicates('pitcher_mlb_id')
+          [['pitcher_mlb_id','pitchername','season_pitches','PLA','PLV']]
+          .merge(pitchtype_df, how='inner',left_on='pitcher_mlb_id',right_index=True)
+          .query(f'season_pitches >= {pitch_threshold}')
+          .rename(columns={'pitchername':'Pitcher',
+                           'season_pitches':'Num_Pitches'})
+          .drop(columns=['pitcher_mlb_id'])
+          .fillna(np.nan)
+          .set_index('Pitcher')
+          .copy()
+          )
+    
+    cols = [x for x in ['Num_Pitches','PLV','PLA','FF','SI','SL','ST','CH','CU','FC','FS'] if x in df.columns.values]
+    return df[cols]
+
+def pq_frame(cube, year, pitch_threshold, p_hand=['L','R'], b_hand=['L','R']):
+    # Per-pitcher/pitchtype PLV and PLA of the PLV card (pitchtypes with 5% of
+    # the pitch threshold), with the pitcher's season totals on every row
+    pq_df = (pla_agg(cube, year, p_hand, b_hand)
+      .sort_values('pitch_runs', ascending=False)
+      .query(f'num_pitches >={pitch_threshold/20}')
+      .reset_index()
+      )
+
+    # Clean IP to actual fractions
+    pq_df['season_IP'] = pq_df['subset_ip'].groupby(pq_df['pitcher_mlb_id']).transform('sum')
+    pq_df['season_pitches'] = pq_df['num_pitches'].groupby(pq_df['pitcher_mlb_id']).transform('sum')
+
+    # Calculate PLV, in general, and per-pitchtype
+    pq_df['PLV'] = pq_df['total_plv'].groupby(pq_df['pitcher_mlb_id']).transform('sum').div(pq_df['season_pitches']).astype('float')
+    pq_df['pitchtype_plv'] = pq_df['total_plv'].div(pq_df['num_pitches'])
+
+    # Calculate PLA, in general, and per-pitchtype
+    pq_df['PLA'] = pq_df['pitch_runs'].groupby(pq_df['pitcher_mlb_id']).transform('sum').mul(9).div(pq_df['season_IP']).astype('float')
+    pq_df['pitchtype_pla'] = pq_df['pitch_runs'].mul(9).div(pq_df['subset_ip']) # ERA Scale
+    return pq_df
+
+def quality_rates(cube, year, drop_pitchtypes=['KN','SC','UN']):
+    # Per-pitcher share of Quality/Average/Bad pitches, plus total pitches tracked
+    counts = (cube
+              .loc[(cube['year']==year) &
+                   ~cube['pitchtype'].isin(drop_pitchtypes)]
+              .groupby('pitchername')
+              [['tracked_pitches']+list(quality_cols.values())]
+              .sum()
+              .query('tracked_pitches > 0')
+             )
+    return (counts[list(quality_cols.values())]
+            .div(counts['tracked_pitches'], axis=0)
+            .assign(tracked_pitches=counts['tracked_pitches'])
+           )
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Build the per-pitcher aggregate cube from pla_data.csv and the season store')
+    parser.add_argument('--years', type=int, nargs='+', default=None)
+    args = parser.parse_args()
+
+    cube = build_cube(args.years)
+    print(f'{cube.shape[0]:,} rows -> {cube_path()}')
@@ -0,0 +1,498 @@
+import numpy as np
+import pandas as pd
+import seaborn as sns
+import matplotlib.pyplot as plt
+
+import assets
+import player_index
+import season_store
+
+from pathlib import Path
+
+## Pitchtype cards
+# One pitcher's pitchtype (locations, movement and its characteristics
+# against every other pitcher's same pitchtype), for MLB and for AAA. The card
+# only needs the season frame in a PlayerIndex and its parameters, so the two
+# card apps and batch_cards render it with the same function.
+
+# Plot Style
+pl_white = '#FEFEFE'
+pl_background = '#162B50'
+pl_text = '#72a3f7'
+pl_line_color = '#293a6b'
+
+sns.set_theme(
+    style={
+        'axes.edgecolor': pl_background,
+        'axes.facecolor': pl_background,
+        'axes.labelcolor': pl_white,
+        'xtick.color': pl_white,
+        'ytick.color': pl_white,
+        'figure.facecolor':pl_background,
+        'grid.color': pl_background,
+        'grid.linestyle': '-',
+        'legend.facecolor':pl_background,
+        'text.color': pl_white
+     }
+    )
+
+# Marker Style
+marker_colors = {
+    'FF':'#d22d49', 
+    'SI':'#c57a02',
+    'FS':'#00a1c5',  
+    'FC':'#933f2c', 
+    'SL':'#9300c7',  
+    'ST':'#C95EBE',
+    'CU':'#3c44cd',
+    'CH':'#07b526', 
+    'KN':'#999999',
+    'SC':'#999999', 
+    'UN':'#999999', 
+}
+
+# Pitch Names
+pitch_names = {
+    'FF':'Four-Seamer', 
+    'SI':'Sinker',
+    'FS':'Splitter',  
+    'FC':'Cutter', 
+    'SL':'Slider', 
+    'ST':'Sweeper',
+    'CU':'Curveball',
+    'CH':'Changeup', 
+    'KN':'Knuckleball',
+    'SC':'Screwball', 
+    'UN':'Unknown', 
+}
+
+sz_bot = 1.5
+sz_top = 3.5
+x_ft = 2.5
+y_bot = -0.5
+y_lim = 6
+plate_y = -.25
+
+# MLB averages of each pitchtype, the reference line of the AAA cards
+mlb_stat_averages = {'FF': {'velo': 94.08736842105263,
+  'pitch_extension': 6.434037897782064,
+  'IVB': 15.488106816423368,
+  'IHB': 7.860111826342976,
+  'adj_vaa': 0.9542526876861707,
+  'zone_pred': 0.5524634628096649,
+  'PLV': 4.959100994300099},
+ 'SI': {'velo': 93.37165354330709,
+  'pitch_extension': 6.421503314121037,
+  'IVB': 7.1894812567087465,
+  'IHB': 16.11683109762078,
+  'adj_vaa': 0.5547257941492305,
+  'zone_pred': 0.5641941277842722,
+  'PLV': 4.940891148091489},
+ 'FS': {'velo': 86.37046979865772,
+  'pitch_extension': 6.4438092219020175,
+  'IVB': 1.579503883985698,
+  'IHB': 12.366853622592707,
+  'adj_vaa': -0.22828997970648665,
+  'zone_pred': 0.40843780249945844,
+  'PLV': 4.98044945975445},
+ 'FC': {'velo': 88.73486005089059,
+  'pitch_extension': 6.348863327370304,
+  'IVB': 7.0253350087713855,
+  'IHB': -2.651600606856387,
+  'adj_vaa': 0.04028590670661612,
+  'zone_pred': 0.5417138511743801,
+  'PLV': 5.036561520860988},
+ 'SL': {'velo': 85.38645320197044,
+  'pitch_extension': 6.339913089005235,
+  'IVB': 0.1900596288890174,
+  'IHB': -4.895031088405101,
+  'adj_vaa': -0.5685276887366394,
+  'zone_pred': 0.5187218074222507,
+  'PLV': 5.090979841319493},
+ 'ST': {'velo': 81.75238095238096,
+  'pitch_extension': 6.466326666666666,
+  'IVB': -0.7414287370085063,
+  'IHB': -15.137090657135802,
+  'adj_vaa': -0.7479210122281921,
+  'zone_pred': 0.5080484211063543,
+  'PLV': 5.193385876049742},
+ 'CU': {'velo': 79.40216183292995,
+  'pitch_extension': 6.321732090034413,
+  'IVB': -12.42331509058707,
+  'IHB': -9.444564155605065,
+  'adj_vaa': -2.529186648853596,
+  'zone_pred': 0.5093645938521,
+  'PLV': 4.9908054964123645},
+ 'CH': {'velo': 85.04103092783505,
+  'pitch_extension': 6.410149210526315,
+  'IVB': 4.610948378394975,
+  'IHB': 15.019310112008792,
+  'adj_vaa': -0.15015396609012815,
+  'zone_pred': 0.4445410306119117,
+  'PLV': 4.906497086537889}}
+
+logo = assets.logo()
+
+# Pitchers need this many of a pitchtype to be compared
+pitch_thresh = 10
+
+## Season frames
+# The card's shards, read from data/ where they exist, otherwise from GitHub
+def shard_files(year):
+    files = [season_store.data_dir / f'{year}_Pitch_Analysis_Data-{chunk}.parquet' for chunk in [1,2,3]]
+    return [file if file.exists() else season_store.remote_loc.format(file.name) for file in files]
+
+def build_data(year):
+    df = pd.DataFrame()
+    for file_name in shard_files(year):
+        load_cols = ['pitchername','pitchtype','pitch_id',
+                                                    'p_hand','b_hand','IHB','IVB','called_strike_pred',
+                                                    'ball_pred','PLV','velo','pitch_extension',
+                                                    'adj_vaa','p_x','p_z']
+        df = pd.concat([df,
+                        pd.read_parquet(file_name)[load_cols]
+                       ])
+    df = (df
+          .sort_values('pitch_id')
+          .astype({'pitch_id':'int'})
+          .query(f'pitchtype not in {["KN","SC","UN"]}')
+          .reset_index(drop=True)
+         )
+    df['game_played'] = pd.Series(season_store.game_dates(df['pitch_id'], year), index=df.index).dt.date
+  
+    # Sorted by pitcher, then pitchtype, so their pitches are one slice of the frame
+    return player_index.PlayerIndex(df).df
+
+# Built once into a memory-mapped file that every server process shares.
+# Local shards are checked for changes; remote ones can't be, so a frame built
+# from them is rebuilt after 12 hours
+def load_data(year):
+    local_files = [file for file in shard_files(year) if isinstance(file, Path)]
+    df = season_store.shared_frame('pitch_analysis', year, build_data,
+                                   sources=local_files+[season_store.date_index_path(year)],
+                                   max_age=None if len(local_files)==3 else 12*3600)
+    return player_index.PlayerIndex(df)
+
+# AAA pitches (one season, read from GitHub), indexed like the MLB frame
+def load_milb_data(year):
+    df = pd.DataFrame()
+    for chunk in [1,2,3]:
+        file_name = f'https://github.com/Blandalytics/PLV_viz/blob/main/data/{year}_MiLB_Analysis_Data-{chunk}.parquet?raw=true'
+        load_cols = ['pitchername','pitchtype','pitch_id','game_played',
+                                                    'p_hand','b_hand','IHB','IVB','called_strike_pred',
+                                                    'ball_pred','PLV','velo','pitch_extension',
+                                                    'adj_vaa','p_x','p_z']
+        df = pd.concat([df,
+                        pd.read_parquet(file_name)[load_cols]
+                       ])
+    df = (df
+          .sort_values('pitch_id')
+          .query(f'pitchtype not in {["KN","SC","UN"]}')
+          .reset_index(drop=True)
+         )
+    df['game_played'] = pd.to_datetime(df['game_played']).dt.date
+  
+    # Sorted by pitcher, then pitchtype, so their pitches are one slice of the
+    # frame (the index keeps an already sorted frame as it is)
+    df = player_index.PlayerIndex(df).df
+    return player_index.PlayerIndex(season_store.SharedFrame(df))
+
+def pitchtype_card(pitch_index,card_player,pitch_type,chart_type,year,start_date=None,end_date=None,level='MLB'):
+    # One pitcher's card for one pitchtype, compared to the same pitchtype of
+    # every pitcher in the date range (by default, the player's whole season)
+    season_start = pitch_index.frame(card_player)['game_played'].min()
+    season_end = pitch_index.frame(card_player)['game_played'].max()
+    start_date = season_start if start_date is None else start_date
+    end_date = season_end if end_date is None else end_date
+
+    base_df = pitch_index.df
+    pitch_df = base_df.loc[(base_df['game_played']>=start_date) &
+                           (base_df['game_played']<=end_date)]
+
+    def player_pitches(pitchtype=None):
+        # The card player's pitches (of one pitchtype) in the date range
+        df = pitch_index.frame(card_player, pitchtype)
+        return df.loc[(df['game_played']>=start_date) &
+                      (df['game_played']<=end_date)]
+
+    def mlb_scale(stat):
+        # MLB average of the pitchtype, on the scale of the AAA pitchers
+        return (mlb_stat_averages[pitch_type][stat] - pitch_stats_df[stat].min())/(pitch_stats_df[stat].max()-pitch_stats_df[stat].min())
+
+    pitches_thrown = int(player_pitches(pitch_type).shape[0]/100)*100
+    pitch_num_thresh = max(pitch_thresh,
+                           min(pitches_thrown,
+                               int(pitch_df.loc[(pitch_df['pitchtype']==pitch_type)].groupby('pitchername')['pitch_id'].count().nlargest(75)[-1]/50)*50
+                              )
+                          )
+
+    pitch_stats_df = (
+        pitch_df
+        .assign(IHB = lambda x: np.where(x['p_hand']=='R',x['IHB']*-1,x['IHB']),
+                zone_pred = lambda x: x['called_strike_pred'] / x[['called_strike_pred','ball_pred']].sum(axis=1))
+        .loc[(pitch_df['pitchtype']==pitch_type)]
+        .groupby(['pitchername'])
+        [['pitch_id','p_hand','PLV','velo','pitch_extension','IVB','IHB','adj_vaa','zone_pred']]
+        .agg({
+            'pitch_id':'count',
+            'p_hand':pd.Series.mode,
+            'PLV':'mean',
+            'velo':'mean',
+            'pitch_extension':'mean',
+            'IVB':'mean',
+            'IHB':'mean',
+            'adj_vaa':'mean',
+            'zone_pred':'mean'
+        })
+         .query(f'pitch_id>={pitch_num_thresh}')
+        .reset_index()
+        .sort_values('zone_pred', ascending=False)
+    )
+
+    def min_max_scaler(x):
+        return ((x-x.min())/(x.max()-x.min()))
+
+    for col in ['PLV','velo','pitch_extension','IVB','IHB','adj_vaa','zone_pred']:
+        pitch_stats_df[col+'_scale'] = min_max_scaler(pitch_stats_df[col])
+        pitch_stats_df[col+'_pct'] = pitch_stats_df[col].rank(pct=True)
+
+    chart_stats = ['velo','pitch_extension','IVB','IHB','adj_vaa','zone_pred','PLV']
+    fig = plt.figure(figsize=(10,10))
+
+    stat_name_dict = {
+        'velo':'Velocity',
+        'pitch_extension':'Release\nExtension',
+        'IVB':'Induced\nVertical\nBreak',
+        'IHB':'Arm-Side\nBreak',
+        'adj_vaa':'Adj. Vert.\nApproach\nAngle',
+        'zone_pred':'xZone%',
+        'PLV':'PLV',
+    }
+
+    stat_tops = {
+        'velo':'Faster',
+        'pitch_extension':'Longer',
+        'IVB':'Rise',
+        'IHB':'Arm',
+        'adj_vaa':'Flatter',
+        'zone_pred':'In',
+        'PLV':'Good',
+    }
+    stat_bottoms = {
+        'velo':'Slower',
+        'pitch_extension':'Shorter',
+        'IVB':'Drop',
+        'IHB':'Glove',
+        'adj_vaa':'Steeper',
+        'zone_pred':'Out',
+        'PLV':'Bad',
+    }
+
+    # Divide card into tiles
+    grid = plt.GridSpec(2, len(chart_stats),height_ratios=[5,5],hspace=0.2)
+    ax = plt.subplot(grid[0, :3])
+    sns.scatterplot(data=(player_pitches(pitch_type)
+                          .assign(p_x = lambda x: x['p_x']*-1)),
+                    x='p_x',
+                    y='p_z',
+                    color=marker_colors[pitch_type],
+                    alpha=1)
+
+    # Strike zone outline
+    ax.plot([-10/12,10/12], [sz_bot,sz_bot], color='w', linewidth=2)
+    ax.plot([-10/12,10/12], [sz_top,sz_top], color='w', linewidth=2)
+    ax.plot([-10/12,-10/12], [sz_bot,sz_top], color='w', linewidth=2)
+    ax.plot([10/12,10/12], [sz_bot,sz_top], color='w', linewidth=2)
+
+    # Inner Strike zone
+    ax.plot([-10/12,10/12], [1.5+2/3,1.5+2/3], color='w', linewidth=1)
+    ax.plot([-10/12,10/12], [1.5+4/3,1.5+4/3], color='w', linewidth=1)
+    ax.axvline(10/36, ymin=(sz_bot-y_bot)/(y_lim-y_bot), ymax=(sz_top-y_bot)/(y_lim-y_bot), color='w', linewidth=1)
+    ax.axvline(-10/36, ymin=(sz_bot-y_bot)/(y_lim-y_bot), ymax=(sz_top-y_bot)/(y_lim-y_bot), color='w', linewidth=1)
+
+    # Plate
+    ax.plot([-8.5/12,8.5/12], [plate_y,plate_y], color='w', linewidth=2)
+    ax.plot([-8.5/12,-8.25/12], [plate_y,plate_y+0.15], color='w', linewidth=2)
+    ax.plot([8.5/12,8.25/12], [plate_y,plate_y+0.15], color='w', linewidth=2)
+    ax.plot([8.28/12,0], [plate_y+0.15,plate_y+0.25], color='w', linewidth=2)
+    ax.plot([-8.28/12,0], [plate_y+0.15,plate_y+0.25], color='w', linewidth=2)
+
+    ax.set(xlim=(-x_ft,x_ft),
+           ylim=(y_bot,y_lim),
+           aspect=1)
+    fig.text(0.23,0.89,'Locations',fontsize=18,bbox=dict(facecolor=pl_background, alpha=0.75, edgecolor=pl_background))
+    ax.axis('off')
+    sns.despine()
+
+    # Hand of the player's first pitch in the range
+    hand = player_pitches()['p_hand'].iloc[player_pitches()['pitch_id'].argmin()]
+    ax = plt.subplot(grid[0, 3:])
+    sns.scatterplot(data=player_pitches(pitch_type),
+                    x='IHB',
+                    y='IVB',
+                    color=marker_colors[pitch_type],
+                    s=25,
+                    alpha=1)
+
+    ax.axhline(0, color='w', linestyle='--', linewidth=1, alpha=0.5)
+    ax.axvline(0, color='w', linestyle='--', linewidth=1, alpha=0.5)
+    ax.set(aspect=1)
+
+    sns.scatterplot(data=(player_pitches(pitch_type)
+                          .groupby('pitchtype')
+                          [['IVB','IHB']]
+                          .mean()
+                          .reset_index()
+                         ),
+                    x='IHB',
+                    y='IVB',
+                    color=marker_colors[pitch_type],
+                    s=200,
+                    legend=False,
+                    linewidth=2
+                   )
+
+    ax_lim = max(25,
+                 player_pitches(pitch_type)[['IHB','IVB']].abs().quantile(0.999).max()+1
+                )
+    ax.set(xlim=(ax_lim,-ax_lim),
+           ylim=(-ax_lim,ax_lim))
+    plt.xlabel('Arm-Side Break', fontsize=12)
+    plt.ylabel('Induced Vertical Break', fontsize=12,labelpad=-1)
+    ax.set_xticks([x*10 for x in range(-int(ax_lim/10),int(ax_lim/10)+1)][::-1])
+    if hand=='R':
+        ax.set_xticklabels([x*-1 for x in ax.get_xticks()])
+    fig.text(0.62,0.89,'Movement',fontsize=18)
+    sns.despine(left=True,bottom=True)
+  
+    adjusted_pitch_name = pitch_names[pitch_type] if (card_player != 'Kutter Crawford') | (pitch_names[pitch_type] != 'Cutter') else 'Kutter'
+    fig.text(0.5,0.45,'Pitch Characteristics',ha='center',fontsize=18)
+    fig.text(0.5,0.43,f'(Compared to {level} {adjusted_pitch_name}s; Min {pitch_num_thresh} Thrown; - - - is MLB Median)',ha='center',fontsize=12)
+    for stat in chart_stats:
+        if chart_type=='Violin':
+            val = pitch_stats_df.loc[(pitch_stats_df['pitchername']==card_player),
+                                     stat].item()
+            up_thresh = max(pitch_stats_df[stat].quantile(0.99),
+                            val)
+            low_thresh = min(pitch_stats_df[stat].quantile(0.01),
+                             val)
+            ax = plt.subplot(grid[1, chart_stats.index(stat)])
+            sns.violinplot(data=pitch_stats_df.loc[(pitch_stats_df[stat] <= up_thresh) &
+                                                   (pitch_stats_df[stat] >= low_thresh)],
+                           y=stat+'_scale',
+                           inner=None,
+                           orient='v',
+                           cut=0,
+                           color=marker_colors[pitch_type],
+                           linewidth=1
+                         )
+            ax.collections[0].set_edgecolor('w')
+    
+            top = ax.get_ylim()[1]
+            bot = ax.get_ylim()[0]
+            plot_height = top - bot
+    
+            format_dict = {
+                'PLV':f'{val:.2f}',
+                'velo':f'{val:.1f}mph',
+                'pitch_extension':f'{val:.1f}ft',
+                'IVB':f'{val:.1f}"',
+                'IHB':f'{val:.1f}"',
+                'adj_vaa':f'{val:.1f}°',
+                'zone_pred':f'{val*100:.1f}%'
+            }
+            ax.axhline(pitch_stats_df[stat+'_scale'].median() if level=='MLB' else mlb_scale(stat),
+                       linestyle='--',
+                       color='w')
+            ax.axhline(top + (0.25 * plot_height),
+                       xmin=0.1,
+                       xmax=0.9,
+                       color='w')
+            ax.text(0,
+                    pitch_stats_df.loc[(pitch_stats_df['pitchername']==card_player),
+                                       stat+'_scale'],
+                    format_dict[stat],
+                    va='center',
+                    ha='center',
+                    fontsize=12 if stat=='velo' else 14,
+                    bbox=dict(facecolor=pl_background, alpha=0.75, edgecolor='w'))
+            ax.text(0,
+                    top + (0.5 * plot_height),
+                    stat_name_dict[stat],
+                    va='center',
+                    ha='center',
+                    fontsize=14)
+            ax.text(0,
+                    top + (0.2 * plot_height),
+                    stat_tops[stat],
+                    va='top',
+                    ha='center',
+                    fontsize=12)
+            ax.text(0,
+                    bot - (0.2 * plot_height),
+                    stat_bottoms[stat],
+                    va='bottom',
+                    ha='center',
+                    fontsize=12)
+            ax.tick_params(left=False, bottom=False)
+            ax.set_yticklabels([])
+            ax.set(xlabel=None,ylabel=None,ylim=(bot - (0.15 * plot_height),
+                                                 top + plot_height))
+            ax.xaxis.set_label_position('top')
+        else:
+            plot_val = pitch_stats_df.loc[(pitch_stats_df['pitchername']==card_player),stat+'_pct'].item()
+            text_val = pitch_stats_df.loc[(pitch_stats_df['pitchername']==card_player),stat].item()
+
+            format_dict = {
+                'PLV':f'{text_val:.2f}',
+                'velo':f'{text_val:.1f}mph',
+                'pitch_extension':f'{text_val:.1f}ft',
+                'IVB':f'{text_val:.1f}"',
+                'IHB':f'{text_val:.1f}"',
+                'adj_vaa':f'{text_val:.1f}°',
+                'zone_pred':f'{text_val*100:.1f}%'
+            }
+            
+            ax = plt.subplot(grid[1, chart_stats.index(stat)])
+            ax.axhline(1.15,
+                       xmin=0.1,
+                       xmax=0.9,
+                       color='w')
+            ax.bar(1, 1, color='w',alpha=0.1)
+            ax.bar(1, plot_val, color=marker_colors[pitch_type])
+            ax.axhline(0.5 if level=='MLB' else mlb_scale(stat),
+                       linestyle='--',
+                       color='w')
+            ax.text(1, plot_val+0.01,
+                    format_dict[stat],
+                    va='bottom',
+                    ha='center',
+                    fontsize=12 if stat=='velo' else 14,
+                    bbox=dict(facecolor='#2d4061', alpha=0.75 if plot_val<0.5 else 0, linewidth=0, pad=1))
+            ax.text(1,
+                    1.4,
+                    stat_name_dict[stat],
+                    va='center',
+                    ha='center',
+                    fontsize=14)
+            ax.set_xticklabels([])
+            ax.set_yticklabels([])
+            ax.set(ylim=(0,1.9))
+            ax.tick_params(left=False, bottom=False)
+
+    # Add PL logo
+    pl_ax = fig.add_axes([0.41,0.025,0.2,0.2], anchor='S', zorder=1)
+    pl_ax.imshow(logo)
+    pl_ax.axis('off')
+
+    apostrophe_text = "'" if card_player[-1]=='s' else "'s"
+    
+    title_text = f'{year} {adjusted_pitch_name}' if level=='MLB' else f'{year} MiLB {adjusted_pitch_name} ({level})'
+    fig.suptitle(f"{card_player}{apostrophe_text} {title_text}",y=0.97,fontsize=20,x=0.525)
+    date_text = '' if (start_date==season_start) & (end_date==season_end) else f'{start_date:%b %-d} - {end_date:%b %-d}; '
+    fig.text(0.525,0.925,f"({date_text}From Pitcher's Perspective)",ha='center',fontsize=12)
+    if level=='MLB':
+        fig.text(0.77,0.07,"@Blandalytics",ha='center',fontsize=10)
+        fig.text(0.77,0.05,"pitch-analysis-card.streamlit.app",ha='center',fontsize=10)
+    sns.despine(left=True,bottom=True)
+    return fig
@@ -0,0 +1,46 @@
+import numpy as np
+import pandas as pd
+
+## Player row index
+# Player charts used to select rows with df['pitchername']==player, a string
+# comparison over the whole season on every selection. Instead the frame is
+# sorted once by player, then pitchtype, then pitch_id, and the first/last row
+# of every player (and player x pitchtype) is recorded, so any player's pitches
+# are a contiguous slice and cost time in proportion to that player's pitches.
+def block_ranges(*keys):
+    # (start, stop) rows of each run of equal keys in sorted arrays, keyed by
+    # the key (or the tuple of keys, for more than one array)
+    if len(keys[0]) == 0:
+        return {}
+    change = np.zeros(len(keys[0])-1, dtype='bool')
+    for key in keys:
+        change |= key[1:] != key[:-1]
+    starts = np.flatnonzero(np.r_[True, change])
+    stops = np.r_[starts[1:], len(keys[0])]
+    names = zip(*[key[starts].tolist() for key in keys]) if len(keys) > 1 else keys[0][starts].tolist()
+    return dict(zip(names, zip(starts.tolist(), stops.tolist())))
+
+class PlayerIndex:
+    def __init__(self, df, player_col='pitchername', type_col='pitchtype'):
+        players = df[player_col].astype('str').to_numpy()
+        types = df[type_col].astype('str').to_numpy()
+        order = np.lexsort((df['pitch_id'].to_numpy(), types, players))
+        # A frame that's already in order (e.g. a mapped shared frame) is kept, not copied
+        if np.array_equal(order, np.arange(len(order))) and df.index.equals(pd.RangeIndex(len(df))):
+            self.df = df
+        else:
+            self.df = df.iloc[order].reset_index(drop=True)
+
+        self.players = block_ranges(players[order])
+        self.pitchtypes = block_ranges(players[order], types[order])
+
+    def rows(self, player, pitchtype=None):
+        if pitchtype is None:
+            start, stop = self.players.get(player, (0, 0))
+        else:
+            start, stop = self.pitchtypes.get((player, pitchtype), (0, 0))
+        return slice(start, stop)
+
+    def frame(self, player, pitchtype=None):
+        # A player's pitches (of one pitchtype), in pitchtype then pitch_id order
+        return self.df.iloc[self.rows(player, pitchtype)]
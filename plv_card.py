@@ -0,0 +1,306 @@
+import numpy as np
+import seaborn as sns
+import matplotlib.pyplot as plt
+
+import assets
+import pitcher_cube
+import plv_distributions
+import season_store
+
+## PLV card
+# A pitcher's PLV, overall and per pitchtype, placed on the league
+# distribution of the same handedness split, next to their PLA. The card is
+# drawn from the pitcher cube alone, so PLV_Pitcher_Metrics and batch_cards
+# render it with the same function.
+
+# Plot Style
+pl_white = '#FEFEFE'
+pl_background = '#162B50'
+pl_text = '#72a3f7'
+pl_line_color = '#293a6b'
+
+sns.set_theme(
+    style={
+        'axes.edgecolor': pl_background,
+        'axes.facecolor': pl_background,
+        'axes.labelcolor': pl_white,
+        'xtick.color': pl_white,
+        'ytick.color': pl_white,
+        'figure.facecolor':pl_background,
+        'grid.color': pl_background,
+        'grid.linestyle': '-',
+        'legend.facecolor':pl_background,
+        'text.color': pl_white
+     }
+    )
+
+# Marker Style
+marker_colors = {
+    'FF':'#d22d49', 
+    'SI':'#c57a02',
+    'FS':'#00a1c5',  
+    'FC':'#933f2c', 
+    'SL':'#9300c7', 
+    'ST':'#C95EBE',
+    'CU':'#3c44cd',
+    'CH':'#07b526', 
+    'KN':'#999999',
+    'SC':'#999999', 
+    'UN':'#999999', 
+}
+
+diverging_palette = 'vlag'
+
+hand_map = {
+    'Left':['L'],
+    'All':['L','R'],
+    'Right':['R']
+}
+
+logo = assets.logo()
+
+def league_plv(pla_df):
+    # Pitch-weighted PLV of the leaderboard's pitchers (pitcher_cube.pla_frame)
+    return pla_df['PLV'].mul(pla_df['Num_Pitches']).sum() / pla_df['Num_Pitches'].sum()
+
+def pq_split(cube, year, pitch_threshold, p_hand=['L','R'], b_hand=['L','R']):
+    # Card data and league distributions of one handedness split
+    pq_df = pitcher_cube.pq_frame(cube, year, pitch_threshold, p_hand, b_hand)
+    return pq_df, plv_distributions.build_distributions(pq_df, pitch_threshold)
+
+def pq_splits(cube, year, pitch_threshold):
+    # Every handedness split, keyed by season_store.split_key (a split with no
+    # qualifying pitcher gets empty distributions instead of failing the rest)
+    return {season_store.split_key(p_hand, b_hand):pq_split(cube, year, pitch_threshold, p_hand, b_hand)
+            for p_hand, b_hand in season_store.hand_splits()}
+
+def plv_kde(df,name,num_pitches,ax,distributions,pitch_threshold,mean_plv,stat='PLV',pitchtype=''):
+    pitch_color = 'w' if pitchtype=='' else marker_colors[pitchtype]
+    dist = distributions['All' if pitchtype=='' else pitchtype]
+    stat = 'PLV' if pitchtype=='' else 'pitchtype_plv'
+
+    player_df = df.loc[df['pitchername']==name]
+    player_df = player_df.query(f'season_pitches >= {pitch_threshold}') if pitchtype=='' else player_df.loc[player_df['pitchtype']==pitchtype].query(f'num_pitches >= {int(pitch_threshold/20)}')
+    val = player_df[stat].mean()
+    val_percentile = np.clip(dist.percentile(val),0,1)
+
+    # Precomputed KDE curve (no margin below the curve, like sns.kdeplot)
+    x = dist.x
+    y = dist.y
+    kde_line, = ax.plot(x, y, color='w')
+    kde_line.sticky_edges.y[:] = (0, np.inf)
+
+    quantiles = plv_distributions.quantiles
+    quant_colors = sns.color_palette(f'{diverging_palette}_r',n_colors=7001)[::1000]
+
+    i = -1
+    for quant in quantiles:
+        if quant >= val_percentile:
+            i += 1
+
+    val_color = quant_colors[np.clip(i,0,7)]
+
+    for quant in range(8):
+        color = quant_colors[quant]
+        thresh = 10 if quant==0 else dist.breakpoints[quantiles[quant]]
+        ax.fill_between(x, 0, y, 
+                        where=x < thresh, 
+                        color=quant_colors[quant], 
+                        alpha=1)
+    ax.vlines(dist.median, 
+            0, 
+            dist.density(dist.median), 
+            linestyle='-', color='w', alpha=1, linewidth=2)
+    ax.axvline(val, 
+             ymax=0.9,
+             linestyle='--', 
+             color='w', 
+             linewidth=2)
+    props = dict(boxstyle='Round',
+               facecolor='k', 
+               alpha=1, 
+               edgecolor=val_color,
+               linewidth=2)
+    y_max = ax.get_ylim()[1]
+    ax.text(val+0.01,
+          y_max*1.1,
+          '{:.2f}'.format(val),
+          ha='center',
+          va='top',
+          color=val_color,
+          fontsize=16,
+          fontweight='bold', 
+          bbox=props)
+    ax.set(xlim=(mean_plv-1.4,mean_plv+1.4),
+         ylim=(0,y_max*1.2),
+         xlabel=None,
+         ylabel=None,
+         )
+    ax.set_xticklabels([])
+    ax.set_yticklabels([])
+    ax.tick_params(left=False, bottom=False
+                 )
+    sns.despine(left=True,bottom=True)
+
+def percent_bar(ax):
+    quantiles = [1, 0.95, 0.9, 0.75, 0.5, 0.25, 0.1, 0.05, 0]
+    quant_colors = [x for x in sns.color_palette(f'{diverging_palette}',n_colors=7001)[::1000]]
+
+    prev_limit = 0
+    for idx, lim in enumerate([x/8 for x in range(0,9)]):
+        ax.barh([1], lim-prev_limit, left=prev_limit, height=10, color=quant_colors[idx-1])
+        if idx in [0,8]:
+            continue
+        props = dict(boxstyle='Round',
+                   facecolor='w',
+                   alpha=0.75, 
+                   edgecolor='#cccccc',
+                   linewidth=2)
+        ax.text(lim,
+              0,
+              '{:.0f}%'.format(quantiles[::-1][idx]*100),
+              color='k',
+              fontsize=10,
+              fontweight=500,
+              ha='center',
+              bbox=props
+              )
+        prev_limit = lim
+
+    ax.axvline(0.5,
+             ymin=0.08,
+             ymax=0.92,
+             color='w', 
+             linewidth=2)
+    ax.set(xlim=(0,1.025))
+    ax.set_xticklabels([])
+    ax.set_yticks([])
+    ax.tick_params(bottom=False)
+    sns.despine()
+
+def plv_card(pq_df,distributions,player,year,pitch_threshold,mean_plv,handedness='All',color_palette=marker_colors):
+    # The card of one pitcher, from pq_split's frame and distributions (the
+    # x-axes are centered on the league PLV)
+    pitch_list = list(pq_df
+                      .loc[(pq_df['pitchername']==player)]
+                      .groupby('pitchtype',as_index=False)
+                      ['num_pitches']
+                      .sum()
+                      .query(f'num_pitches >= {int(pitch_threshold/20)}')
+                      .sort_values('num_pitches',
+                                   ascending=False)
+                      ['pitchtype']
+                      .unique())
+
+    fig = plt.figure(figsize=(8,8))
+
+    # Parameters to divide card
+    grid_height = len(pitch_list)+4
+    pitch_feats = len(pitch_list)+1
+
+    # Divide card into tiles
+    grid = plt.GridSpec(grid_height, 3, wspace=0, hspace=0.2, width_ratios=[1,3,1],
+                      height_ratios=[0.75,1]+[7.5/pitch_feats]*(pitch_feats)+[0.75])
+
+    title_ax = plt.subplot(grid[0, :-1])
+    title_ax.text(-0.15,0,"{}'s\n{} Pitch Quality{}".format(player,year,'' if handedness=='All' else f' (vs {hand_map[handedness][0]}HB)'), 
+                  ha='center', va='center', fontsize=20,
+           bbox=dict(facecolor='#162B50', alpha=0.6, edgecolor='#162B50'))
+    title_ax.set(xlabel=None, xlim=(-1,1), ylabel=None, ylim=(-1,1))
+    title_ax.set_xticklabels([])
+    title_ax.set_yticklabels([])
+    title_ax.tick_params(left=False, bottom=False)
+
+    plv_desc_ax = plt.subplot(grid[1, 1])
+    plv_desc_ax.text(0,-0.8,"PLV", ha='center', va='bottom', fontsize=18,
+           bbox=dict(facecolor='#162B50', alpha=0.6, edgecolor='#162B50'))
+    plv_desc_ax.set(xlabel=None, xlim=(-1,1), ylabel=None, ylim=(-1,1))
+    plv_desc_ax.set_xticklabels([])
+    plv_desc_ax.set_yticklabels([])
+    plv_desc_ax.tick_params(left=False, bottom=False)
+
+    pla_desc_ax = plt.subplot(grid[1, 2])
+    pla_desc_ax.text(-0.25,-0.4,"PLA", ha='center', va='bottom', fontsize=18)
+    pla_desc_ax.text(-0.25,-0.45,"(xRuns per 9IP*)", ha='center', va='top', fontsize=10)
+    pla_desc_ax.set(xlabel=None, xlim=(-1,1), ylabel=None, ylim=(-1,1))
+    pla_desc_ax.set_xticklabels([])
+    pla_desc_ax.set_yticklabels([])
+    pla_desc_ax.tick_params(left=False, bottom=False)
+
+    ax_num = 2
+    total_pitches = pq_df.loc[(pq_df['pitchername']==player),'num_pitches'].sum()
+    for pitch in ['All']+pitch_list:
+        type_ax = plt.subplot(grid[ax_num, 0])
+        type_ax.text(0.25,-0.1, f'{pitch}', ha='center', va='bottom', 
+                     fontsize=20, fontweight='bold',
+                     color='w' if pitch=='All' else color_palette[pitch])
+        if pitch!='All':
+            usage = pq_df.loc[(pq_df['pitchername']==player) &
+                               (pq_df['pitchtype']==pitch),'num_pitches'].sum() / total_pitches * 100
+            type_ax.text(0.25,-0.1,'({:.0f}%)'.format(usage), ha='center', va='top', fontsize=10)
+        else:
+            type_ax.text(0.25,-0.1,'(Usage%)', ha='center', va='top', fontsize=12)
+        type_ax.set(xlabel=None, xlim=(-1,1), ylabel=None, ylim=(-1,1))
+        type_ax.set_xticklabels([])
+        type_ax.set_yticklabels([])
+        type_ax.tick_params(left=False, bottom=False)
+        ax_num+=1
+
+    plv_dist_ax = plt.subplot(grid[2, 1])
+    plv_kde(pq_df,
+            player,
+            len(pitch_list),
+            plv_dist_ax,
+            distributions,
+            pitch_threshold,
+            mean_plv)
+    ax_num = 3
+    for pitch in pitch_list:
+        pitch_ax = plt.subplot(grid[ax_num, 1])
+        plv_kde(pq_df, 
+                player, 
+                len(pitch_list), 
+                pitch_ax, 
+                distributions,
+                pitch_threshold,
+                mean_plv,
+                pitchtype=pitch)
+        ax_num+=1
+
+    ax_num = 2
+    for pitch in ['PLA']+pitch_list:
+        val = pq_df.loc[pq_df['pitchername']==player,'PLA'].mean() if pitch=='PLA' else pq_df.loc[(pq_df['pitchername']==player) &
+                                                                                                  (pq_df['pitchtype']==pitch),'pitchtype_pla'].mean()
+        pla_ax = plt.subplot(grid[ax_num, 2])
+        pla_ax.text(-0.25,0,'{:.2f}'.format(val), ha='center', va='center', 
+                    fontsize=20)
+        pla_ax.set(xlabel=None, xlim=(-1,1), ylabel=None, ylim=(-1,1))
+        pla_ax.set_xticklabels([])
+        pla_ax.set_yticklabels([])
+        pla_ax.tick_params(left=False, bottom=False)
+        ax_num+=1
+
+    league_ax = plt.subplot(grid[-1, 0])
+    league_ax.text(0.8,0,"League\nPercentile:", ha='right', va='center', fontsize=14)
+    league_ax.set(xlabel=None, xlim=(-1,1), ylabel=None, ylim=(-1,1))
+    league_ax.set_xticklabels([])
+    league_ax.set_yticklabels([])
+    league_ax.tick_params(left=False, bottom=False)
+
+    percent_bar_ax = plt.subplot(grid[-1, 1])
+    percent_bar(percent_bar_ax)
+
+    disclaimer_ax = plt.subplot(grid[-1, 2])
+    disclaimer_ax.text(-0.25,0,"*IP based on \nUsage %", ha='center', va='center', fontsize=10)
+    disclaimer_ax.set(xlabel=None, xlim=(-1,1), ylabel=None, ylim=(-1,1))
+    disclaimer_ax.set_xticklabels([])
+    disclaimer_ax.set_yticklabels([])
+    disclaimer_ax.tick_params(left=False, bottom=False)
+
+    # Add PL logo
+    pl_ax = fig.add_axes([0.675,0.7,0.2,0.2], anchor='NE', zorder=1)
+    pl_ax.imshow(logo)
+    pl_ax.axis('off')
+
+    sns.despine()
+    return fig
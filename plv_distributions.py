@@ -0,0 +1,66 @@
+import numpy as np
+
+from scipy import stats
+
+## League PLV distributions
+# Each row of the PLV card places a pitcher's PLV on the league distribution
+# (overall, or for one pitchtype): percentile, quantile bands and a KDE curve.
+# Those only depend on the league values, so they're computed once per
+# (year, handedness split, pitchtype) and the card just looks them up.
+
+# Card bands, from the top of the distribution down
+quantiles = [1, 0.95, 0.9, 0.75, 0.5, 0.25, 0.1, 0.05, 0]
+
+# Same support grid as sns.kdeplot(cut=0): 200 points between the min and max
+kde_gridsize = 200
+
+class PLVDistribution:
+    def __init__(self, values):
+        values = np.asarray(values, dtype='float64')
+        self.values = np.sort(values[~np.isnan(values)])
+
+        # No values (e.g. no pitcher over the threshold in a split): NaN
+        # breakpoints and percentiles, and an empty curve
+        if len(self.values) == 0:
+            self.breakpoints = {quant:np.nan for quant in quantiles}
+            self.median = np.nan
+            self.x = np.array([])
+            self.y = np.array([])
+            return
+
+        # Linear interpolation, like pd.Series.quantile
+        self.breakpoints = dict(zip(quantiles, np.quantile(self.values, quantiles)))
+        self.median = self.breakpoints[0.5]
+
+        # Scott's rule Gaussian KDE, as sns.kdeplot draws it (flat for a
+        # single value, where there's no spread to estimate)
+        self.x = np.linspace(self.values[0], self.values[-1], kde_gridsize)
+        self.y = (stats.gaussian_kde(self.values)(self.x) if self.values[0] < self.values[-1]
+                  else np.zeros(kde_gridsize))
+
+    def percentile(self, value):
+        # Same as stats.percentileofscore(values, value) / 100 (kind='rank'):
+        # ties count as half below, half above
+        if np.isnan(value) or len(self.values) == 0:
+            return np.nan
+        left = np.searchsorted(self.values, value, side='left')
+        right = np.searchsorted(self.values, value, side='right')
+        return (left + right + (right > left)) / (2 * len(self.values))
+
+    def density(self, value):
+        # KDE curve height at a value, e.g. for the median line
+        if len(self.x) == 0:
+            return np.nan
+        return np.interp(value, self.x, self.y)
+
+def build_distributions(pq_df, pitch_threshold):
+    # Overall ('All') and per-pitchtype distributions for one handedness split
+    # of the pitch quality frame, with the card's minimum pitch counts
+    # (one overall value per pitchtype row, as the card has always weighted it)
+    season_df = pq_df.query(f'season_pitches >= {pitch_threshold}')
+    dists = {'All':PLVDistribution(season_df['PLV'])}
+
+    pitchtype_df = pq_df.query(f'num_pitches >= {int(pitch_threshold/20)}')
+    for pitchtype, values in pitchtype_df.groupby('pitchtype')['pitchtype_plv']:
+        dists[pitchtype] = PLVDistribution(values)
+    return dists
@@ -17,8 +17,8 @@ import seaborn as sns
 import sklearn
 from sklearn.neighbors import KNeighborsRegressor
 
-import urllib
-from PIL import Image
+import assets
+import season_store
 
 pl_white = '#FEFEFE'
 pl_background = '#162B50'
@@ -68,9 +68,8 @@ pitch_names = {
     'UN':'Unknown', 
 }
 
-logo_loc = 'https://github.com/Blandalytics/PLV_viz/blob/main/data/PL-text-wht.png?raw=true'
-logo = Image.open(urllib.request.urlopen(logo_loc))
-st.image(logo, width=200)
+logo = assets.logo()
+st.image(assets.logo('header'), width=200)
 
 st.title("PLV Stuff App")
 st.write('(Red is good 🔥)')
@@ -86,13 +85,16 @@ pitch_threshold = st.number_input(f'Min # of Pitches:',
                                   step=25, 
                                   value=500 if year != 2024 else default_threshold)
 
-@st.cache_data(ttl=1800,show_spinner=f"Loading {year} data")
+def build_data(year):
+    return season_store.load_season(year,'Stuff',
+                                    columns=['pitchername','pitchtype','pitch_id','pitcherside_L','plv_stuff_plus',
+                                             'velo','IVB','IHB','swinging_strike_pred','adj_vaa','pitch_extension'])
+
+# Built once into a memory-mapped file that every server process shares
+@st.cache_resource(ttl=1800,show_spinner=f"Loading {year} data")
 def load_data(year):
-    df = pd.DataFrame()
-    for month in range(3,11):
-        file_name = f'https://github.com/Blandalytics/PLV_viz/blob/main/data/{year}_PLV_Stuff_App_Data-{month}.parquet?raw=true'
-        df = pd.concat([df,pd.read_parquet(file_name)], ignore_index=True)
-    return df.reset_index(drop=True)
+    return season_store.shared_frame('stuff_app', year, build_data,
+                                     sources=[season_store.season_path(year,'Stuff')])
 
 year_data = load_data(year)
 
@@ -0,0 +1,64 @@
+import numpy as np
+import pandas as pd
+
+import season_store
+
+## Rolling ability charts
+# Each hitter's pitches are sorted once (by hitter, then pitch_id) into one
+# block of a flat event array, with the count, pitch type bucket and pitcher
+# hand stored as small integer codes next to the metric values. A rolling
+# chart then only touches that hitter's block: filter it with code lookups,
+# and take any rolling window from a prefix sum, instead of re-sorting and
+# masking the whole league frame on every widget change.
+class HitterEvents:
+    def __init__(self, df, metrics, columns=[]):
+        order = np.lexsort((df['pitch_id'].to_numpy(),
+                            df['hittername'].astype('str').to_numpy()))
+        df = df.iloc[order]
+
+        names = df['hittername'].astype('str').to_numpy()
+        starts = np.flatnonzero(np.r_[True, names[1:] != names[:-1]]) if len(names) else np.array([], dtype='int64')
+        stops = np.r_[starts[1:], len(names)]
+        self.blocks = dict(zip(names[starts], zip(starts, stops)))
+
+        self.count = season_store.count_codes(df['balls'], df['strikes']).to_numpy()
+        self.buckets = sorted(df['pitch_type_bucket'].dropna().unique())
+        self.bucket = pd.Categorical(df['pitch_type_bucket'], categories=self.buckets).codes
+        self.p_hand = pd.Categorical(df['p_hand'], categories=season_store.hand_options[-1]).codes
+
+        # Missing (or infinite) values are left out of the rolling chart
+        self.values = {metric:df[metric].astype('float64').replace([np.inf, -np.inf], np.nan).to_numpy()
+                       for metric in metrics}
+        # Other per-pitch columns the charts need (e.g. game_date)
+        self.columns = {col:df[col].to_numpy() for col in columns}
+
+    def player_rows(self, player, metric, counts, buckets, p_hands):
+        # Positions of a hitter's pitches, in pitch order, for the selected
+        # counts ('0-0' style), pitch type buckets and pitcher hands
+        start, stop = self.blocks.get(player, (0, 0))
+        bucket_codes = [self.buckets.index(bucket) for bucket in buckets if bucket in self.buckets]
+        hand_codes = [season_store.hand_options[-1].index(hand) for hand in p_hands]
+
+        keep = (season_store.in_counts(self.count[start:stop], counts) &
+                np.isin(self.bucket[start:stop], bucket_codes) &
+                np.isin(self.p_hand[start:stop], hand_codes) &
+                ~np.isnan(self.values[metric][start:stop]))
+        return start + np.flatnonzero(keep)
+
+    def player_events(self, player, metric, counts, buckets, p_hands, columns=[]):
+        # The filtered pitches as a frame of the extra columns and the metric,
+        # without missing values
+        rows = self.player_rows(player, metric, counts, buckets, p_hands)
+        events = pd.DataFrame({col:self.columns[col][rows] for col in columns})
+        events[metric] = self.values[metric][rows]
+        return events.dropna().reset_index(drop=True)
+
+def rolling_mean(values, window, min_periods=None):
+    # Same as pd.Series(values).rolling(window, min_periods).mean() for values
+    # without NaNs, from one cumulative sum
+    min_periods = window if min_periods is None else min_periods
+    sums = np.r_[0, np.cumsum(values)]
+    stops = np.arange(1, len(values)+1)
+    starts = np.maximum(stops - window, 0)
+    periods = stops - starts
+    return np.where(periods >= min_periods, (sums[stops] - sums[starts]) / periods, np.nan)
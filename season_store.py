@@ -0,0 +1,334 @@
+import argparse
+import hashlib
+import inspect
+import os
+import time
+import urllib.request
+import uuid
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from pathlib import Path
+
+## Local season store
+# The apps used to pull 8 monthly parquet shards per year over HTTP and grow a
+# DataFrame with repeated pd.concat. Instead, each (product, year) is ingested
+# once into a single local parquet file, and every app reads that file.
+data_dir = Path(__file__).resolve().parent / 'data'
+store_dir = data_dir / 'season_store'
+remote_loc = 'https://github.com/Blandalytics/PLV_viz/blob/main/data/{}?raw=true'
+
+# File stem of the monthly shards for each product
+products = {
+    'PLV':'PLV_App_Data',
+    'Stuff':'PLV_Stuff_App_Data',
+    'Loc':'PLV_Loc_App_Data',
+}
+shard_months = range(3,11)
+
+def shard_name(year, product, month):
+    return f'{year}_{products[product]}-{month}.parquet'
+
+def season_path(year, product):
+    return store_dir / product / f'year={year}' / 'part-0.parquet'
+
+def read_shard(year, product, month):
+    file_name = shard_name(year, product, month)
+    local_file = data_dir / file_name
+    if local_file.exists():
+        table = pq.read_table(local_file)
+    else:
+        with urllib.request.urlopen(remote_loc.format(file_name)) as response:
+            table = pq.read_table(pa.BufferReader(response.read()))
+
+    # Decode dictionary columns so months with different dictionaries line up
+    for ix, field in enumerate(table.schema):
+        if pa.types.is_dictionary(field.type):
+            table = table.set_column(ix, field.name, table.column(ix).cast(field.type.value_type))
+    return table.replace_schema_metadata(None)
+
+def ingest_season(year, product):
+    table = pa.concat_tables([read_shard(year, product, month) for month in shard_months],
+                             promote_options='permissive')
+    table = table.sort_by('pitch_id')
+    # Every season carries its game dates, so the apps never need the date map
+    if 'game_played' not in table.column_names:
+        dates = game_dates(table.column('pitch_id').to_numpy(), year).astype('datetime64[us]')
+        table = table.append_column('game_played', pa.array(dates, from_pandas=True))
+    return write_atomic(table, season_path(year, product))
+
+# Write to a temp file and swap it in, so concurrent workers never see a partial file
+def write_atomic(table, path, row_group_size=64_000):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f'.{uuid.uuid4().hex}.tmp')
+    pq.write_table(table, tmp_path, row_group_size=row_group_size)
+    os.replace(tmp_path, path)
+    return path
+
+## Reader
+# The year is pruned by partition directory (years can have different columns).
+# Column projection and row filters are pushed into the parquet scan, so only
+# the needed columns (and row groups, where the stats allow it) get decoded
+def season_filter(drop_pitchtypes=None, pitchers=None, hitters=None):
+    expr = ds.scalar(True)
+    if drop_pitchtypes:
+        expr = expr & ~ds.field('pitchtype').isin(list(drop_pitchtypes))
+    if pitchers is not None:
+        expr = expr & ds.field('pitchername').isin([pitchers] if isinstance(pitchers, str) else list(pitchers))
+    if hitters is not None:
+        expr = expr & ds.field('hittername').isin([hitters] if isinstance(hitters, str) else list(hitters))
+    return expr
+
+def scan_season(year, product='PLV', columns=None, drop_pitchtypes=None, pitchers=None, hitters=None):
+    path = season_path(year, product)
+    if not path.exists():
+        ingest_season(year, product)
+
+    dataset = ds.dataset(path, format='parquet')
+    return dataset.to_table(columns=None if columns is None else list(columns),
+                            filter=season_filter(drop_pitchtypes, pitchers, hitters))
+
+def load_season(year, product='PLV', columns=None, drop_pitchtypes=None, pitchers=None, hitters=None):
+    return scan_season(year, product, columns, drop_pitchtypes, pitchers, hitters).to_pandas()
+
+## Pitch dates
+# date_pitch_map is a pitch_id -> game date table for every season. It's split
+# once into per-year pitch_id (int64, sorted) and day number (int32, days
+# since 1970-01-01) arrays, and dates are joined with a binary search instead
+# of mapping through a multi-million-entry dict.
+def date_index_path(year):
+    return store_dir / 'date_index' / f'year={year}' / 'part-0.parquet'
+
+def build_date_index():
+    local_file = data_dir / 'date_pitch_map.parquet'
+    date_map = pd.read_parquet(local_file if local_file.exists() else remote_loc.format('date_pitch_map.parquet'))
+    pitch_ids = date_map['pitch_id'].to_numpy().astype('int64')
+    days = date_map['game_played'].to_numpy().astype('datetime64[D]')
+    years = days.astype('datetime64[Y]').astype('int64') + 1970
+
+    for year in np.unique(years):
+        rows = years == year
+        table = pa.table({'pitch_id':pitch_ids[rows],
+                          'day':days[rows].astype('int64').astype('int32')}).sort_by('pitch_id')
+        write_atomic(table, date_index_path(year))
+    return sorted(np.unique(years))
+
+def load_date_index(year):
+    # Sorted pitch_ids and their day numbers (empty for a season without dates)
+    if not date_index_path(year).parent.parent.exists():
+        build_date_index()
+    if not date_index_path(year).exists():
+        return np.array([], dtype='int64'), np.array([], dtype='int32')
+    table = pq.read_table(date_index_path(year))
+    return table.column('pitch_id').to_numpy(), table.column('day').to_numpy()
+
+def game_dates(pitch_ids, year):
+    # Game date (datetime64[D]) of each pitch_id, NaT where it isn't in the year's index
+    index_ids, days = load_date_index(year)
+    pitch_ids = np.asarray(pitch_ids, dtype='int64')
+    if len(index_ids) == 0:
+        return np.full(len(pitch_ids), np.datetime64('NaT'), dtype='datetime64[D]')
+
+    pos = np.clip(np.searchsorted(index_ids, pitch_ids), 0, len(index_ids)-1)
+    found = index_ids[pos] == pitch_ids
+    return np.where(found, days[pos].astype('datetime64[D]'), np.datetime64('NaT'))
+
+## Compact in-memory schema
+# Names, pitch types and hands repeat across every row, so they're held as
+# categoricals; counts fit in int8 and model outputs don't need float64
+category_cols = ['pitchername','hittername','pitchtype','p_hand','b_hand',
+                 'pitch_type_bucket','pitch_quality']
+int8_cols = ['balls','strikes','zone','Quality Pitch','Average Pitch','Bad Pitch','QP-BP']
+float32_cols = ['PLV','pitch_runs','velo','IHB','IVB','p_x','p_z','sz_z',
+                'strike_zone_top','strike_zone_bottom','in_play_input',
+                'swing_agg','strike_zone_judgement','decision_value','contact_over_expected',
+                'adj_power','batter_wOBA','base_decision_value','base_power',
+                'sa_oa','dv_oa','ca_oa','pow_oa','decision_value_z','decision_value_o']
+
+# Count states, in code order (balls*3 + strikes)
+count_states = [f'{balls}-{strikes}' for balls in range(4) for strikes in range(3)]
+
+# Preset count groups of the hitter apps
+count_groups = {
+    'All':count_states,
+    'Hitter-Friendly':['1-0','2-0','3-0','2-1','3-1'],
+    'Pitcher-Friendly':['0-1','0-2','1-2'],
+    'Even':['0-0','1-1','2-2'],
+    '2-Strike':['0-2','1-2','2-2','3-2'],
+    '3-Ball':['3-0','3-1','3-2'],
+}
+# One bit per preset group, and the group bits of each count state
+count_group_bits = {group:1 << i for i, group in enumerate(count_groups)}
+count_state_groups = np.array([sum(bit for group, bit in count_group_bits.items() if state in count_groups[group])
+                               for state in count_states], dtype='uint8')
+
+def count_codes(balls, strikes):
+    codes = balls.astype('int16') * 3 + strikes.astype('int16')
+    valid = balls.between(0,3) & strikes.between(0,2)
+    return codes.where(valid, -1).astype('int8')
+
+def in_counts(codes, counts):
+    # Whether each count code is one of the selected states ('0-0' style),
+    # by shifting a 12-bit mask of the selection
+    mask = sum(1 << count_states.index(count) for count in set(counts))
+    codes = np.asarray(codes)
+    return (codes >= 0) & (np.right_shift(mask, np.clip(codes, 0, None).astype('int64')) & 1).astype('bool')
+
+def count_filter(df, counts, count_group=None):
+    # Rows in the selected counts: an AND against the per-row group bits for a
+    # preset count group, or the count codes for any other selection
+    if count_group in count_group_bits:
+        return (df['count_groups'].to_numpy() & count_group_bits[count_group]) != 0
+    return in_counts(df['count'].cat.codes.to_numpy(), counts)
+
+def apply_schema(df):
+    dtypes = {x:'category' for x in category_cols}
+    dtypes.update({x:'int8' for x in int8_cols})
+    dtypes.update({x:'float32' for x in float32_cols})
+    df = df.astype({col:dtype for col, dtype in dtypes.items() if col in df.columns})
+
+    if {'balls','strikes'}.issubset(df.columns):
+        codes = count_codes(df['balls'], df['strikes'])
+        df['count'] = pd.Categorical.from_codes(codes, categories=count_states)
+        df['count_groups'] = np.where(codes >= 0, count_state_groups[codes.clip(0)], 0).astype('uint8')
+    return df
+
+## Handedness splits
+# Every L/R/All combination of pitcher and hitter hand, keyed by the joined
+# hands (e.g. ('R','LR') is RHP vs all hitters). Computed once per season, so
+# moving a handedness slider is a lookup instead of re-filtering the frame
+hand_options = [['L'],['R'],['L','R']]
+
+def split_key(p_hand, b_hand):
+    return (''.join(sorted(p_hand)), ''.join(sorted(b_hand)))
+
+def hand_splits():
+    return [(p_hand, b_hand) for p_hand in hand_options for b_hand in hand_options]
+
+def split_rows(df):
+    # Row positions of each split in df
+    p_masks = {''.join(hands):df['p_hand'].isin(hands).to_numpy() for hands in hand_options}
+    b_masks = {''.join(hands):df['b_hand'].isin(hands).to_numpy() for hands in hand_options}
+    return {split_key(p_hand, b_hand):np.flatnonzero(p_masks[''.join(p_hand)] & b_masks[''.join(b_hand)])
+            for p_hand, b_hand in hand_splits()}
+
+def memory_report(df):
+    usage = df.memory_usage(deep=True, index=False).div(1024**2)
+    return (pd.DataFrame({'dtype':df.dtypes.astype('str'),
+                          'MB':usage})
+            .sort_values('MB', ascending=False))
+
+## Shared frames
+# st.cache_data pickles a cached frame and hands every rerun its own copy, and
+# every server process builds and holds the whole thing again. Instead each
+# app's season frame is built once into an uncompressed Arrow IPC file and
+# memory-mapped: its columns are read-only views of the OS page cache, shared
+# by every process that maps the file, and the apps keep the mapped frame with
+# st.cache_resource. The file is rebuilt when a source file is newer, the
+# build function's code changes, or (for data read from remote files, which
+# can't be checked) it's older than max_age seconds.
+def frame_path(name, year, build):
+    try:
+        version = hashlib.sha1(inspect.getsource(build).encode()).hexdigest()[:12]
+    except (OSError, TypeError):
+        version = 'base'
+    return store_dir / 'frames' / name / f'year={year}' / f'{version}.arrow'
+
+def write_frame(df, path):
+    # Floats keep NaN as a value (no validity bitmap), so they map without a copy
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    for ix, col in enumerate(df.columns):
+        if df[col].dtype.kind == 'f':
+            table = table.set_column(ix, col, pa.array(df[col].to_numpy()))
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f'.{uuid.uuid4().hex}.tmp')
+    with pa.OSFile(str(tmp_path), 'wb') as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(tmp_path, path)
+    return path
+
+def map_frame(path):
+    # Numeric, datetime and categorical columns are zero-copy views of the
+    # mapped file; strings and objects are converted into process memory
+    table = pa.ipc.open_file(pa.memory_map(str(path), 'r')).read_all()
+    return SharedFrame(table.to_pandas(split_blocks=True))
+
+## Read-only frames
+# A cached frame is handed to every rerun (and session) as is, so it must never
+# change. SharedFrame wraps it without a copy, makes its column arrays
+# read-only, and raises on column assignment/deletion, inplace=True methods and
+# axis relabeling. Anything derived from it is a plain DataFrame. To change a
+# few columns, derive a shallow frame (e.g. rename(..., copy=False) or
+# copy(deep=False)) and assign whole columns: the new columns only exist in the
+# derived frame and the rest stay shared. Writing into a shared column in place
+# fails, as its array is read-only.
+class SharedFrameError(TypeError):
+    pass
+
+class SharedFrame(pd.DataFrame):
+    def __init__(self, df):
+        super().__init__(df, copy=False)
+        for values in self._mgr.arrays:
+            if isinstance(values, np.ndarray):
+                values.flags.writeable = False
+
+    @property
+    def _constructor(self):
+        return pd.DataFrame
+
+    def _read_only(self, *args, **kwargs):
+        raise SharedFrameError('Shared frames are read-only: derive a frame (e.g. '
+                               'df.copy(deep=False)) and change that instead')
+
+    __setitem__ = _read_only
+    __delitem__ = _read_only
+    insert = _read_only
+    pop = _read_only
+    _update_inplace = _read_only
+    _set_axis = _read_only
+
+# These change the frame's blocks directly with inplace=True
+def _inplace_guard(name):
+    def method(self, *args, **kwargs):
+        if kwargs.get('inplace'):
+            self._read_only()
+        return getattr(pd.DataFrame, name)(self, *args, **kwargs)
+    return method
+
+for name in ['fillna','replace','clip','where','mask','interpolate','ffill','bfill']:
+    setattr(SharedFrame, name, _inplace_guard(name))
+
+def shared_frame(name, year, build, sources=(), max_age=None):
+    # build(year) -> DataFrame, run only when the mapped file is missing or stale
+    path = frame_path(name, year, build)
+    stale = (not path.exists() or
+             any(Path(source).exists() and Path(source).stat().st_mtime > path.stat().st_mtime
+                 for source in sources) or
+             (max_age is not None and time.time() - path.stat().st_mtime > max_age))
+    if stale:
+        write_frame(build(year), path)
+    return map_frame(path)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Consolidate monthly app shards into the local season store')
+    parser.add_argument('--years', type=int, nargs='+', default=[2020,2021,2022,2023,2024])
+    parser.add_argument('--products', nargs='+', default=list(products.keys()), choices=list(products.keys()))
+    parser.add_argument('--memory-report', action='store_true',
+                        help='Print in-memory size of each season frame, as loaded and with the compact schema')
+    args = parser.parse_args()
+
+    for product in args.products:
+        for year in args.years:
+            print(f'{product} {year}: {ingest_season(year, product)}')
+            if args.memory_report:
+                season_df = load_season(year, product)
+                compact_df = apply_schema(season_df)
+                print(f'  {season_df.shape[0]:,} pitches: '
+                      f'{memory_report(season_df)["MB"].sum():.1f}MB as loaded, '
+                      f'{memory_report(compact_df)["MB"].sum():.1f}MB compact')
@@ -3,7 +3,7 @@ import numpy as np
 import pandas as pd
 import seaborn as sns
 
-from statsmodels.nonparametric.kernel_regression import KernelReg
+import zone_smoothing
 
 ### This is done with a generic "test_df" of X-locations, Z-locations, and a random value ("test_stat")
 # These can & should be replaced with a dataframe of observed X/Z/stat values (rounded to the nearest inch):
@@ -25,39 +25,30 @@ test_data = {
 }
 test_df = pd.DataFrame(test_data)
 
-### Generate a df with every possible X/Z location to fill missing data
+### Grid of every possible X/Z location (in inches), to fill missing data
 # Adds 20" horizontally and 30 inches vertically, in each direction
-# I'm sure there's a better way to do this lol
-zone_df = pd.DataFrame(columns=['x','z'])
-for x in range(-20,21):
-    for y in range(0,61):
-        zone_df.loc[len(zone_df)] = [x,y]
-
-### Merge observed data onto the completed 2D space
-# Fill missing values with the average stat, from the *whole population*
-test_df = pd.merge(zone_df,
-                   test_df,
-                   on=['x','z'],
-                   how='left').fillna(avg_test_value)
+zone = zone_smoothing.zone_grid(x_range=(-20,20), z_range=(0,60), scale=1)
 
 ### Smooth the stat values
+# Observed values are binned onto the completed 2D space, and missing cells are
+# filled with the average stat, from the *whole population*
 # Specify the bandwidth
 # I eyeballed the value for my stats, but I'm sure there's plenty of literature on it
 # Lower = peakier, higher = smoother
 bandwidth = 2
 
-# Train a kernel regression model on the location and stat values, using the provided bandwidth
-kernel_regression = KernelReg(endog=test_df['test_stat'], 
-                              exog= [test_df['x'], test_df['z']], 
-                              bw=[bandwidth,bandwidth],
-                              var_type='cc') # States that X & Z are both continuous
-
-# Apply the model onto the X/Z coords
-test_df['smoothed_stat'] = kernel_regression.fit([test_df['x'], test_df['z']])[0]
+# Kernel regression of the stat values on the X/Z coords, using the provided bandwidth
+# (same result as statsmodels' KernelReg on the merged grid, without the O(n^2) fit)
+smoothed_stat = zone_smoothing.smooth_grid(zone,
+                                           test_df['x'],
+                                           test_df['z'],
+                                           test_df['test_stat'],
+                                           avg_test_value,
+                                           bandwidth)[0]
 
 ### Generate viz
-# Pivot df to 2D, to better play with Seaborn's heatmap code 
-heatmap_df = test_df.pivot_table(columns='x',index='z',values=['smoothed_stat'], aggfunc='mean')
+# 2D frame of smoothed values (Z rows, X columns), to better play with Seaborn's heatmap code 
+heatmap_df = pd.DataFrame(smoothed_stat, index=zone.z, columns=zone.x)
 
 # Define the range of your color scale
 # This is how far above/below the center value you want the limits of your color scale to reach
@@ -68,7 +59,7 @@ color_scale_range = 0.025
 
 # Create Chart
 fig, ax = plt.subplots(figsize=(5,6))
-sns.heatmap(data=heatmap_df['smoothed_stat'].astype('float'),
+sns.heatmap(data=heatmap_df,
             cmap='vlag', # My preferred diverging palette, but use whatever you want
             center=avg_test_value, # Force the color scale to center on your average/median value
             vmin=avg_test_value-color_scale_range, # Lower limit of colorbar
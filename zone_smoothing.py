@@ -0,0 +1,115 @@
+import functools
+import numpy as np
+
+## Strike zone grid
+# One grid point per inch, built once with meshgrid and shared by every heatmap
+# and smoothing path. Coordinates are inches / scale, so scale=12 gives feet
+# (the apps' kde_x/kde_z) and scale=1 gives inches.
+class ZoneGrid:
+    def __init__(self, x_range, z_range, scale):
+        self.x_range = x_range
+        self.z_range = z_range
+        self.scale = scale
+        self.x = np.arange(x_range[0], x_range[1]+1) / scale
+        self.z = np.arange(z_range[0], z_range[1]+1) / scale
+        self.shape = (len(self.z), len(self.x))
+        self.xx, self.zz = np.meshgrid(self.x, self.z)
+
+        # Strike zone geometry, in grid cells: columns of the plate edges
+        # (10" either side of center, as drawn on the heatmaps)
+        self.plate_cols = (-10 - x_range[0], 10 - x_range[0])
+
+    def cell_index(self, x, z):
+        # (row, column) of each grid-snapped location, -1 if it's off the grid
+        return grid_index(z, self.z), grid_index(x, self.x)
+
+    def row(self, height):
+        # Grid row of a height, e.g. a hitter's strike zone top/bottom
+        return round(height * self.scale) - self.z_range[0]
+
+@functools.lru_cache(maxsize=None)
+def zone_grid(x_range=(-20,20), z_range=(0,54), scale=12):
+    return ZoneGrid(x_range, z_range, scale)
+
+## Binned kernel smoother for zone heatmaps
+# Same estimate as fitting statsmodels' KernelReg (Gaussian kernel,
+# var_type='cc') on the zone grid merged with every pitch, where empty cells
+# are filled with one league-average observation. Since every pitch sits on a
+# grid point, the pitches are binned into per-cell counts and sums once, and
+# every kernel-weighted sum the regression needs becomes two separable 1D
+# kernel passes over the grid, e.g. for Nadaraya-Watson:
+#   smoothed = (Kz @ sums @ Kx.T) / (Kz @ counts @ Kx.T)
+# That's a handful of small matrix products for all stats at once, instead of
+# KernelReg's O(n^2) fit per stat.
+# reg_type='ll' (KernelReg's default, and what the heatmaps have always used)
+# adds the local-linear slope terms; reg_type='lc' is plain Nadaraya-Watson.
+
+def gaussian_weights(grid, bandwidth, power=0):
+    # Unnormalized Gaussian weight between every (predicted, observed) pair of
+    # grid points, times (observed - predicted)**power. The normalizing
+    # constant cancels in the regression
+    diff = grid[None,:] - grid[:,None]
+    return np.exp(-0.5 * (diff / bandwidth)**2) * diff**power
+
+def kernel_sum(kz, cells, kx):
+    # Kernel-weighted sum of per-cell values around every grid point
+    return np.einsum('zk,skx,yx->szy', kz, cells, kx, optimize=True)
+
+def grid_index(values, grid):
+    # Position of each (grid-snapped) value on an evenly spaced grid, -1 if off the grid
+    step = grid[1] - grid[0]
+    idx = np.rint((np.asarray(values, dtype='float64') - grid[0]) / step)
+    valid = (idx >= 0) & (idx < len(grid))
+    return np.where(valid, idx, -1).astype('int64')
+
+def bin_stats(x_idx, z_idx, values, shape):
+    # values is (n_pitches, n_stats), NaN where a stat is missing for that pitch.
+    # Returns per-cell counts and sums, each shaped (n_stats, n_z, n_x)
+    values = np.asarray(values, dtype='float64').reshape(len(x_idx), -1)
+    n_z, n_x = shape
+    on_grid = (x_idx >= 0) & (z_idx >= 0)
+    cell = z_idx[on_grid] * n_x + x_idx[on_grid]
+    values = values[on_grid]
+
+    counts = np.empty((values.shape[1], n_z * n_x))
+    sums = np.empty((values.shape[1], n_z * n_x))
+    for i in range(values.shape[1]):
+        observed = ~np.isnan(values[:,i])
+        counts[i] = np.bincount(cell[observed], minlength=n_z * n_x)
+        sums[i] = np.bincount(cell[observed], weights=values[observed,i], minlength=n_z * n_x)
+    return counts.reshape(-1, n_z, n_x), sums.reshape(-1, n_z, n_x)
+
+def smooth_grid(zone, x, z, values, fill_values, bandwidth, reg_type='ll'):
+    # Kernel-smoothed surface of each stat over a ZoneGrid.
+    # x/z are pitch locations already snapped to the grid; cells with no
+    # observations for a stat count as one observation of its fill value.
+    # Returns an array shaped (n_stats, *zone.shape)
+    bandwidth = np.broadcast_to(np.asarray(bandwidth, dtype='float64'), (2,))
+
+    z_idx, x_idx = zone.cell_index(x, z)
+    counts, sums = bin_stats(x_idx, z_idx, values, zone.shape)
+    fill_values = np.asarray(fill_values, dtype='float64').reshape(-1, 1, 1)
+    empty = counts == 0
+    counts = np.where(empty, 1, counts)
+    sums = np.where(empty, fill_values, sums)
+
+    kx = [gaussian_weights(zone.x, bandwidth[0], power) for power in range(3)]
+    kz = [gaussian_weights(zone.z, bandwidth[1], power) for power in range(3)]
+    if reg_type == 'lc':
+        return kernel_sum(kz[0], sums, kx[0]) / kernel_sum(kz[0], counts, kx[0])
+
+    # Local linear: solve the 3x3 weighted least squares system at each grid
+    # point, for an intercept and x/z slopes, and keep the intercept
+    m_00 = kernel_sum(kz[0], counts, kx[0])
+    m_0x = kernel_sum(kz[0], counts, kx[1])
+    m_0z = kernel_sum(kz[1], counts, kx[0])
+    m_xx = kernel_sum(kz[0], counts, kx[2])
+    m_zz = kernel_sum(kz[2], counts, kx[0])
+    m_xz = kernel_sum(kz[1], counts, kx[1])
+    moments = np.stack([np.stack([m_00, m_0x, m_0z], axis=-1),
+                        np.stack([m_0x, m_xx, m_xz], axis=-1),
+                        np.stack([m_0z, m_xz, m_zz], axis=-1)], axis=-2)
+    targets = np.stack([kernel_sum(kz[0], sums, kx[0]),
+                        kernel_sum(kz[0], sums, kx[1]),
+                        kernel_sum(kz[1], sums, kx[0])], axis=-1)
+    return np.linalg.solve(moments, targets[...,None])[...,0,0]